@@ -1,15 +1,26 @@
+import os
 import sys
+import json
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
 import pandas as pd
-import yfinance as yf
+from backtest_engine import SIZING_MODES, check_sizing, portfolio_stats, simulate_portfolio, simulate_trades
+from bars import BarSet
+from data_provider import get_provider
+from history_store import get_store, load_history, merge_history
+from indicators import INDICATOR_COLUMNS, STRENGTH_CODES, STRENGTH_LABELS, signal_mask
+from signal_cache import add_cached_indicators, cached_codes, get_cache
+from strategies import signal_config
+from trading_calendar import load_calendar
+import run_metrics
+from run_metrics import count, stage
 
 if sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 
-# 銘柄別 RSI 閾値（JMIA のみ使用）
-RSI_THRESHOLDS = {
-    'JMIA': 35,
-}
-
 # 前回バックテスト結果（weak含む・10日エグジット）
 PREV_RESULTS = {
     'JMIA': {'total': 13, 'strong': 0, 'medium': 4, 'weak': 9, 'pnl': 2.85},
@@ -17,84 +28,15 @@ PREV_RESULTS = {
 }
 
 EXIT_DAYS = 10
+NYSE      = load_calendar('XNYS')  # エグジットの営業日数は取引所カレンダーで数える
 
-# =============================
-# 指標計算（main.py と同期）
-# =============================
-
-def add_indicators(df):
-    df = df.copy()
-    low_10   = df['Low'].rolling(10).min()
-    high_10  = df['High'].rolling(10).max()
-    range_10 = high_10 - low_10
-    df['STOCHk'] = 100 * ((df['Close'] - low_10) / range_10.where(range_10.abs() > 1e-10, other=pd.NA)).fillna(50)
-    df['STOCHd'] = df['STOCHk'].rolling(3).mean()
-    delta    = df['Close'].diff()
-    avg_gain = delta.clip(lower=0).ewm(alpha=1/14, min_periods=14, adjust=False).mean()
-    avg_loss = (-delta.clip(upper=0)).ewm(alpha=1/14, min_periods=14, adjust=False).mean()
-    df['RSI'] = 100 - (100 / (1 + avg_gain / avg_loss.clip(lower=1e-10)))
-    df['MA50']  = df['Close'].rolling(50).mean()
-    df['MA200'] = df['Close'].rolling(200).mean()
-    ema12 = df['Close'].ewm(span=12, adjust=False).mean()
-    ema26 = df['Close'].ewm(span=26, adjust=False).mean()
-    df['MACD']        = ema12 - ema26
-    df['MACD_signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
-    return df
-
-
-# =============================
-# シグナル関数（main.py と同期）
-# =============================
-
-def _composite_signal(df, rsi_threshold=35, base_condition=None):
-    """JMIA 用。strong / medium / '' を返す。"""
-    stoch_oversold = (df['STOCHk'] <= 20) | (df['STOCHd'] <= 20)
-    stoch_cross_up = (df['STOCHk'] > df['STOCHd']) & (df['STOCHk'].shift(1) <= df['STOCHd'].shift(1))
-    stoch_ok   = stoch_oversold & stoch_cross_up
-    rsi_ok     = df['RSI'] <= rsi_threshold
-    macd_cross = (df['MACD'] > df['MACD_signal']) & (df['MACD'].shift(1) <= df['MACD_signal'].shift(1))
-
-    cond_a = stoch_ok & rsi_ok
-    cond_b = macd_cross
-
-    if base_condition is not None:
-        cond_a = cond_a & base_condition
-        cond_b = cond_b & base_condition
-
-    strength = pd.Series('', index=df.index)
-    strength = strength.where(~cond_b, 'medium')
-    strength = strength.where(~cond_a, 'strong')
-    return strength
-
-
-def get_jmia_signal(df):
-    vol_ok = ((df['High'] - df['Low']) / df['Close'].replace(0, 1)) > 0.03
-    return _composite_signal(df, rsi_threshold=RSI_THRESHOLDS['JMIA'], base_condition=vol_ok)
-
-
-def get_nu_signal(df):
-    """NU: トレンドフォロー型プルバック戦略（調整版）
-    前提 : Close > MA200
-    strong: RSI 40-55 AND STOCHk <= 40
-    medium: MACDゴールデンクロス OR (STOCHk <= 40 AND RSI <= 50)
-    優先順: strong > medium
-    """
-    above_ma200 = df['Close'] > df['MA200']
-    macd_cross  = (df['MACD'] > df['MACD_signal']) & (df['MACD'].shift(1) <= df['MACD_signal'].shift(1))
-    rsi_sweet   = (df['RSI'] >= 40) & (df['RSI'] <= 55)
-    stoch_40    = df['STOCHk'] <= 40
-    rsi_50      = df['RSI'] <= 50
-
-    stoch_30    = df['STOCHk'] <= 30
-
-    cond_a = above_ma200 & rsi_sweet & stoch_30                    # strong
-    cond_b = above_ma200 & (macd_cross | (stoch_40 & rsi_50))     # medium
+# 銘柄 -> {'func': Strategy, 'min_strength'}（戦略の条件式は strategies.json）
+SIGNAL_CONFIG = signal_config()
 
-    strength = pd.Series('', index=df.index)
-    strength = strength.where(~cond_b, 'medium')
-    strength = strength.where(~cond_a, 'strong')
-    return strength
+HISTORY_STORE = get_store()
 
+# 指標・強度コードのディスクキャッシュ（signal_cache 参照。SIGNAL_CACHE=0 / --no-cache で無効）
+SIGNAL_CACHE = get_cache()
 
 # =============================
 # バックテスト実行
@@ -113,58 +55,62 @@ def _tier_stats(label, subset):
 
 BACKTEST_DAYS = 252  # バックテスト対象期間（営業日数 ≒ 1年）
 
+def load_backtest_data(symbol, min_bars=BACKTEST_DAYS + 200, period='2y'):
+    """履歴ストアから読み込み、min_bars に足りなければ period 分を取得して保存する。"""
+    df_full = load_history(symbol, HISTORY_STORE)
+    if len(df_full) < min_bars:
+        try:
+            fresh = get_provider().download([symbol], period=period).get(symbol)
+        except Exception as e:
+            print(f"【エラー】{symbol} のデータ取得に失敗しました: {e}")
+            fresh = None
+        if fresh is not None and not fresh.empty:
+            df_full = merge_history(df_full, fresh)
+            HISTORY_STORE.save(symbol, df_full)
+    return df_full
+
+
 def run_backtest(symbol, signal_func, min_strength='any'):
     """min_strength: 'any'=strong+medium両方実行 / 'strong'=strongのみ実行"""
     label = f"強度フィルター: {min_strength}" if min_strength != 'any' else "全強度"
     print(f"--- 【{symbol}】 バックテスト開始 (エグジット: {EXIT_DAYS}営業日 / {label}) ---")
-    # MA200 を正確に計算するため 2 年分取得し、指標計算後に直近 1 年をスライス
-    df_full = yf.download(symbol, period='2y', progress=False)
+    # MA200 を正確に計算するため 2 年分を使い、指標計算後に直近 1 年をスライス
+    with stage('load'):
+        df_full = load_backtest_data(symbol)
     if df_full.empty:
         print(f"【エラー】{symbol} のデータ取得に失敗しました。")
         return {'symbol': symbol, 'total': 0, 'strong': 0, 'medium': 0, 'pnl': 0.0}
-    if isinstance(df_full.columns, pd.MultiIndex):
-        df_full.columns = df_full.columns.get_level_values(0)
+    count('bars', len(df_full))
 
-    df_full = add_indicators(df_full)
-    df_full['signal_strength'] = signal_func(df_full)
-    df_full['signal']          = df_full['signal_strength'] != ''
+    with stage('indicators'):
+        df_full, key = add_cached_indicators(df_full, symbol, SIGNAL_CACHE)
+    with stage('signals'):
+        codes = cached_codes(signal_func, df_full, key, SIGNAL_CACHE)
 
     # 直近 1 年分のみでバックテスト（MA200 が既に収束済み）
-    df = df_full.iloc[-BACKTEST_DAYS:].copy()
-
-    trades     = []
-    buy_dates  = []
-    in_position  = False
-    buy_price    = 0
-    buy_date     = None
-    buy_strength = ''
-
-    for i in range(1, len(df)):
-        cutoff       = df.index[i] - pd.Timedelta(days=7)
-        recent_trade = any(bd > cutoff for bd in buy_dates)
-
-        sig = df['signal_strength'].iloc[i-1]
-        signal_ok = (sig == 'strong') if min_strength == 'strong' else (sig != '')
-        if signal_ok and not in_position and not recent_trade:
-            buy_price    = df['Open'].iloc[i]
-            buy_date     = df.index[i]
-            buy_strength = df['signal_strength'].iloc[i-1]
-            buy_dates.append(buy_date)
-            in_position  = True
-
-        elif in_position and len(df.iloc[:i]) - len(df.loc[:buy_date]) >= EXIT_DAYS:
-            sell_price = df['Close'].iloc[i]
-            profit     = sell_price - buy_price
-            trades.append({
-                '強度':      f"{_strength_icon(buy_strength)} {buy_strength}",
-                '購入日':    buy_date.strftime('%Y-%m-%d'),
-                '購入単価':  round(buy_price, 2),
-                '売却日':    df.index[i].strftime('%Y-%m-%d'),
-                '売却単価':  round(sell_price, 2),
-                '利益':      round(profit, 2),
-                '騰落率(%)': round((profit / buy_price) * 100, 2),
-            })
-            in_position = False
+    df    = df_full.iloc[-BACKTEST_DAYS:]
+    codes = codes[-BACKTEST_DAYS:]
+
+    with stage('simulate'):
+        buys, sells, _ = simulate_trades(df.index.values, signal_mask(codes, min_strength), EXIT_DAYS, calendar=NYSE)
+    count('trades', len(buys))
+    opens, closes  = df['Open'].to_numpy(), df['Close'].to_numpy()
+
+    trades = []
+    for b, s in zip(buys, sells):
+        buy_price    = opens[b]
+        sell_price   = closes[s]
+        buy_strength = STRENGTH_LABELS[codes[b - 1]]
+        profit       = sell_price - buy_price
+        trades.append({
+            '強度':      f"{_strength_icon(buy_strength)} {buy_strength}",
+            '購入日':    df.index[b].strftime('%Y-%m-%d'),
+            '購入単価':  round(buy_price, 2),
+            '売却日':    df.index[s].strftime('%Y-%m-%d'),
+            '売却単価':  round(sell_price, 2),
+            '利益':      round(profit, 2),
+            '騰落率(%)': round((profit / buy_price) * 100, 2),
+        })
 
     results  = pd.DataFrame(trades)
     strong_r = results[results['強度'].str.contains('strong')] if not results.empty else pd.DataFrame()
@@ -190,13 +136,390 @@ def run_backtest(symbol, signal_func, min_strength='any'):
     }
 
 
+# =============================
+# パラメータスイープ
+# =============================
+
+# 銘柄ごとの既定グリッド。exit_days 以外のキーは strategies.json の戦略パラメータ
+SWEEP_GRIDS = {
+    'JMIA': {
+        'rsi_threshold': [25, 30, 35, 40, 45],
+        'vol_threshold': [0.0, 0.02, 0.03, 0.04, 0.05],
+        'exit_days':     [5, 10, 15, 20],
+    },
+    'NU': {
+        'rsi_low':       [35, 40, 45],
+        'rsi_high':      [50, 55, 60],
+        'stoch_strong':  [20, 30, 40],
+        'stoch_medium':  [30, 40, 50],
+        'rsi_medium':    [45, 50, 55],
+        'exit_days':     [5, 10, 15],
+    },
+}
+
+SWEEP_DIR = 'sweep_results'
+SWEEP_BASE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+
+# ワーカープロセス側で共有メモリから組み立てた指標付き DataFrame
+_SWEEP_WORKER = {}
+
+
+def _trade_profits(codes, dates, opens, closes, min_strength, exit_days):
+    """決済済み取引の損益（run_backtest と同じく 2 桁に丸める）とエントリー時の強度コード。"""
+    buys, sells, _ = simulate_trades(dates, signal_mask(codes, min_strength), exit_days, calendar=NYSE)
+    return np.round(closes[sells] - opens[buys], 2), codes[buys - 1]
+
+
+def _signal_arrays(df_full, symbol, params):
+    params    = dict(params)
+    exit_days = params.pop('exit_days', EXIT_DAYS)
+    codes     = SIGNAL_CONFIG[symbol]['func'](df_full, **params)
+    return params, exit_days, codes, df_full.index.values, df_full['Open'].to_numpy(), df_full['Close'].to_numpy()
+
+
+def evaluate_params(df_full, symbol, params, min_strength='any', backtest_days=BACKTEST_DAYS):
+    """1 つのパラメータ組み合わせを評価し、強度別の取引数・勝率・損益を返す。
+    df_full は add_indicators 済みであること（指標は再計算しない）。
+    """
+    params, exit_days, codes, dates, opens, closes = _signal_arrays(df_full, symbol, params)
+    window = slice(-backtest_days, None)
+    profits, tiers = _trade_profits(codes[window], dates[window], opens[window], closes[window], min_strength, exit_days)
+
+    row = dict(params, exit_days=exit_days, trades=len(profits),
+               win_rate=float((profits > 0).mean()) if len(profits) else 0.0,
+               pnl=round(float(profits.sum()), 2))
+    for label in ('strong', 'medium'):
+        tier = profits[tiers == STRENGTH_CODES[label]]
+        row[f'{label}_trades']   = len(tier)
+        row[f'{label}_win_rate'] = float((tier > 0).mean()) if len(tier) else 0.0
+        row[f'{label}_pnl']      = round(float(tier.sum()), 2)
+    return row
+
+
+def evaluate_windows(df_full, symbol, params, min_strength, windows):
+    """ウォークフォワードの各ウィンドウについて (学習取引数, 学習損益, 検証取引数, 検証勝ち数, 検証損益) を返す。
+    シグナルは全期間で 1 回だけ計算し、ウィンドウごとにスライスして約定だけ再計算する。
+    """
+    _, exit_days, codes, dates, opens, closes = _signal_arrays(df_full, symbol, params)
+    out = []
+    for tr_lo, tr_hi, te_lo, te_hi in windows:
+        train, _ = _trade_profits(codes[tr_lo:tr_hi], dates[tr_lo:tr_hi], opens[tr_lo:tr_hi], closes[tr_lo:tr_hi], min_strength, exit_days)
+        test, _  = _trade_profits(codes[te_lo:te_hi], dates[te_lo:te_hi], opens[te_lo:te_hi], closes[te_lo:te_hi], min_strength, exit_days)
+        out.append((len(train), float(train.sum()), len(test), int((test > 0).sum()), float(test.sum())))
+    return out
+
+
+def _share_frame(df_full):
+    """OHLC + 指標列を 1 つの共有メモリブロック（列 x バー の float64）に書き出す。"""
+    columns = SWEEP_BASE_COLUMNS + INDICATOR_COLUMNS
+    shm  = shared_memory.SharedMemory(create=True, size=max(1, len(columns) * len(df_full) * 8))
+    data = np.ndarray((len(columns), len(df_full)), dtype=np.float64, buffer=shm.buf)
+    for k, col in enumerate(columns):
+        data[k] = df_full[col].to_numpy(dtype=np.float64)
+    return shm, columns
+
+
+def _sweep_init(shm_name, columns, dates, symbol, min_strength, backtest_days, windows):
+    shm  = shared_memory.SharedMemory(name=shm_name)
+    data = np.ndarray((len(columns), len(dates)), dtype=np.float64, buffer=shm.buf)
+    # 共有メモリ上の配列をそのまま列として参照する（コピーしない）
+    df = pd.DataFrame({col: data[k] for k, col in enumerate(columns)}, index=pd.DatetimeIndex(dates), copy=False)
+    _SWEEP_WORKER.update(shm=shm, df=df, symbol=symbol, min_strength=min_strength,
+                         backtest_days=backtest_days, windows=windows)
+
+
+def _sweep_worker(params):
+    w = _SWEEP_WORKER
+    return evaluate_params(w['df'], w['symbol'], params, w['min_strength'], w['backtest_days'])
+
+
+def _walk_forward_worker(params):
+    w = _SWEEP_WORKER
+    return evaluate_windows(w['df'], w['symbol'], params, w['min_strength'], w['windows'])
+
+
+def _map_configs(df_full, symbol, configs, worker, min_strength, workers,
+                 backtest_days=BACKTEST_DAYS, windows=None):
+    """指標付き df_full を共有メモリに置き、configs をプロセスプールで評価する。"""
+    shm, columns = _share_frame(df_full)
+    try:
+        init_args = (shm.name, columns, df_full.index.values, symbol, min_strength, backtest_days, windows)
+        chunksize = max(1, len(configs) // ((workers or os.cpu_count() or 1) * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_sweep_init, initargs=init_args) as pool:
+            return list(pool.map(worker, configs, chunksize=chunksize))
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _expand_grid(grid):
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def run_sweep(symbol, grid=None, min_strength=None, workers=None, backtest_days=BACKTEST_DAYS):
+    """グリッド上の全組み合わせをプロセスプールで評価し、損益順の結果表を返す。
+    指標は銘柄ごとに 1 回だけ計算し、共有メモリ経由でワーカーに渡す。
+    """
+    grid         = grid or SWEEP_GRIDS[symbol]
+    min_strength = min_strength or SIGNAL_CONFIG[symbol]['min_strength']
+    configs      = _expand_grid(grid)
+    print(f"--- 【{symbol}】 パラメータスイープ開始 ({len(configs)}通り / 強度フィルター: {min_strength}) ---")
+
+    df_full = load_backtest_data(symbol)
+    if df_full.empty:
+        print(f"【エラー】{symbol} のデータ取得に失敗しました。")
+        return pd.DataFrame()
+    with stage('indicators'):
+        df_full, _ = add_cached_indicators(df_full, symbol, SIGNAL_CACHE)
+
+    rows    = _map_configs(df_full, symbol, configs, _sweep_worker, min_strength, workers, backtest_days)
+    results = pd.DataFrame(rows).sort_values(['pnl', 'win_rate', 'trades'], ascending=[False, False, False])
+    results = results.reset_index(drop=True)
+    os.makedirs(SWEEP_DIR, exist_ok=True)
+    path = os.path.join(SWEEP_DIR, f"{symbol}.csv")
+    results.to_csv(path, index=False)
+    print(results.head(10).to_string(index=False))
+    print(f"【完了】{len(results)}通りの結果を保存しました: {path}")
+    print()
+    return results
+
+
+# =============================
+# ウォークフォワード
+# =============================
+
+WF_PERIOD     = '10y'  # 履歴が足りない場合に取得する期間
+WF_WARMUP     = 200    # MA200 が揃うまでのバー数（最初の学習ウィンドウの前に確保）
+WF_TRAIN_DAYS = 504    # 学習ウィンドウ（営業日数 ≒ 2年）
+WF_TEST_DAYS  = 126    # 検証ウィンドウ（営業日数 ≒ 半年）
+
+
+def make_windows(n_bars, train_days=WF_TRAIN_DAYS, test_days=WF_TEST_DAYS, step_days=None, warmup=WF_WARMUP):
+    """(学習開始, 学習終了, 検証開始, 検証終了) のバー番号リスト。終了は含まない。"""
+    step_days = step_days or test_days
+    windows   = []
+    start     = warmup + train_days
+    while start + test_days <= n_bars:
+        windows.append((start - train_days, start, start, start + test_days))
+        start += step_days
+    return windows
+
+
+def run_walk_forward(symbol, grid=None, min_strength=None, workers=None, train_days=WF_TRAIN_DAYS,
+                     test_days=WF_TEST_DAYS, step_days=None, period=WF_PERIOD):
+    """学習ウィンドウで損益最大のパラメータを選び、直後の検証ウィンドウで評価する。
+    指標は全期間で 1 回だけ計算し、全ウィンドウ・全パラメータで使い回す。
+    """
+    grid         = grid or SWEEP_GRIDS[symbol]
+    min_strength = min_strength or SIGNAL_CONFIG[symbol]['min_strength']
+    configs      = _expand_grid(grid)
+
+    df_full = load_backtest_data(symbol, min_bars=WF_WARMUP + train_days + test_days, period=period)
+    windows = make_windows(len(df_full), train_days, test_days, step_days)
+    print(f"--- 【{symbol}】 ウォークフォワード開始 ({len(configs)}通り x {len(windows)}ウィンドウ"
+          f" / 学習 {train_days}日 / 検証 {test_days}日) ---")
+    if not windows:
+        print(f"【エラー】{symbol} の履歴が不足しています ({len(df_full)}行)。")
+        return pd.DataFrame()
+    with stage('indicators'):
+        df_full, _ = add_cached_indicators(df_full, symbol, SIGNAL_CACHE)
+
+    stats = np.asarray(_map_configs(df_full, symbol, configs, _walk_forward_worker, min_strength, workers,
+                                    windows=windows))  # (パラメータ, ウィンドウ, 指標)
+    dates = df_full.index
+    rows  = []
+    for w, (tr_lo, tr_hi, te_lo, te_hi) in enumerate(windows):
+        best = int(np.argmax(stats[:, w, 1]))
+        train_trades, train_pnl, test_trades, test_wins, test_pnl = stats[best, w]
+        rows.append(dict(
+            window=w + 1,
+            train_start=dates[tr_lo].strftime('%Y-%m-%d'), train_end=dates[tr_hi - 1].strftime('%Y-%m-%d'),
+            test_start=dates[te_lo].strftime('%Y-%m-%d'),  test_end=dates[te_hi - 1].strftime('%Y-%m-%d'),
+            **configs[best],
+            train_trades=int(train_trades), train_pnl=round(train_pnl, 2),
+            test_trades=int(test_trades),
+            test_win_rate=test_wins / test_trades if test_trades else 0.0,
+            test_pnl=round(test_pnl, 2),
+        ))
+    results = pd.DataFrame(rows)
+
+    os.makedirs(SWEEP_DIR, exist_ok=True)
+    path = os.path.join(SWEEP_DIR, f"{symbol}_walk_forward.csv")
+    results.to_csv(path, index=False)
+    print(results.to_string(index=False))
+    print("-" * 52)
+    total_trades = int(results['test_trades'].sum())
+    total_wins   = float((results['test_win_rate'] * results['test_trades']).sum())
+    print(f"検証合計    : {total_trades}回 / 勝率 {total_wins / total_trades if total_trades else 0.0:.0%}"
+          f" / 累計損益 ${results['test_pnl'].sum():+.2f}")
+    print(f"学習合計    : 累計損益 ${results['train_pnl'].sum():+.2f}（選択パラメータの学習期間成績）")
+    print(f"勝ちウィンドウ: {(results['test_pnl'] > 0).sum()}/{len(results)}")
+    print(f"【完了】ウィンドウ別の結果を保存しました: {path}")
+    print()
+    return results
+
+
+# =============================
+# ポートフォリオ（共有資金・複数銘柄を同時保有）
+# =============================
+
+PORTFOLIO_DIR           = 'portfolio_results'
+PORTFOLIO_CASH          = 10_000.0
+PORTFOLIO_MAX_POSITIONS = 5
+
+
+def load_barset(symbols, min_bars=BACKTEST_DAYS + WF_WARMUP, period='2y'):
+    """銘柄ごとの履歴を共通カレンダーの BarSet（float32）に揃え、指標と強度コードを計算する。
+    min_strength に満たないコードは 0 にする。データの無い銘柄は含めない。
+    """
+    def load(symbol):
+        with stage('load'):
+            return load_backtest_data(symbol, min_bars=min_bars, period=period)
+
+    bars = BarSet.from_loader(symbols, load)
+    for symbol in symbols:
+        if symbol not in bars:
+            print(f"【エラー】{symbol} のデータ取得に失敗しました。")
+    with stage('indicators'):
+        bars.add_indicators(SIGNAL_CACHE)
+    with stage('signals'):
+        bars.evaluate({s: SIGNAL_CONFIG[s]['func'] for s in bars.symbols}, SIGNAL_CACHE)
+        for j, symbol in enumerate(bars.symbols):
+            bars.codes[j, ~signal_mask(bars.codes[j], SIGNAL_CONFIG[symbol]['min_strength'])] = 0
+    return bars
+
+
+def run_portfolio(symbols, cash=PORTFOLIO_CASH, max_positions=PORTFOLIO_MAX_POSITIONS, sizing='equal', size=None,
+                  exit_days=EXIT_DAYS, days=BACKTEST_DAYS, period='2y'):
+    """共有資金で全銘柄を 1 回の日付順走査でバックテストし、評価額推移と取引一覧を保存する。
+    days: 直近何営業日を評価するか（0 なら MA200 のウォームアップ後の全期間）。
+    """
+    unknown = [s for s in symbols if s not in SIGNAL_CONFIG]
+    if unknown:
+        raise ValueError(f"strategies.json に戦略が割り当てられていない銘柄です: {', '.join(unknown)}")
+    check_sizing(sizing, size)
+    size_label = {'equal': f"均等 1/{max_positions}", 'fraction': f"評価額 x {size}",
+                  'cash': f"${size}", 'shares': f"{size}株"}[sizing]
+    print(f"--- ポートフォリオ・バックテスト開始 ({len(symbols)}銘柄 / 資金 ${cash:,.0f} / 最大 {max_positions}銘柄"
+          f" / サイズ: {size_label} / エグジット: {exit_days}営業日) ---")
+
+    bars = load_barset(symbols, min_bars=(days or 0) + WF_WARMUP, period=period)
+    if not bars.symbols:
+        return {}
+    start = max(WF_WARMUP, len(bars) - days) if days else WF_WARMUP
+    bars  = bars.window(min(start, len(bars) - 1))  # ビュー（コピーしない）
+    dates, used = bars.dates, bars.symbols
+
+    with stage('simulate'):
+        result = simulate_portfolio(dates.values, bars.column('Open'), bars.column('Close'), bars.code_matrix(),
+                                    exit_days, initial_cash=cash, max_positions=max_positions, sizing=sizing, size=size,
+                                    calendar=NYSE)
+    stats = portfolio_stats(result, dates.values, cash)
+    count('trades', stats['trades'])
+
+    os.makedirs(PORTFOLIO_DIR, exist_ok=True)
+    equity = pd.DataFrame({
+        'equity':    result['equity'].round(2),
+        'cash':      result['cash'].round(2),
+        'exposure':  result['exposure'].round(4),
+        'positions': result['positions'],
+        'drawdown':  (result['equity'] / np.maximum.accumulate(result['equity']) - 1).round(4),
+    }, index=dates)
+    equity.to_csv(os.path.join(PORTFOLIO_DIR, 'equity.csv'))
+
+    tr = result['trades']
+    trades = pd.DataFrame({
+        '銘柄':     [used[j] for j in tr['symbol']],
+        '購入日':   [dates[i].strftime('%Y-%m-%d') for i in tr['buy']],
+        '購入単価': tr['buy_price'].round(2),
+        '株数':     tr['shares'],
+        '売却日':   [dates[i].strftime('%Y-%m-%d') if i >= 0 else '保有中' for i in tr['sell']],
+        '売却単価': tr['sell_price'].round(2),
+        '損益':     ((tr['sell_price'] - tr['buy_price']) * tr['shares']).round(2),
+    }).sort_values(['購入日', '銘柄'], kind='stable')
+    trades.to_csv(os.path.join(PORTFOLIO_DIR, 'trades.csv'), index=False)
+
+    print(f"期間        : {dates[0].strftime('%Y-%m-%d')} 〜 {dates[-1].strftime('%Y-%m-%d')} ({len(dates)}営業日)")
+    print(f"最終評価額  : ${stats['final_equity']:,.2f} (総リターン {stats['total_return']:+.1%} / 年率 {stats['cagr']:+.1%})")
+    print(f"最大DD      : {stats['max_drawdown']:.1%}")
+    print(f"投下比率    : 平均 {stats['avg_exposure']:.0%} / 最大同時保有 {stats['max_positions']}銘柄")
+    print(f"取引        : 決済 {stats['trades']}回 / 勝率 {stats['win_rate']:.0%} / 実現損益 ${stats['realized_pnl']:+,.2f}"
+          f" / 期末保有 {stats['open']}銘柄")
+    print(f"【完了】評価額推移と取引一覧を保存しました: {PORTFOLIO_DIR}/equity.csv, {PORTFOLIO_DIR}/trades.csv")
+    print()
+    return stats
+
+
 # =============================
 # メイン実行 & 比較出力
 # =============================
 
-if __name__ == "__main__":
-    r_jmia = run_backtest('JMIA', get_jmia_signal)
-    r_nu   = run_backtest('NU',   get_nu_signal, min_strength='strong')
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='バックテスト / パラメータスイープ')
+    parser.add_argument('--sweep', action='store_true', help='パラメータスイープを実行する')
+    parser.add_argument('--walk-forward', action='store_true', help='ウォークフォワード検証を実行する')
+    parser.add_argument('--portfolio', action='store_true', help='共有資金のポートフォリオ・バックテストを実行する')
+    parser.add_argument('--cash', type=float, default=PORTFOLIO_CASH, help='ポートフォリオの初期資金')
+    parser.add_argument('--max-positions', type=int, default=PORTFOLIO_MAX_POSITIONS, help='同時保有の上限銘柄数')
+    parser.add_argument('--sizing', choices=SIZING_MODES, default='equal',
+                        help='ポジションサイズ（equal=評価額/上限数, fraction=評価額x--size, cash=--size ドル, shares=--size 株）')
+    parser.add_argument('--size', type=float, default=None, help='--sizing の値')
+    parser.add_argument('--days', type=int, default=BACKTEST_DAYS, help='ポートフォリオの評価期間（営業日。0 で全期間）')
+    parser.add_argument('--exit-days', type=int, default=EXIT_DAYS, help='ポートフォリオのエグジット営業日数')
+    parser.add_argument('--train-days', type=int, default=WF_TRAIN_DAYS, help='学習ウィンドウの営業日数')
+    parser.add_argument('--test-days', type=int, default=WF_TEST_DAYS, help='検証ウィンドウの営業日数')
+    parser.add_argument('--step-days', type=int, default=None, help='ウィンドウの移動幅（既定: 検証日数）')
+    parser.add_argument('--period', default=WF_PERIOD, help='履歴が足りない場合の取得期間')
+    parser.add_argument('--symbols', nargs='+', default=list(SIGNAL_CONFIG), help='対象の銘柄（スイープ / ウォークフォワード / ポートフォリオ）')
+    parser.add_argument('--grid', help='グリッド定義の JSON ファイル（{銘柄: {パラメータ: [値, ...]}}）')
+    parser.add_argument('--workers', type=int, default=None, help='ワーカープロセス数（既定: CPU 数）')
+    parser.add_argument('--no-cache', action='store_true', help='指標・強度コードのディスクキャッシュを使わない')
+    parser.add_argument('--profile', choices=run_metrics.PROFILE_MODES, help='プロファイラを有効にする')
+    parser.add_argument('--report', help='実行レポート（JSON Lines）の追記先')
+    args = parser.parse_args(argv)
+    if args.portfolio:
+        try:
+            check_sizing(args.sizing, args.size)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
+
+
+def _finish(metrics, report_path):
+    print(metrics.summary())
+    if report_path:
+        metrics.save(report_path)
+
+
+def _main(args):
+    global SIGNAL_CACHE
+    if args.no_cache:
+        SIGNAL_CACHE = None
+    metrics = run_metrics.start_run('backtest')
+    if args.portfolio:
+        run_portfolio(args.symbols, cash=args.cash, max_positions=args.max_positions, sizing=args.sizing,
+                      size=args.size, exit_days=args.exit_days, days=args.days, period=args.period)
+        _finish(metrics, args.report)
+        return
+    if args.sweep or args.walk_forward:
+        grids = SWEEP_GRIDS
+        if args.grid:
+            with open(args.grid, encoding='utf-8') as f:
+                grids = {**SWEEP_GRIDS, **json.load(f)}
+        for symbol in args.symbols:
+            if args.walk_forward:
+                with stage('walk_forward'):
+                    run_walk_forward(symbol, grids[symbol], workers=args.workers, train_days=args.train_days,
+                                     test_days=args.test_days, step_days=args.step_days, period=args.period)
+            else:
+                with stage('sweep'):
+                    run_sweep(symbol, grids[symbol], workers=args.workers)
+        _finish(metrics, args.report)
+        return
+
+    r_jmia = run_backtest('JMIA', SIGNAL_CONFIG['JMIA']['func'], SIGNAL_CONFIG['JMIA']['min_strength'])
+    r_nu   = run_backtest('NU',   SIGNAL_CONFIG['NU']['func'],   SIGNAL_CONFIG['NU']['min_strength'])
 
     # ── strong / medium 件数・勝率・平均損益サマリー ──
     print("=" * 60)
@@ -231,3 +554,10 @@ if __name__ == "__main__":
     print(f"  今回 (weak廃止) : {curr['total']}回  strong={curr['strong']} medium={curr['medium']}          累計 ${curr['pnl']:+.2f}")
     print(f"  変化            : 取引数 {-removed_total:+d}回 (weak {removed_weak}件削除) / 損益差 ${pnl_diff:+.2f}")
     print("=" * 60)
+    _finish(metrics, args.report)
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    with run_metrics.profile(args.profile, 'backtest'):
+        _main(args)
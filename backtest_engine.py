@@ -0,0 +1,244 @@
+"""配列ベースのバックテストエンジン
+
+run_backtest の 1 バーずつのループと同じ約定ルールを NumPy 配列上で処理する。
+  - 前日のシグナルで当日の始値エントリー
+  - 直近の購入日から COOLDOWN_SESSIONS 営業日は新規エントリーしない
+    （calendar を渡すと取引所の営業日で数える。祝日を挟んでも冷却期間が短くならない。無ければバー数）
+  - エントリーから exit_days 営業日経過した次のバーの終値で決済
+    （calendar を渡すと取引所の営業日で数える。データにバーの欠けがあっても決済日がずれない）
+  - 保有中はシグナルを無視（1 ポジションのみ）
+シグナル候補と日付を searchsorted で飛ばすため、計算量はバー数ではなく取引数に比例する。
+"""
+import numpy as np
+
+COOLDOWN_SESSIONS = 5  # 冷却期間（営業日）。祝日の無い週なら従来の 7 暦日と同じ
+
+
+def _as_ns(dates):
+    dates = np.asarray(dates)
+    if np.issubdtype(dates.dtype, np.datetime64):
+        dates = dates.astype('datetime64[ns]')
+    return dates.view('int64')
+
+
+def exit_bars(dates, entries, exit_days, calendar=None):
+    """entries（エントリーのバー番号）ごとの決済バー番号。
+    calendar が無ければ exit_days+1 本後、あれば exit_days+1 営業日後（以降の最初のバー）。
+    """
+    entries = np.asarray(entries, dtype=np.int64)
+    if calendar is None:
+        return entries + exit_days + 1
+    days = _as_ns(dates).view('datetime64[ns]').astype('datetime64[D]')
+    return np.searchsorted(days, calendar.offset(days[entries], exit_days + 1)).astype(np.int64)
+
+
+def cooldown_until(dates, cooldown_sessions, calendar=None):
+    """各バーで購入した場合に、次のエントリーが可能になる日（int64 ナノ秒）。
+    calendar があれば cooldown_sessions 営業日後、無ければ cooldown_sessions 本後のバーの日付。
+    """
+    dates = _as_ns(dates)
+    if calendar is not None:
+        days = dates.view('datetime64[ns]').astype('datetime64[D]')
+        return calendar.offset(days, cooldown_sessions).astype('datetime64[ns]').view('int64')
+    out = np.full(len(dates), np.iinfo(np.int64).max)
+    if cooldown_sessions < len(dates):
+        out[:len(dates) - cooldown_sessions] = dates[cooldown_sessions:]
+    return out
+
+
+def simulate_trades(dates, signal, exit_days, cooldown_sessions=COOLDOWN_SESSIONS, calendar=None):
+    """エントリー/決済のバー番号を返す。
+
+    dates    : 日付（datetime64 または int64 ナノ秒）
+    signal   : バーごとのシグナル可否（bool）。i 本目のシグナルで i+1 本目に約定
+    calendar : 決済日・冷却期間を営業日で数える TradingCalendar（省略時はバー数で数える）
+    戻り値   : (buy_idx, sell_idx, open_idx)
+               buy_idx/sell_idx は決済済み取引、open_idx は期末に保有中のエントリー（無ければ -1）
+    """
+    dates  = _as_ns(dates)
+    signal = np.asarray(signal, dtype=bool)
+    n      = len(dates)
+    cool   = cooldown_until(dates, cooldown_sessions, calendar)
+
+    candidates = np.flatnonzero(signal[:-1]) + 1
+    exits      = exit_bars(dates, candidates, exit_days, calendar)
+    buys, sells = [], []
+    open_idx = -1
+    pos = 1
+    while True:
+        k = np.searchsorted(candidates, pos)
+        if k == len(candidates):
+            break
+        i = int(candidates[k])
+        if buys:
+            allowed = int(np.searchsorted(dates, cool[buys[-1]], side='left'))
+            if i < allowed:
+                pos = allowed
+                continue
+        exit_i = int(exits[k])
+        if exit_i >= n:
+            open_idx = i
+            break
+        buys.append(i)
+        sells.append(exit_i)
+        pos = exit_i + 1
+    return np.asarray(buys, dtype=np.int64), np.asarray(sells, dtype=np.int64), open_idx
+
+
+# =============================
+# ポートフォリオ（複数銘柄・共有資金）
+# =============================
+
+SIZING_MODES = ('equal', 'fraction', 'cash', 'shares')
+
+
+def check_sizing(sizing, size):
+    """ポジションサイズの指定を検証する（不正なら ValueError）。equal 以外は size が必須。"""
+    if sizing not in SIZING_MODES:
+        raise ValueError(f"未対応のポジションサイズです: {sizing}（{' / '.join(SIZING_MODES)}）")
+    if sizing == 'equal':
+        return
+    if size is None:
+        raise ValueError(f"--sizing {sizing} には --size の指定が必要です")
+    if sizing == 'fraction' and not 0 < size <= 1:
+        raise ValueError(f"--sizing fraction の --size は 0 より大きく 1 以下の比率で指定してください: {size}")
+    if sizing == 'cash' and not size > 0:
+        raise ValueError(f"--sizing cash の --size は正の金額で指定してください: {size}")
+    if sizing == 'shares' and not size >= 1:
+        raise ValueError(f"--sizing shares の --size は 1 以上の株数で指定してください: {size}")
+
+
+def simulate_portfolio(dates, opens, closes, codes, exit_days, initial_cash=10_000.0, max_positions=5,
+                       sizing='equal', size=None, min_code=1, cooldown_sessions=COOLDOWN_SESSIONS,
+                       calendar=None):
+    """全銘柄を日付順に 1 回走査し、共有資金でのポートフォリオを評価する。
+
+    dates  : 共通カレンダー（長さ T）
+    opens / closes : (T, N) の価格。その銘柄のバーが無い日は NaN
+    codes  : (T, N) の int8 強度コード。min_code 以上を買いシグナルとする
+    約定ルールは simulate_trades と同じ（銘柄自身の次のバーの始値で買い、exit_days 本後の次のバーの終値で売り、
+    直近の購入から cooldown_sessions 営業日は再エントリーしない、1 銘柄 1 ポジション）。
+    同じ日の候補が空き枠を超える場合は強度コードの高い順、同じ強度なら列順で約定する。
+    calendar を渡すと決済日・冷却期間を取引所の営業日で数える（銘柄のバー数ではなく）。
+
+    sizing : 'equal'    = 評価額 / max_positions
+             'fraction' = 評価額 x size
+             'cash'     = size ドル
+             'shares'   = size 株（固定株数）
+    株数は整数に切り捨て、現金が足りない分は買わない。
+
+    戻り値の dict:
+      equity / cash / exposure / positions : 日次の評価額・現金・投下比率・保有銘柄数（長さ T）
+      trades : 銘柄列・買い/売りのバー番号・株数・買値・売値の配列（期末保有中は sell=-1 / 売値は最終終値）
+    """
+    check_sizing(sizing, size)
+    dates  = _as_ns(dates)
+    opens  = np.asarray(opens)   # float32 / float64 のどちらでも可（コピーしない）
+    closes = np.asarray(closes)
+    codes  = np.asarray(codes)
+    n_days, n_sym = closes.shape
+    cool    = cooldown_until(dates, cooldown_sessions, calendar)
+    has_bar = ~np.isnan(closes)
+    if calendar is not None:
+        # 各バーでエントリーした場合の決済日（exit_days+1 営業日後）
+        days      = dates.view('datetime64[ns]').astype('datetime64[D]')
+        exit_date = calendar.offset(days, exit_days + 1).astype('datetime64[ns]').view('int64')
+
+    cash       = float(initial_cash)
+    shares     = np.zeros(n_sym, dtype=np.int64)
+    held_bars  = np.zeros(n_sym, dtype=np.int64)   # エントリーから経過した銘柄自身のバー数
+    exit_due   = np.zeros(n_sym, dtype=np.int64)   # calendar 使用時の決済日（ナノ秒）
+    buy_idx    = np.full(n_sym, -1, dtype=np.int64)
+    buy_price  = np.zeros(n_sym)
+    next_entry = np.full(n_sym, np.iinfo(np.int64).min, dtype=np.int64)  # 冷却期間が明ける日
+    last_close = np.zeros(n_sym)
+    pending    = np.zeros(n_sym, dtype=np.int8)    # 前のバーのシグナル強度（次のバーの始値で約定）
+
+    equity    = np.empty(n_days)
+    cash_hist = np.empty(n_days)
+    exposure  = np.empty(n_days)
+    positions = np.empty(n_days, dtype=np.int64)
+    trades    = {'symbol': [], 'buy': [], 'sell': [], 'shares': [], 'buy_price': [], 'sell_price': []}
+
+    for t in range(n_days):
+        bar = has_bar[t]
+
+        # 1. 始値でエントリー（シグナルは銘柄自身の次のバーで消化する）
+        cand = np.flatnonzero(bar & (pending >= min_code) & (shares == 0) & (dates[t] >= next_entry))
+        n_open = int(np.count_nonzero(shares))
+        if len(cand) and n_open < max_positions:
+            cand = cand[np.argsort(-pending[cand], kind='stable')]
+            equity_open = cash + float(shares @ last_close)
+            for j in cand[:max_positions - n_open]:
+                price = opens[t, j]
+                if not price > 0:
+                    continue
+                if sizing == 'shares':
+                    qty = int(size) if size * price <= cash else 0
+                else:
+                    target = {'equal': equity_open / max_positions, 'fraction': equity_open * (size or 0.0),
+                              'cash': size or 0.0}[sizing]
+                    qty = int(min(target, cash) // price)
+                if qty <= 0:
+                    continue
+                cash        -= qty * price
+                shares[j]    = qty
+                held_bars[j] = 0
+                buy_idx[j]   = t
+                buy_price[j] = price
+                next_entry[j] = cool[t]
+                if calendar is not None:
+                    exit_due[j] = exit_date[t]
+        pending[bar] = 0
+
+        # 2. 終値で決済（銘柄自身のバーで exit_days+1 本目、calendar 使用時は決済日以降の最初のバー）
+        held = (shares > 0) & bar & (buy_idx < t)
+        held_bars[held] += 1
+        due  = held & (dates[t] >= exit_due) if calendar is not None else held & (held_bars >= exit_days + 1)
+        for j in np.flatnonzero(due):
+            price = closes[t, j]
+            cash += shares[j] * price
+            for key, value in (('symbol', j), ('buy', buy_idx[j]), ('sell', t), ('shares', shares[j]),
+                               ('buy_price', buy_price[j]), ('sell_price', price)):
+                trades[key].append(value)
+            shares[j] = 0
+
+        # 3. 当日のシグナルと評価額
+        pending[bar] = codes[t][bar]
+        last_close[bar] = closes[t][bar]
+        invested     = float(shares @ last_close)
+        equity[t]    = cash + invested
+        cash_hist[t] = cash
+        exposure[t]  = invested / equity[t] if equity[t] > 0 else 0.0
+        positions[t] = np.count_nonzero(shares)
+
+    for j in np.flatnonzero(shares):
+        for key, value in (('symbol', j), ('buy', buy_idx[j]), ('sell', -1), ('shares', shares[j]),
+                           ('buy_price', buy_price[j]), ('sell_price', last_close[j])):
+            trades[key].append(value)
+
+    trades = {k: np.asarray(v, dtype=np.float64 if 'price' in k else np.int64) for k, v in trades.items()}
+    return {'equity': equity, 'cash': cash_hist, 'exposure': exposure, 'positions': positions, 'trades': trades}
+
+
+def portfolio_stats(result, dates, initial_cash):
+    """評価額の推移から総リターン・年率・最大ドローダウン・平均投下比率・取引統計を求める。"""
+    equity = result['equity']
+    trades = result['trades']
+    closed = trades['sell'] >= 0
+    pnl    = (trades['sell_price'] - trades['buy_price']) * trades['shares']
+    years  = (np.asarray(dates[-1]) - np.asarray(dates[0])).astype('timedelta64[D]').astype(int) / 365.25 if len(dates) > 1 else 0
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+    final    = float(equity[-1]) if len(equity) else initial_cash
+    return {
+        'final_equity':  final,
+        'total_return':  final / initial_cash - 1,
+        'cagr':          float((final / initial_cash) ** (1 / years) - 1) if years > 0 and final > 0 else 0.0,
+        'max_drawdown':  float(drawdown.min()) if len(drawdown) else 0.0,
+        'avg_exposure':  float(result['exposure'].mean()) if len(equity) else 0.0,
+        'max_positions': int(result['positions'].max()) if len(equity) else 0,
+        'trades':        int(closed.sum()),
+        'open':          int((~closed).sum()),
+        'win_rate':      float((pnl[closed] > 0).mean()) if closed.any() else 0.0,
+        'realized_pnl':  float(pnl[closed].sum()),
+    }
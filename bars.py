@@ -0,0 +1,168 @@
+"""複数銘柄のバーを省メモリで保持するコンテナ
+
+銘柄ごとの DataFrame（float64 の OHLCV + 指標列 + object 型の強度列）の代わりに、
+  - 全銘柄で共有する 1 本の日付インデックス（共通カレンダー）
+  - 列ごとの (銘柄数, 日数) float32 配列（その銘柄にバーが無い日は NaN）
+  - int8 の強度コード配列
+で保持する。期間の切り出し（tail / window）・銘柄の取り出しはコピーせずビューを返す。
+DataFrame との変換は入口（from_frames）と出口（to_frame）だけで行う。
+
+1 銘柄 x 1 年 x 12 列は float64 の DataFrame で約 24KB、BarSet では約 12KB（+ コード 252B）。
+"""
+import numpy as np
+import pandas as pd
+
+from history_store import OHLCV_COLUMNS
+from indicators import INDICATOR_COLUMNS, compute_indicators
+
+BAR_DTYPE = np.float32
+
+
+class BarSet:
+    """共通カレンダー上の複数銘柄のバー。data[列] は (銘柄, 日付) の配列。"""
+
+    def __init__(self, dates, symbols, data, codes=None):
+        self.dates   = pd.DatetimeIndex(dates, name='Date')
+        self.symbols = list(symbols)
+        self.data    = data
+        self.codes   = codes if codes is not None else np.zeros((len(self.symbols), len(self.dates)), dtype=np.int8)
+        self._pos    = {s: j for j, s in enumerate(self.symbols)}
+        self._keys   = {}  # 銘柄 -> 指標キャッシュのデータキー（add_indicators(cache) で設定）
+
+    @classmethod
+    def from_frames(cls, frames, columns=None, dtype=BAR_DTYPE):
+        """{symbol: DataFrame} から作る。カレンダーは全銘柄の日付の和集合。"""
+        frames  = {s: df for s, df in frames.items() if df is not None and not df.empty}
+        symbols = list(frames)
+        if columns is None:
+            columns = [c for c in OHLCV_COLUMNS + INDICATOR_COLUMNS if any(c in df for df in frames.values())]
+        dates = pd.DatetimeIndex(np.unique(np.concatenate(
+            [df.index.values.astype('datetime64[ns]') for df in frames.values()]
+        ))) if frames else pd.DatetimeIndex([])
+        data = {col: np.full((len(symbols), len(dates)), np.nan, dtype=dtype) for col in columns}
+        for j, symbol in enumerate(symbols):
+            df  = frames[symbol]
+            pos = dates.get_indexer(df.index)
+            for col in columns:
+                if col in df:
+                    data[col][j, pos] = df[col].to_numpy(dtype=np.float64)
+        return cls(dates, symbols, data)
+
+    @classmethod
+    def from_loader(cls, symbols, load, columns=OHLCV_COLUMNS, dtype=BAR_DTYPE):
+        """load(symbol) -> DataFrame を銘柄ごとに 2 回呼んで作る（1 回目は日付だけを集める）。
+        全銘柄の DataFrame を同時に持たないため、ピークのメモリは BarSet 本体 + 1 銘柄分で済む。
+        データの無い銘柄は含めない。
+        """
+        used, indexes = [], []
+        for symbol in symbols:
+            df = load(symbol)
+            if df is not None and not df.empty:
+                used.append(symbol)
+                indexes.append(df.index.values.astype('datetime64[ns]'))
+        dates = pd.DatetimeIndex(np.unique(np.concatenate(indexes))) if indexes else pd.DatetimeIndex([])
+        del indexes
+        data = {col: np.full((len(used), len(dates)), np.nan, dtype=dtype) for col in columns}
+        for j, symbol in enumerate(used):
+            df  = load(symbol)
+            pos = dates.get_indexer(df.index)
+            for col in columns:
+                if col in df:
+                    data[col][j, pos] = df[col].to_numpy(dtype=np.float64)
+        return cls(dates, used, data)
+
+    # --- 参照（すべてビュー） ---
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __contains__(self, symbol):
+        return symbol in self._pos
+
+    @property
+    def columns(self):
+        return list(self.data)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.data.values()) + self.codes.nbytes + self.dates.nbytes
+
+    def window(self, start=None, stop=None):
+        """日付方向のスライス（start:stop）。配列はコピーしない。"""
+        sl = slice(start, stop)
+        return BarSet(self.dates[sl], self.symbols, {c: a[:, sl] for c, a in self.data.items()}, self.codes[:, sl])
+
+    def tail(self, n):
+        return self.window(-n if n else len(self), None)
+
+    def column(self, col):
+        """(日付, 銘柄) 向きのビュー（ポートフォリオ・エンジン用）。"""
+        return self.data[col].T
+
+    def code_matrix(self):
+        return self.codes.T
+
+    def get(self, symbol):
+        """1 銘柄分の 列名 -> 1 次元ビュー（バーが無い日は NaN）。"""
+        j = self._pos[symbol]
+        return {col: a[j] for col, a in self.data.items()}
+
+    def valid(self, symbol):
+        return ~np.isnan(self.data['Close'][self._pos[symbol]])
+
+    # --- 計算 ---
+
+    def add_indicators(self, cache=None):
+        """銘柄ごとにバーのある日だけで指標を計算し、同じ dtype の列として追加する。
+        cache: signal_cache.SignalCache（内容が同じなら再計算せず、追加されたバーの分だけ計算する）。
+        """
+        dtype = self.data['Close'].dtype
+        for col in INDICATOR_COLUMNS:
+            if col not in self.data:
+                self.data[col] = np.full(self.data['Close'].shape, np.nan, dtype=dtype)
+        for j, symbol in enumerate(self.symbols):
+            ok = self.valid(symbol)
+            if not ok.any():
+                continue
+            if cache is not None:
+                base = {col: self.data[col][j, ok] for col in OHLCV_COLUMNS if col in self.data}
+                self._keys[symbol], ind = cache.indicators(base, self.dates.values[ok], symbol)
+            else:
+                ind = compute_indicators(self.data['High'][j, ok], self.data['Low'][j, ok], self.data['Close'][j, ok])
+            for col, values in ind.items():
+                self.data[col][j, ok] = values
+        return self
+
+    def evaluate(self, strategies, cache=None):
+        """strategies: {symbol: data -> int8 コード}。バーのある日だけで評価して codes に書き込む。
+        cache: add_indicators に渡したものと同じキャッシュ（強度コードもキャッシュする）。
+        """
+        for j, symbol in enumerate(self.symbols):
+            func = strategies.get(symbol)
+            ok   = self.valid(symbol)
+            if func is None or not ok.any():
+                continue
+            data = {col: a[j, ok] for col, a in self.data.items()}
+            key  = self._keys.get(symbol)
+            if cache is not None and key is not None and hasattr(func, 'lookback'):
+                self.codes[j, ok] = cache.codes(func, data, key)
+            else:
+                self.codes[j, ok] = func(data)
+        return self.codes
+
+    # --- DataFrame への変換（出口） ---
+
+    def to_frame(self, symbol, dtype=np.float64):
+        """1 銘柄分を DataFrame に戻す（バーの無い日は除く）。"""
+        ok = self.valid(symbol)
+        j  = self._pos[symbol]
+        df = pd.DataFrame({col: a[j, ok].astype(dtype) for col, a in self.data.items()}, index=self.dates[ok])
+        df.index.name = 'Date'
+        return df
+
+    def to_frames(self, dtype=np.float64):
+        return {symbol: self.to_frame(symbol, dtype) for symbol in self.symbols}
+
+    def __repr__(self):
+        return (f"BarSet({len(self.symbols)}銘柄 x {len(self.dates)}日, 列={len(self.data)},"
+                f" {self.nbytes / 1e6:.1f}MB)")
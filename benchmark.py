@@ -0,0 +1,253 @@
+"""ベンチマーク（指標計算 / シグナル判定 / バックテスト / 日次実行）
+
+乱数シード固定のランダムウォークで合成 OHLCV を作り、期間（1y/10y/30y）x 銘柄数（1/100/1000）で計測する。
+日次実行（main.main）はオフラインの FakeProvider と送信内容を捨てる通知の代役で計測する。
+
+  python benchmark.py [--quick] [--cases indicators,signals,backtest,daily]
+  python benchmark.py --save [JSON]     : 結果をベースラインとして保存（既定: benchmarks/baseline.json）
+  python benchmark.py --compare [JSON]  : ベースラインと比較（中央値の悪化があれば終了コード 1）
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import platform
+import statistics
+import tempfile
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+
+from backtest_engine import simulate_trades
+from indicators import HAVE_JIT, add_indicators, compute_indicators, signal_mask
+from strategies import load_registry
+
+if sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+BASELINE_FILE = os.path.join('benchmarks', 'baseline.json')
+PERIODS   = {'1y': 252, '10y': 2520, '30y': 7560}
+UNIVERSES = [1, 100, 1000]
+QUICK     = [('1y', 1), ('1y', 100), ('10y', 1), ('10y', 100)]
+CASES     = ['indicators', 'signals', 'backtest', 'daily']
+BENCH_STRATEGY = 'JMIA'  # 合成銘柄に割り当てる戦略（strategies.json の銘柄名）
+BENCH_END_DATE = '2026-05-08'  # 合成データの最終営業日（金曜）
+REGRESSION_THRESHOLD = 0.20  # 中央値がベースラインより 20% 超遅ければ悪化とみなす
+REGRESSION_MIN_MS    = 1.0   # ただし差が 1ms 未満なら計測誤差として扱う
+
+
+# =============================
+# 合成データ
+# =============================
+
+def synthetic_ohlcv(n_bars, seed, end=BENCH_END_DATE):
+    """対数リターン N(0, 2.5%) のランダムウォーク。High/Low は始値・終値の外側に広げる。"""
+    rng   = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.025, n_bars)))
+    open_ = close * np.exp(rng.normal(0, 0.01, n_bars))
+    high  = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.015, n_bars)))
+    low   = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.015, n_bars)))
+    index = pd.bdate_range(end=end, periods=n_bars, name='Date')
+    return pd.DataFrame({
+        'Close': close, 'High': high, 'Low': low, 'Open': open_,
+        'Volume': rng.integers(100_000, 10_000_000, n_bars),
+    }, index=index)
+
+
+def make_universe(n_symbols, n_bars, seed=0):
+    return {f"SYN{i:04d}": synthetic_ohlcv(n_bars, seed + i) for i in range(n_symbols)}
+
+
+# =============================
+# 計測
+# =============================
+
+def _measure(fn, repeat, setup=None, warmup=True):
+    """fn の実行時間（秒）を repeat 回計測する。setup は各回の前に実行し、計測には含めない。
+    warmup=True なら JIT のコンパイル・キャッシュ読み込みを除くため 1 回空実行する。
+    """
+    if warmup:
+        if setup:
+            setup()
+        fn()
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {'median': statistics.median(times), 'min': min(times), 'repeat': repeat}
+
+
+def bench_indicators(frames, repeat):
+    def run():
+        for df in frames.values():
+            compute_indicators(df['High'], df['Low'], df['Close'])
+    return _measure(run, repeat)
+
+
+def bench_signals(ind_frames, repeat):
+    strategy = load_registry()[BENCH_STRATEGY]
+
+    def run():
+        for df in ind_frames.values():
+            strategy(df)
+    return _measure(run, repeat)
+
+
+def bench_backtest(ind_frames, repeat, exit_days=10):
+    strategy = load_registry()[BENCH_STRATEGY]
+    inputs = [
+        (df.index.values, signal_mask(strategy(df), strategy.min_strength))
+        for df in ind_frames.values()
+    ]
+
+    def run():
+        for dates, signal in inputs:
+            simulate_trades(dates, signal, exit_days)
+    return _measure(run, repeat)
+
+
+def bench_daily(frames, repeat):
+    """main.main を 1 回実行する時間。前日までの履歴・指標状態がある定常状態から、最終バー 1 本を取り込む。"""
+    import main
+    from replay import NullNotifier
+    from data_provider import FakeProvider
+    from history_store import NpyHistoryStore
+    from indicator_state import advance, save_state
+
+    strategy = load_registry()[BENCH_STRATEGY]
+    symbols  = list(frames)
+    workdir  = tempfile.mkdtemp(prefix='bench_daily_')
+    seed_dir = os.path.join(workdir, 'seed')
+    run_dir  = os.path.join(workdir, 'run')
+    cwd      = os.getcwd()
+    saved    = {k: getattr(main, k) for k in ('SYMBOLS', 'SIGNAL_CONFIG', 'HISTORY_STORE')}
+    try:
+        # 前日までの状態を 1 回だけ作り、計測ごとにコピーして使う
+        os.makedirs(seed_dir)
+        os.chdir(seed_dir)
+        store = NpyHistoryStore()
+        for symbol, df in frames.items():
+            store.save(symbol, df.iloc[:-1])
+            save_state(symbol, advance(None, df.iloc[:-1]))
+
+        last = frames[symbols[0]].index[-1]
+        main.SYMBOLS             = symbols
+        main.SIGNAL_CONFIG       = {s: {'func': strategy, 'min_strength': strategy.min_strength} for s in symbols}
+        # 日本時間 18:00 = 米国東部の同日早朝（最終バーの翌営業日の実行を想定）
+        now      = datetime.datetime(last.year, last.month, last.day, 9, 0, tzinfo=datetime.timezone.utc) + datetime.timedelta(days=3)
+        provider = FakeProvider(frames)
+
+        def setup():
+            os.chdir(cwd)
+            shutil.rmtree(run_dir, ignore_errors=True)
+            shutil.copytree(seed_dir, run_dir)
+            os.chdir(run_dir)
+            main.HISTORY_STORE = NpyHistoryStore()
+
+        def run():
+            with redirect_stdout(io.StringIO()):
+                main.main(provider, report_path=None, clock=lambda: now, notifier=NullNotifier())
+        return _measure(run, repeat, setup, warmup=False)
+    finally:
+        os.chdir(cwd)
+        for k, v in saved.items():
+            setattr(main, k, v)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_suite(combos, cases, repeat=3):
+    results = {}
+    for period, n_symbols in combos:
+        n_bars = PERIODS[period]
+        frames = make_universe(n_symbols, n_bars)
+        ind_frames = {s: add_indicators(df) for s, df in frames.items()} if {'signals', 'backtest'} & set(cases) else {}
+        for case in cases:
+            key = f"{case}/{period}x{n_symbols}"
+            if case == 'indicators':
+                res = bench_indicators(frames, repeat)
+            elif case == 'signals':
+                res = bench_signals(ind_frames, repeat)
+            elif case == 'backtest':
+                res = bench_backtest(ind_frames, repeat)
+            else:
+                res = bench_daily(frames, max(1, repeat if n_symbols < 1000 else 1))
+            res['bars'] = n_bars * n_symbols
+            results[key] = res
+            print(f"  {key:<28} 中央値 {res['median'] * 1000:10.2f} ms / 最小 {res['min'] * 1000:10.2f} ms"
+                  f" ({res['bars'] / res['median'] / 1e6:8.2f} Mバー/秒)")
+    return results
+
+
+def environment():
+    return {
+        'python':   platform.python_version(),
+        'numpy':    np.__version__,
+        'pandas':   pd.__version__,
+        'jit':      HAVE_JIT,
+        'machine':  platform.machine(),
+        'platform': platform.platform(),
+        'cpus':     os.cpu_count(),
+        'date':     datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def save_baseline(path, results):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2, ensure_ascii=False)
+    print(f"【完了】ベースラインを保存しました: {path}")
+
+
+def compare(path, results, threshold=REGRESSION_THRESHOLD, min_ms=REGRESSION_MIN_MS):
+    """ベースラインと中央値を比較し、悪化したケース名のリストを返す。"""
+    with open(path, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    regressions = []
+    print(f"{'ケース':<30} {'基準(ms)':>10} {'今回(ms)':>10} {'変化':>8}")
+    for key, res in results.items():
+        if key not in baseline:
+            print(f"{key:<30} {'-':>10} {res['median'] * 1000:10.2f} {'(新規)':>8}")
+            continue
+        base  = baseline[key]['median']
+        ratio = res['median'] / base - 1 if base > 0 else 0.0
+        flag  = ''
+        if ratio > threshold and (res['median'] - base) * 1000 >= min_ms:
+            flag = ' ⚠️ 悪化'
+            regressions.append(key)
+        print(f"{key:<30} {base * 1000:10.2f} {res['median'] * 1000:10.2f} {ratio:+8.0%}{flag}")
+    return regressions
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description='ベンチマーク')
+    parser.add_argument('--quick', action='store_true', help=f"小さい組み合わせのみ {QUICK}")
+    parser.add_argument('--cases', default=','.join(CASES), help='計測するケース（カンマ区切り）')
+    parser.add_argument('--repeat', type=int, default=3, help='各ケースの繰り返し回数')
+    parser.add_argument('--save', nargs='?', const=BASELINE_FILE, help=f"結果をベースライン JSON として保存する（既定: {BASELINE_FILE}）")
+    parser.add_argument('--compare', nargs='?', const=BASELINE_FILE, help=f"ベースライン JSON と比較する（既定: {BASELINE_FILE}）")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help='悪化とみなす割合')
+    parser.add_argument('--min-ms', type=float, default=REGRESSION_MIN_MS, help='悪化とみなす最小の差（ms）')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args   = _parse_args()
+    combos = QUICK if args.quick else [(p, n) for p in PERIODS for n in UNIVERSES]
+    cases  = [c for c in args.cases.split(',') if c]
+    print(f"--- ベンチマーク開始 (JIT: {'numba' if HAVE_JIT else 'なし'}) ---")
+    results = run_suite(combos, cases, args.repeat)
+    if args.save:
+        save_baseline(args.save, results)
+    if args.compare:
+        regressions = compare(args.compare, results, args.threshold, args.min_ms)
+        if regressions:
+            print(f"【警告】{len(regressions)}件のケースで悪化を検出しました。")
+            sys.exit(1)
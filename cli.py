@@ -0,0 +1,77 @@
+"""コマンドラインの入口（サブコマンドが必要とするまで重いライブラリを読み込まない）
+
+  python cli.py daily [--profile cprofile|sample] [--report FILE]  : 日次チェック（main.py と同じ）
+  python cli.py backtest [backtest.py の引数]
+  python cli.py sweep [backtest.py の引数]    : backtest --sweep と同じ
+  python cli.py screen [screener.py の引数]
+  python cli.py replay [replay.py の引数]
+  python cli.py intraday [intraday.py の引数]  : 日中モード（常駐して分足を取り込み、シグナルを速報）
+
+daily は米国市場の休場日なら pandas / numba / yfinance を読み込まず、履歴キャッシュの終値で
+保有を評価して通知するだけで終わる（daily_report.run_daily）。営業日のみ main.py を読み込む。
+"""
+import sys
+
+import run_metrics
+from run_metrics import stage
+
+if sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+
+def _daily(argv):
+    import daily_report
+    args = daily_report.parse_args(argv)
+
+    def trading_day(now_jst, ledger):
+        with stage('import'):
+            import main
+        return main.trading_day(now_jst, ledger)
+
+    with run_metrics.profile(args.profile, 'main'):
+        daily_report.run_daily(trading_day, report_path=args.report)
+
+
+def _backtest(argv):
+    import backtest
+    args = backtest._parse_args(argv)
+    with run_metrics.profile(args.profile, 'backtest'):
+        backtest._main(args)
+
+
+def _sweep(argv):
+    _backtest(['--sweep'] + list(argv))
+
+
+def _screen(argv):
+    import screener
+    screener._main(screener._parse_args(argv))
+
+
+def _replay(argv):
+    import replay
+    replay._main(replay._parse_args(argv))
+
+
+def _intraday(argv):
+    import intraday
+    args = intraday._parse_args(argv)
+    with run_metrics.profile(args.profile, 'intraday'):
+        intraday._main(args)
+
+
+COMMANDS = {
+    'daily':    _daily,
+    'backtest': _backtest,
+    'sweep':    _sweep,
+    'screen':   _screen,
+    'replay':   _replay,
+    'intraday': _intraday,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        print(f"使い方: python cli.py {' | '.join(COMMANDS)} [引数]")
+        sys.exit(1)
+    COMMANDS[sys.argv[1]](sys.argv[2:])
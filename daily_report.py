@@ -0,0 +1,169 @@
+"""日次レポート（通知本文の組み立て・送信と、実行全体の流れ）
+
+main.py（営業日の株価取得・判定・台帳更新）と cli.py の休場日パスで共通に使う。
+このモジュールは pandas / numba / yfinance を読み込まない。米国市場の休場日は
+株価取得も指標計算もせず、履歴キャッシュの最終終値で保有を評価して通知するだけで終わる。
+"""
+import os
+import argparse
+import datetime
+
+import pytz
+
+import run_metrics
+from run_metrics import count, stage
+from history_store import last_close
+from ledger import LEDGER_DB, open_ledger  # 取引台帳（環境変数 LEDGER_DB。旧 trade_history.csv は初回に取り込み）
+from notifier import DISCORD_WEBHOOK_URL, DiscordNotifier, pack_messages
+from trading_calendar import load_calendar
+
+# --- 設定 ---
+SYMBOLS   = ['JMIA', 'NU']
+
+# タイムゾーン
+JST     = pytz.timezone('Asia/Tokyo')
+US_EAST = pytz.timezone('US/Eastern')
+
+# 取引所カレンダー（同梱の休場日テーブル: calendars/XNYS.csv）と日本の祝日（calendars/JP.csv）
+NYSE  = load_calendar('XNYS')
+JAPAN = load_calendar('JP')
+
+
+# =============================
+# 通知本文
+# =============================
+
+def status_line(symbol, price, shares, cost):
+    value = price * shares
+    return (
+        f"【{symbol}】\n現在の株価: ${price:.2f}\n保有数: {shares}株\n評価額: ${value:.2f} (合計損益: ${value - cost:+.2f})"
+    )
+
+
+def build_message(today_jst, notifications, symbol_status, ledger, market_closed=False):
+    msg = f"📅 **{today_jst} トレード報告**\n\n"
+    msg += "📢 **シグナル判定**\n"
+    msg += "\n".join(notifications) if notifications else "✅ 新規シグナルはありません"
+    msg += "\n\n📊 **現在のステータス**\n" + "\n\n".join(symbol_status)
+
+    # 週次レポート（土曜日のみ）
+    if today_jst.weekday() == 5:
+        monday = (today_jst - datetime.timedelta(days=5)).strftime('%Y-%m-%d')
+        with stage('ledger'):
+            weekly = ledger.fills_since(monday)
+        msg += "\n\n📜 **【週報】今週の新規約定一覧**\n"
+        if weekly:
+            def _icon(s):
+                return '🔴' if s == 'strong' else ('🟡' if s == 'medium' else '')
+            msg += "\n".join([
+                f"・{r['date']} : {r['symbol']} 取得単価 ${float(r['buy_price']):.2f} {_icon(r['signal_strength'])}"
+                for r in weekly
+            ])
+        else:
+            msg += "今週の新規約定はありませんでした。"
+
+    # 市場休場日の補足
+    if market_closed:
+        msg += "\n\n📌 ※米国市場休場のため、株価は前営業日の終値です。"
+    if today_jst.weekday() == 6 or JAPAN.in_table(today_jst):  # 土曜の祝日も含める（is_holiday は平日のみ）
+        msg += "\n\n📌 ※本日は日本の休日のため、前営業日時点のデータに基づいています。"
+    return msg
+
+
+def deliver(msg, notifier=None):
+    """通知を送る。notifier は send(messages) -> (送信数, 未送信数) を持つもの（既定: Discord）。"""
+    if notifier is None:
+        if not DISCORD_WEBHOOK_URL:
+            return
+        notifier = DiscordNotifier(DISCORD_WEBHOOK_URL)
+    # 銘柄ごとのブロック単位で分割して並行送信。送れなかった分は送信待ちキューに残り次回再送される
+    try:
+        with stage('discord'):
+            sent, pending = notifier.send(pack_messages(msg))
+        if pending:
+            print(f"【警告】Discord通知の一部を送信待ちに回しました: {pending}件")
+        else:
+            print(f"【完了】Discord通知を送信しました。({sent}件)")
+    except Exception as e:
+        count('discord.errors')
+        print(f"【エラー】Discord送信に失敗しました: {e}")
+
+
+# =============================
+# 休場日（株価取得・指標計算なし）
+# =============================
+
+def cached_closes(symbols, store=None):
+    """銘柄 -> 履歴キャッシュの最終終値（無ければ None）。"""
+    with stage('fetch.cache_load'):
+        return {symbol: last_close(symbol, store) for symbol in symbols}
+
+
+def run_closed(now_jst, ledger, closes, notifier=None, symbols=None):
+    """休場日の 1 回分。保有を closes（銘柄 -> 終値）で評価して通知し、通知本文を返す（台帳は更新しない）。"""
+    symbol_status = []
+    for symbol in symbols or SYMBOLS:
+        price = closes.get(symbol)
+        if price is None:
+            count('symbols.no_data')
+            symbol_status.append(f"【{symbol}】\n⚠️ 市場休場またはデータ取得失敗")
+            continue
+        with stage('ledger'):
+            shares, cost = ledger.holdings(symbol)
+        symbol_status.append(status_line(symbol, price, shares, cost))
+    msg = build_message(now_jst.date(), [], symbol_status, ledger, market_closed=True)
+    deliver(msg, notifier)
+    return msg
+
+
+# =============================
+# 実行全体
+# =============================
+
+def run_daily(trading_day, clock=None, notifier=None, symbols=None, store=None,
+              report_path=run_metrics.RUN_REPORT_FILE):
+    """日次実行の共通部分（計測・台帳のオープン/クローズ・送信内容の表示）。
+    trading_day(now_jst, ledger) -> 通知本文 は営業日だけ呼ぶ（main.py の株価取得・判定）。
+    clock: 現在時刻（タイムゾーン付き）を返す関数。省略時は datetime.now(JST)。
+    """
+    symbols = symbols or SYMBOLS
+    print("--- 株価チェック処理開始 ---")
+    metrics = run_metrics.start_run('main')
+
+    now_jst   = clock().astimezone(JST) if clock else datetime.datetime.now(JST)
+    today_jst = now_jst.date()
+    today_us  = now_jst.astimezone(US_EAST).date()
+    metrics.set_info(date_jst=str(today_jst), date_us=str(today_us), symbols=len(symbols))
+
+    # 取引台帳（SQLite）。初回のみ既存の CSV を取り込む
+    with stage('ledger.open'):
+        ledger = open_ledger(LEDGER_DB)
+    try:
+        if NYSE.is_session(today_us):
+            msg = trading_day(now_jst, ledger)
+        else:
+            # NYSE の休場日（土日・取引所の祝日・臨時休場）は取得・判定をせず保有評価のみ
+            print(f"【情報】米国市場休場のため株価取得をスキップ: {today_us}")
+            count('fetch.market_closed', len(symbols))
+            msg = run_closed(now_jst, ledger, cached_closes(symbols, store), notifier, symbols)
+    finally:
+        ledger.close()
+
+    print("\n--- 送信内容 ---")
+    print(msg)
+
+    # 実行レポート（ステージ別の所要時間とカウンター）
+    print("\n" + metrics.summary())
+    if report_path:
+        metrics.save(report_path)
+    print("\n--- 処理終了 ---")
+    return msg
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='株価チェック（日次）')
+    parser.add_argument('--profile', choices=run_metrics.PROFILE_MODES, default=os.getenv('RUN_PROFILE') or None,
+                        help='プロファイラを有効にする（環境変数 RUN_PROFILE でも指定可）')
+    parser.add_argument('--report', default=run_metrics.RUN_REPORT_FILE,
+                        help='実行レポート（JSON Lines）の追記先。空文字で無効')
+    return parser.parse_args(argv)
@@ -0,0 +1,121 @@
+"""株価データ取得プロバイダー
+
+  'yfinance' : yf.download で複数銘柄を一括取得（既定）
+  'fake'     : ローカルの {symbol}_history.csv を返すオフライン用プロバイダー
+
+環境変数 DATA_PROVIDER（と FAKE_DATA_DIR）で切り替え可能。
+どちらも download(symbols, **kwargs) -> {symbol: DataFrame} を返す。
+取得できなかった銘柄は結果に含めない。
+"""
+import os
+import time
+import pandas as pd
+
+from history_store import CsvHistoryStore
+
+DEFAULT_PROVIDER = os.getenv('DATA_PROVIDER', 'yfinance')
+FAKE_DATA_DIR    = os.getenv('FAKE_DATA_DIR', '.')
+PERIOD_DAYS      = {'d': 1, 'wk': 7, 'mo': 30, 'y': 365}  # yfinance の period の単位 -> 暦日数（FakeProvider 用の近似）
+
+
+def split_frame(df, symbols):
+    """yf.download の結果を銘柄ごとの OHLCV に分割する。
+    複数銘柄時の列は MultiIndex (Price, Ticker)。単一銘柄時はそのまま。
+    """
+    if df is None or df.empty:
+        return {}
+    frames = {}
+    if isinstance(df.columns, pd.MultiIndex):
+        tickers = df.columns.get_level_values(1)
+        for symbol in symbols:
+            if symbol not in tickers:
+                continue
+            sub = df.xs(symbol, axis=1, level=1).dropna(how='all')
+            if not sub.empty:
+                frames[symbol] = sub
+    elif len(symbols) == 1:
+        sub = df.dropna(how='all')
+        if not sub.empty:
+            frames[symbols[0]] = sub
+    for sub in frames.values():
+        sub.index = pd.to_datetime(sub.index)
+        sub.index.name = 'Date'
+        sub.columns.name = None
+    return frames
+
+
+def period_start(last, period):
+    """yfinance の period（'1d' / '5d' / '1wk' / '3mo' / '2y' / 'ytd'）で取得する範囲の開始時刻（これより後）。
+    'max' は None。未対応の書式は ValueError。
+    """
+    if period == 'max':
+        return None
+    if period == 'ytd':
+        return pd.Timestamp(year=last.year, month=1, day=1, tz=last.tz) - pd.Timedelta(1)
+    for unit, days in PERIOD_DAYS.items():
+        num = period[:-len(unit)]
+        if period.endswith(unit) and num.isdigit():
+            return last - pd.Timedelta(days=int(num) * days)
+    raise ValueError(f"未対応の期間です: {period}")
+
+
+class YFinanceProvider:
+    name = 'yfinance'
+
+    def download(self, symbols, **kwargs):
+        import yfinance as yf
+        df = yf.download(list(symbols), progress=False, group_by='column', threads=True, **kwargs)
+        return split_frame(df, list(symbols))
+
+
+class FakeProvider:
+    """オフライン用。frames ({symbol: DataFrame}) か CSV ディレクトリのデータを返す。
+    fail に含めた銘柄は常に取得失敗、latency 秒だけ待ってから返す。
+    """
+    name = 'fake'
+
+    def __init__(self, frames=None, root=FAKE_DATA_DIR, fail=(), latency=0.0):
+        self.frames  = dict(frames or {})
+        self.csv     = CsvHistoryStore(root)
+        self.fail    = set(fail)
+        self.latency = latency
+        self.calls   = []
+
+    def _frame(self, symbol):
+        if symbol not in self.frames:
+            self.frames[symbol] = self.csv.load(symbol)
+        return self.frames[symbol]
+
+    def download(self, symbols, start=None, period=None, **kwargs):
+        self.calls.append(list(symbols))
+        if self.latency:
+            time.sleep(self.latency)
+        frames = {}
+        for symbol in symbols:
+            if symbol in self.fail:
+                continue
+            df = self._frame(symbol)
+            if df.empty:
+                continue
+            if start is not None:
+                df = df[df.index >= pd.Timestamp(start)]
+            elif period is not None:
+                since = period_start(df.index[-1], period)  # 銘柄ごとの最終日から数える
+                if since is not None:
+                    df = df[df.index > since]
+            if not df.empty:
+                frames[symbol] = df.copy()
+        return frames
+
+
+PROVIDERS = {
+    'yfinance': YFinanceProvider,
+    'fake':     FakeProvider,
+}
+
+
+def get_provider(name=None):
+    name = name or DEFAULT_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"未対応のデータプロバイダーです: {name}")
+    return PROVIDERS[name]()
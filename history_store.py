@@ -0,0 +1,220 @@
+"""株価履歴（OHLCV）ストア
+
+backend:
+  'npy' : history/{symbol}/{列名}.npy に列ごとの型付き配列を保存（既定）。
+          Date は datetime64[ns] の int64 表現。読み込みは np.load(mmap_mode='r')。
+  'csv' : 従来の {symbol}_history.csv。インポート/エクスポート用。
+
+環境変数 HISTORY_BACKEND で切り替え可能。
+pandas は DataFrame を扱う関数の中で読み込む（休場日の last_close だけなら NumPy のみで済む）。
+"""
+import os
+import sys
+import numpy as np
+
+OHLCV_COLUMNS = ['Close', 'High', 'Low', 'Open', 'Volume']
+DEFAULT_BACKEND = os.getenv('HISTORY_BACKEND', 'npy')
+NPY_ROOT = 'history'
+
+
+def merge_history(cached, fresh, retention_days=None):
+    """キャッシュと新規取得分をマージし、保持期間（暦日）でトリムする。
+    重複日付は新規取得分を優先（直近バーの修正値を反映）。
+    """
+    import pandas as pd
+    if cached is None or cached.empty:
+        merged = fresh.copy()
+    else:
+        merged = pd.concat([cached, fresh])
+        merged = merged[~merged.index.duplicated(keep='last')]
+    merged = merged.sort_index()
+    merged.index.name = 'Date'
+    if retention_days is not None and not merged.empty:
+        cutoff = merged.index[-1] - pd.Timedelta(days=retention_days)
+        merged = merged[merged.index > cutoff]
+    return merged
+
+
+# =============================
+# CSV（インポート/エクスポート用）
+# =============================
+
+class CsvHistoryStore:
+    def __init__(self, root='.'):
+        self.root = root
+
+    def path(self, symbol):
+        return os.path.join(self.root, f"{symbol}_history.csv")
+
+    def exists(self, symbol):
+        return os.path.exists(self.path(symbol))
+
+    def load(self, symbol):
+        import pandas as pd
+        if not self.exists(symbol):
+            return pd.DataFrame()
+        try:
+            df = pd.read_csv(self.path(symbol), index_col=0, parse_dates=True)
+        except Exception as e:
+            print(f"【警告】CSV読み込み失敗 {self.path(symbol)}: {e}")
+            return pd.DataFrame()
+        df = df[~df.index.isna()].sort_index()
+        df.index.name = 'Date'
+        return df
+
+    def save(self, symbol, df):
+        df.to_csv(self.path(symbol))
+
+    def last_close(self, symbol):
+        closes = self.load(symbol).get('Close')
+        closes = closes.dropna() if closes is not None else ()
+        return float(closes.iloc[-1]) if len(closes) else None
+
+    def symbols(self):
+        if not os.path.isdir(self.root):
+            return []
+        suffix = '_history.csv'
+        return sorted(f[:-len(suffix)] for f in os.listdir(self.root) if f.endswith(suffix))
+
+
+# =============================
+# 列単位 .npy（メモリマップ）
+# =============================
+
+class NpyHistoryStore:
+    def __init__(self, root=NPY_ROOT):
+        self.root = root
+
+    def path(self, symbol):
+        return os.path.join(self.root, symbol)
+
+    def exists(self, symbol):
+        return os.path.exists(os.path.join(self.path(symbol), 'Date.npy'))
+
+    def load_arrays(self, symbol):
+        """列名 -> 読み取り専用メモリマップ配列の dict。存在しない場合は空 dict。"""
+        if not self.exists(symbol):
+            return {}
+        base   = self.path(symbol)
+        arrays = {'Date': np.load(os.path.join(base, 'Date.npy'), mmap_mode='r')}
+        for col in OHLCV_COLUMNS:
+            f = os.path.join(base, f"{col}.npy")
+            if os.path.exists(f):
+                arrays[col] = np.load(f, mmap_mode='r')
+        return arrays
+
+    def last_close(self, symbol):
+        """最終の有効な終値（無ければ None）。DataFrame は作らずメモリマップの Close だけを読む。"""
+        close = self.load_arrays(symbol).get('Close')
+        if close is None:
+            return None
+        valid = np.flatnonzero(~np.isnan(close))
+        return float(close[valid[-1]]) if len(valid) else None
+
+    def load(self, symbol):
+        import pandas as pd
+        arrays = self.load_arrays(symbol)
+        if not arrays:
+            return pd.DataFrame()
+        index = pd.DatetimeIndex(np.asarray(arrays.pop('Date')).view('datetime64[ns]'), name='Date')
+        return pd.DataFrame({col: np.asarray(a) for col, a in arrays.items()}, index=index)
+
+    def save(self, symbol, df):
+        import pandas as pd
+        base = self.path(symbol)
+        os.makedirs(base, exist_ok=True)
+        columns = {'Date': df.index.values.astype('datetime64[ns]').view('int64')}
+        for col in OHLCV_COLUMNS:
+            if col in df.columns:
+                dtype = 'int64' if col == 'Volume' else 'float64'
+                columns[col] = pd.to_numeric(df[col], errors='coerce').fillna(0 if col == 'Volume' else np.nan).to_numpy(dtype)
+        # 全列を一時ファイルへ書き出してから置き換える（途中で落ちても既存ファイルは壊さない）
+        tmp_paths = {}
+        for col, arr in columns.items():
+            tmp = os.path.join(base, f"{col}.npy.tmp")
+            with open(tmp, 'wb') as f:
+                np.save(f, arr)
+            tmp_paths[col] = tmp
+        for col, tmp in tmp_paths.items():
+            os.replace(tmp, os.path.join(base, f"{col}.npy"))
+
+    def symbols(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(s for s in os.listdir(self.root) if self.exists(s))
+
+
+BACKENDS = {
+    'npy': NpyHistoryStore,
+    'csv': CsvHistoryStore,
+}
+
+
+def get_store(backend=None):
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"未対応の履歴バックエンドです: {backend}")
+    return BACKENDS[backend]()
+
+
+def load_history(symbol, store=None):
+    """ストアから履歴を読み込む。未登録で従来の CSV があれば一度だけ取り込む。"""
+    store = store or get_store()
+    df = store.load(symbol)
+    if df.empty and not isinstance(store, CsvHistoryStore):
+        legacy = CsvHistoryStore()
+        if legacy.exists(symbol):
+            df = legacy.load(symbol)
+            if not df.empty:
+                store.save(symbol, df)
+                print(f"【情報】CSV から履歴ストアへ取り込みました: {symbol} ({len(df)}行)")
+    return df
+
+
+def last_close(symbol, store=None):
+    """最終の有効な終値（無ければ None）。未登録で従来の CSV があればそちらを読む。"""
+    store = store or get_store()
+    price = store.last_close(symbol)
+    if price is None and not isinstance(store, CsvHistoryStore):
+        legacy = CsvHistoryStore()
+        if legacy.exists(symbol):
+            price = legacy.last_close(symbol)
+    return price
+
+
+# =============================
+# インポート / エクスポート
+# =============================
+
+def import_csv(symbols=None, src='.', store=None):
+    store = store or get_store()
+    csv   = CsvHistoryStore(src)
+    for symbol in symbols or csv.symbols():
+        df = csv.load(symbol)
+        if df.empty:
+            continue
+        store.save(symbol, merge_history(store.load(symbol), df))
+        print(f"【取込】{symbol}: {len(df)}行")
+
+
+def export_csv(symbols=None, dst='.', store=None):
+    store = store or get_store()
+    csv   = CsvHistoryStore(dst)
+    for symbol in symbols or store.symbols():
+        df = store.load(symbol)
+        if df.empty:
+            continue
+        csv.save(symbol, df)
+        print(f"【出力】{symbol}: {len(df)}行 -> {csv.path(symbol)}")
+
+
+if __name__ == "__main__":
+    # 使い方: python history_store.py import|export [SYMBOL ...]
+    if len(sys.argv) < 2 or sys.argv[1] not in ('import', 'export'):
+        print("使い方: python history_store.py import|export [SYMBOL ...]")
+        sys.exit(1)
+    targets = sys.argv[2:] or None
+    if sys.argv[1] == 'import':
+        import_csv(targets)
+    else:
+        export_csv(targets)
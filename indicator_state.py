@@ -0,0 +1,344 @@
+"""逐次（1 バーずつ）更新する指標エンジン
+
+add_indicators() と同じ指標を、銘柄ごとの小さな状態だけで O(1) 更新する。
+  STOCHk/STOCHd : 10 本の高値/安値を単調キュー、%D は直近 3 本
+  RSI           : Wilder 平滑化（alpha=1/14）の平均上昇幅/下落幅
+  MA50/MA200    : 直近 200 本の終値と移動合計
+  MACD          : EMA12/EMA26 と シグナル EMA9
+
+状態は indicator_state/{symbol}.json に保存し、次回の実行で続きから更新する。
+"""
+import os
+import sys
+import json
+import math
+import itertools
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from indicators import INDICATOR_COLUMNS, add_indicators, compute_indicators
+
+STATE_DIR = 'indicator_state'
+
+STOCH_WINDOW = 10
+STOCHD_WINDOW = 3
+RSI_PERIOD = 14
+MA_SHORT = 50
+MA_LONG = 200
+EMA_FAST_ALPHA = 2 / (12 + 1)
+EMA_SLOW_ALPHA = 2 / (26 + 1)
+EMA_SIGNAL_ALPHA = 2 / (9 + 1)
+
+NAN = float('nan')
+
+
+def _window_front(q, i):
+    """単調キュー q のうち、n=i 本目のバーを足したときに窓内に残る先頭の値（無ければ None）。
+    update() のたびに窓外を取り除いているため、窓から外れる先頭は高々 1 件。
+    """
+    for idx, value in itertools.islice(q, 2):
+        if idx > i - STOCH_WINDOW:
+            return value
+    return None
+
+
+class IndicatorState:
+    def __init__(self):
+        self.n          = 0       # 処理済みバー数
+        self.last_date  = None    # 'YYYY-MM-DD'
+        self.last_close = NAN
+        self.lows       = deque()  # (バー番号, 安値) 単調増加
+        self.highs      = deque()  # (バー番号, 高値) 単調減少
+        self.stochk     = deque(maxlen=STOCHD_WINDOW)
+        self.avg_gain   = NAN
+        self.avg_loss   = NAN
+        self.rsi_count  = 0
+        self.closes     = deque(maxlen=MA_LONG)
+        self.sum_short  = 0.0
+        self.sum_long   = 0.0
+        self.ema_fast   = NAN
+        self.ema_slow   = NAN
+        self.macd_sig   = NAN
+        self.prev_row   = None    # 1 本前の指標（クロス判定用）
+        self.last_row   = None
+
+    # --- 更新 ---
+
+    def update(self, date, high, low, close):
+        """1 バー分の指標を更新し、そのバーの指標 dict を返す。"""
+        i = self.n
+
+        # ストキャスティクス（期間10）
+        while self.lows and self.lows[-1][1] >= low:
+            self.lows.pop()
+        self.lows.append((i, low))
+        while self.highs and self.highs[-1][1] <= high:
+            self.highs.pop()
+        self.highs.append((i, high))
+        while self.lows[0][0] <= i - STOCH_WINDOW:
+            self.lows.popleft()
+        while self.highs[0][0] <= i - STOCH_WINDOW:
+            self.highs.popleft()
+        # add_indicators は 100 * (...).fillna(50) のため、レンジ未確定/ゼロのバーは 5000 になる
+        stoch_k = 100 * 50.0
+        if i >= STOCH_WINDOW - 1:
+            rng = self.highs[0][1] - self.lows[0][1]
+            if abs(rng) > 1e-10:
+                stoch_k = 100 * ((close - self.lows[0][1]) / rng)
+        self.stochk.append(stoch_k)
+        stoch_d = sum(self.stochk) / STOCHD_WINDOW if len(self.stochk) == STOCHD_WINDOW else NAN
+
+        # RSI（期間14: Wilder の平滑化。初回の差分で初期化）
+        rsi = NAN
+        if i > 0:
+            delta = close - self.last_close
+            gain, loss = max(delta, 0.0), max(-delta, 0.0)
+            if self.rsi_count == 0:
+                self.avg_gain, self.avg_loss = gain, loss
+            else:
+                a = 1 / RSI_PERIOD
+                self.avg_gain = (1 - a) * self.avg_gain + a * gain
+                self.avg_loss = (1 - a) * self.avg_loss + a * loss
+            self.rsi_count += 1
+            if self.rsi_count >= RSI_PERIOD:
+                rsi = 100 - (100 / (1 + self.avg_gain / max(self.avg_loss, 1e-10)))
+
+        # 移動平均線（押し出される終値を移動合計から差し引く）
+        if len(self.closes) == MA_LONG:
+            self.sum_long -= self.closes[0]
+        if len(self.closes) >= MA_SHORT:
+            self.sum_short -= self.closes[-MA_SHORT]
+        self.closes.append(close)
+        self.sum_long  += close
+        self.sum_short += close
+        ma_short = self.sum_short / MA_SHORT if len(self.closes) >= MA_SHORT else NAN
+        ma_long  = self.sum_long / MA_LONG if len(self.closes) >= MA_LONG else NAN
+
+        # MACD（12/26/9）
+        if i == 0:
+            self.ema_fast = self.ema_slow = close
+        else:
+            self.ema_fast = (1 - EMA_FAST_ALPHA) * self.ema_fast + EMA_FAST_ALPHA * close
+            self.ema_slow = (1 - EMA_SLOW_ALPHA) * self.ema_slow + EMA_SLOW_ALPHA * close
+        macd = self.ema_fast - self.ema_slow
+        if i == 0:
+            self.macd_sig = macd
+        else:
+            self.macd_sig = (1 - EMA_SIGNAL_ALPHA) * self.macd_sig + EMA_SIGNAL_ALPHA * macd
+
+        row = {
+            'STOCHk': stoch_k, 'STOCHd': stoch_d, 'RSI': rsi,
+            'MA50': ma_short, 'MA200': ma_long,
+            'MACD': macd, 'MACD_signal': self.macd_sig,
+        }
+        self.n          = i + 1
+        self.last_date  = pd.Timestamp(date).strftime('%Y-%m-%d')
+        self.last_close = close
+        self.prev_row, self.last_row = self.last_row, row
+        return row
+
+    def peek(self, high, low, close):
+        """次のバー（n 本目）を high/low/close としたときの指標 dict を、状態を変えずに返す（O(1)）。
+        日中の暫定バーの判定用。同じ値で update() した結果と一致する。
+        """
+        i = self.n
+
+        # ストキャスティクス（単調キューの窓内の先頭が、既存バーの最小/最大）
+        low_front, high_front = _window_front(self.lows, i), _window_front(self.highs, i)
+        low_min  = low if low_front is None else min(low_front, low)
+        high_max = high if high_front is None else max(high_front, high)
+        stoch_k = 100 * 50.0
+        if i >= STOCH_WINDOW - 1:
+            rng = high_max - low_min
+            if abs(rng) > 1e-10:
+                stoch_k = 100 * ((close - low_min) / rng)
+        stoch_d = NAN
+        if len(self.stochk) >= STOCHD_WINDOW - 1:
+            stoch_d = sum(list(self.stochk)[1 - STOCHD_WINDOW:] + [stoch_k]) / STOCHD_WINDOW
+
+        # RSI
+        rsi = NAN
+        if i > 0:
+            delta = close - self.last_close
+            gain, loss = max(delta, 0.0), max(-delta, 0.0)
+            if self.rsi_count == 0:
+                avg_gain, avg_loss = gain, loss
+            else:
+                a = 1 / RSI_PERIOD
+                avg_gain = (1 - a) * self.avg_gain + a * gain
+                avg_loss = (1 - a) * self.avg_loss + a * loss
+            if self.rsi_count + 1 >= RSI_PERIOD:
+                rsi = 100 - (100 / (1 + avg_gain / max(avg_loss, 1e-10)))
+
+        # 移動平均線
+        sum_long, sum_short = self.sum_long, self.sum_short
+        if len(self.closes) == MA_LONG:
+            sum_long -= self.closes[0]
+        if len(self.closes) >= MA_SHORT:
+            sum_short -= self.closes[-MA_SHORT]
+        sum_long  += close
+        sum_short += close
+        count    = min(len(self.closes) + 1, MA_LONG)
+        ma_short = sum_short / MA_SHORT if count >= MA_SHORT else NAN
+        ma_long  = sum_long / MA_LONG if count >= MA_LONG else NAN
+
+        # MACD
+        if i == 0:
+            ema_fast = ema_slow = close
+        else:
+            ema_fast = (1 - EMA_FAST_ALPHA) * self.ema_fast + EMA_FAST_ALPHA * close
+            ema_slow = (1 - EMA_SLOW_ALPHA) * self.ema_slow + EMA_SLOW_ALPHA * close
+        macd     = ema_fast - ema_slow
+        macd_sig = macd if i == 0 else (1 - EMA_SIGNAL_ALPHA) * self.macd_sig + EMA_SIGNAL_ALPHA * macd
+
+        return {
+            'STOCHk': stoch_k, 'STOCHd': stoch_d, 'RSI': rsi,
+            'MA50': ma_short, 'MA200': ma_long,
+            'MACD': macd, 'MACD_signal': macd_sig,
+        }
+
+    def update_bars(self, df, start=0):
+        """DataFrame の start 本目以降のバーを順に投入し、投入分の指標行（dict）のリストを返す。"""
+        return [
+            self.update(d, h, l, c)
+            for d, h, l, c in zip(df.index[start:], df['High'].to_numpy(float)[start:],
+                                  df['Low'].to_numpy(float)[start:], df['Close'].to_numpy(float)[start:])
+        ]
+
+    def update_frame(self, df):
+        """DataFrame の各バーを順に投入し、投入分の指標 DataFrame を返す。"""
+        return pd.DataFrame(self.update_bars(df), index=df.index, columns=INDICATOR_COLUMNS)
+
+    def tail_arrays(self, df, n=2):
+        """df の直近 n 本に最新の指標を付けた 列名 -> ndarray（シグナル判定用）。
+        戦略は配列の dict でも評価できるため、日次の判定では DataFrame を組み立てない。
+        状態が持つのは直近 2 本の指標だけなので、n が 2 を超える（shift で 2 本以上遡る戦略）場合は
+        df 全体から指標を計算して直近 n 本を切り出す。n が無限大なら全期間。
+        """
+        n    = len(df) if not math.isfinite(n) else min(int(n), len(df))
+        tail = df.iloc[len(df) - n:]
+        data = {col: tail[col].to_numpy() for col in tail.columns}
+        rows = [r for r in (self.prev_row, self.last_row) if r is not None]
+        if n <= len(rows):
+            rows = rows[len(rows) - n:]
+            data.update({col: np.array([r[col] for r in rows], dtype=np.float64) for col in INDICATOR_COLUMNS})
+        else:
+            ind = compute_indicators(df['High'], df['Low'], df['Close'])
+            data.update({col: ind[col][len(df) - n:] for col in INDICATOR_COLUMNS})
+        return data
+
+    def tail_frame(self, df, n=2):
+        """tail_arrays の DataFrame 版。"""
+        data = self.tail_arrays(df, n)
+        return pd.DataFrame(data, index=df.index[len(df) - len(data['Close']):])
+
+    # --- 永続化 ---
+
+    def to_dict(self):
+        return {
+            'n': self.n, 'last_date': self.last_date, 'last_close': self.last_close,
+            'lows': list(self.lows), 'highs': list(self.highs), 'stochk': list(self.stochk),
+            'avg_gain': self.avg_gain, 'avg_loss': self.avg_loss, 'rsi_count': self.rsi_count,
+            'closes': list(self.closes), 'sum_short': self.sum_short, 'sum_long': self.sum_long,
+            'ema_fast': self.ema_fast, 'ema_slow': self.ema_slow, 'macd_sig': self.macd_sig,
+            'prev_row': self.prev_row, 'last_row': self.last_row,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        state = cls()
+        for key in ('n', 'last_date', 'last_close', 'avg_gain', 'avg_loss', 'rsi_count',
+                    'sum_short', 'sum_long', 'ema_fast', 'ema_slow', 'macd_sig', 'prev_row', 'last_row'):
+            setattr(state, key, d[key])
+        state.lows   = deque(tuple(x) for x in d['lows'])
+        state.highs  = deque(tuple(x) for x in d['highs'])
+        state.stochk = deque(d['stochk'], maxlen=STOCHD_WINDOW)
+        state.closes = deque(d['closes'], maxlen=MA_LONG)
+        return state
+
+
+def state_path(symbol, root=STATE_DIR):
+    return os.path.join(root, f"{symbol}.json")
+
+
+def load_state(symbol, root=STATE_DIR):
+    path = state_path(symbol, root)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            return IndicatorState.from_dict(json.load(f))
+    except Exception as e:
+        print(f"【警告】指標状態の読み込み失敗 {symbol}: {e}")
+        return None
+
+
+def save_state(symbol, state, root=STATE_DIR):
+    os.makedirs(root, exist_ok=True)
+    path = state_path(symbol, root)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state.to_dict(), f)
+    os.replace(path + '.tmp', path)
+
+
+def clear_state(symbol, root=STATE_DIR):
+    """保存済みの状態を削除する（履歴を取り直したとき。次回は df 全体から作り直す）。"""
+    try:
+        os.remove(state_path(symbol, root))
+    except FileNotFoundError:
+        pass
+
+
+def advance(state, df):
+    """状態を df の最終バーまで進める。
+    状態の最終日が df に無い・終値が修正されている場合は df 全体から作り直す。
+    """
+    if state is not None and state.last_date is not None:
+        last = pd.Timestamp(state.last_date)
+        pos  = df.index.searchsorted(last)
+        if (pos < len(df) and df.index[pos] == last
+                and math.isclose(float(df['Close'].iat[pos]), state.last_close, rel_tol=1e-9)):
+            state.update_bars(df, start=pos + 1)
+            return state
+    state = IndicatorState()
+    state.update_bars(df)
+    return state
+
+
+# =============================
+# バッチ計算との突き合わせ
+# =============================
+
+def verify(symbol, csv_root='.', rtol=1e-9, atol=1e-8):
+    """{symbol}_history.csv を 1 バーずつ再生し、add_indicators の結果と比較する。
+    途中で状態を JSON 経由で保存/復元し、永続化後も一致することを確認する。
+    """
+    from history_store import CsvHistoryStore
+
+    df    = CsvHistoryStore(csv_root).load(symbol).dropna(subset=['Close'])
+    batch = add_indicators(df)[INDICATOR_COLUMNS]
+
+    state, rows = IndicatorState(), []
+    for k in range(len(df)):
+        if k == len(df) // 2:
+            state = IndicatorState.from_dict(json.loads(json.dumps(state.to_dict())))
+        rows.append(state.update(df.index[k], float(df['High'].iloc[k]), float(df['Low'].iloc[k]), float(df['Close'].iloc[k])))
+    stream = pd.DataFrame(rows, index=df.index, columns=INDICATOR_COLUMNS)
+
+    ok = True
+    for col in INDICATOR_COLUMNS:
+        a, b = batch[col].to_numpy(float), stream[col].to_numpy(float)
+        match = np.allclose(a, b, rtol=rtol, atol=atol, equal_nan=True) and np.array_equal(np.isnan(a), np.isnan(b))
+        diff  = np.nanmax(np.abs(a - b)) if np.isfinite(a - b).any() else 0.0
+        print(f"  {symbol} {col:<12} {'OK' if match else 'NG'} (最大誤差 {diff:.2e})")
+        ok &= match
+    return ok
+
+
+if __name__ == "__main__":
+    # 使い方: python indicator_state.py [SYMBOL ...]  （既定: JMIA NU）
+    targets = sys.argv[1:] or ['JMIA', 'NU']
+    results = [verify(s) for s in targets]
+    sys.exit(0 if all(results) else 1)
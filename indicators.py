@@ -0,0 +1,356 @@
+"""指標・シグナル共通ライブラリ（main.py / backtest.py 共用）
+
+NumPy の float64 配列で指標を計算する。シグナル強度は int8 コード（0='' / 1='medium' / 2='strong'）で扱い、
+条件式そのものは strategies.json（strategies.py がコンパイル）に定義する。
+numba があればローリング最小/最大・EWM を JIT 版で計算し、無ければ NumPy 版にフォールバックする
+（環境変数 INDICATORS_JIT=0 で JIT を無効化）。
+
+  python indicators.py [SYMBOL ...]  : 従来の pandas 実装と突き合わせる（既定: JMIA NU）
+"""
+import os
+import sys
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    if os.getenv('INDICATORS_JIT', '1') == '0':
+        raise ImportError
+    from numba import njit
+    HAVE_JIT = True
+except ImportError:
+    HAVE_JIT = False
+
+INDICATOR_COLUMNS = ['STOCHk', 'STOCHd', 'RSI', 'MA50', 'MA200', 'MACD', 'MACD_signal']
+
+# シグナル強度コード
+STRENGTH_CODES  = {'': 0, 'medium': 1, 'strong': 2}
+STRENGTH_LABELS = np.array(['', 'medium', 'strong'], dtype=object)
+
+# =============================
+# カーネル（NumPy 版）
+# =============================
+
+def _rolling_min_np(x, window):
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        out[window - 1:] = sliding_window_view(x, window).min(axis=1)
+    return out
+
+
+def _rolling_max_np(x, window):
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        out[window - 1:] = sliding_window_view(x, window).max(axis=1)
+    return out
+
+
+def _ewm_np(x, alpha):
+    """pandas の ewm(alpha=alpha, adjust=False).mean() 相当（先頭以外に NaN を含まない前提）。
+    y_t = (1-a)^t * (y_0 + a * Σ x_k (1-a)^-k) をブロックごとに累積和で計算する。
+    (1-a)^-k が桁あふれしないようブロック長を制限する。
+    """
+    out   = np.full(len(x), np.nan)
+    valid = np.flatnonzero(~np.isnan(x))
+    if not len(valid):
+        return out
+    s = valid[0]
+    if alpha >= 1:
+        out[s:] = x[s:]
+        return out
+    r     = 1.0 - alpha
+    block = max(1, int(100 * np.log(10) / -np.log(r)))
+    prev  = out[s] = x[s]
+    i = s + 1
+    while i < len(x):
+        seg = x[i:i + block]
+        k   = np.arange(1, len(seg) + 1)
+        y   = (prev + np.cumsum(alpha * seg * r ** -k)) * r ** k
+        out[i:i + len(seg)] = y
+        prev = y[-1]
+        i += len(seg)
+    return out
+
+
+# =============================
+# カーネル（numba JIT 版）
+# =============================
+
+if HAVE_JIT:
+    @njit(cache=True)
+    def _rolling_extreme_jit(x, window, sign):
+        # 単調キュー（sign=1: 最小 / sign=-1: 最大）。窓内に NaN があれば NaN
+        n   = len(x)
+        out = np.full(n, np.nan)
+        q   = np.empty(n, dtype=np.int64)
+        head, tail, last_nan = 0, 0, -1
+        for i in range(n):
+            v = x[i]
+            if np.isnan(v):
+                last_nan = i
+            else:
+                while tail > head and sign * x[q[tail - 1]] >= sign * v:
+                    tail -= 1
+                q[tail] = i
+                tail += 1
+            while tail > head and q[head] <= i - window:
+                head += 1
+            if i >= window - 1 and last_nan <= i - window and tail > head:
+                out[i] = x[q[head]]
+        return out
+
+    @njit(cache=True)
+    def _ewm_jit(x, alpha):
+        n   = len(x)
+        out = np.full(n, np.nan)
+        started = False
+        prev = 0.0
+        for i in range(n):
+            v = x[i]
+            if not started:
+                if np.isnan(v):
+                    continue
+                prev, started = v, True
+            else:
+                prev = (1 - alpha) * prev + alpha * v
+            out[i] = prev
+        return out
+
+    def rolling_min(x, window):
+        return _rolling_extreme_jit(x, window, 1.0)
+
+    def rolling_max(x, window):
+        return _rolling_extreme_jit(x, window, -1.0)
+
+    def _ewm(x, alpha):
+        return _ewm_jit(x, alpha)
+else:
+    rolling_min = _rolling_min_np
+    rolling_max = _rolling_max_np
+    _ewm        = _ewm_np
+
+
+def rolling_mean(x, window):
+    """pandas の rolling(window).mean() 相当。窓内に NaN があれば NaN。"""
+    out = np.full(len(x), np.nan)
+    if len(x) < window:
+        return out
+    nan  = np.isnan(x)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(nan, 0.0, x))))
+    nans = np.concatenate(([0], np.cumsum(nan)))
+    mean = (sums[window:] - sums[:-window]) / window
+    out[window - 1:] = np.where(nans[window:] - nans[:-window] > 0, np.nan, mean)
+    return out
+
+
+def ewm(x, alpha, min_periods=0):
+    """pandas の ewm(alpha=alpha, min_periods=min_periods, adjust=False).mean() 相当。"""
+    out   = _ewm(x, alpha)
+    valid = np.flatnonzero(~np.isnan(x))
+    if len(valid) and min_periods > 1:
+        out[:valid[0] + min_periods - 1] = np.nan
+    return out
+
+
+def shift(x, periods=1):
+    out = np.empty_like(x, dtype=np.float64)
+    out[:periods] = np.nan
+    out[periods:] = x[:-periods]
+    return out
+
+
+def cross_up(a, b):
+    """a が b を下から上抜けたバー（前バー a<=b かつ当バー a>b）。"""
+    return (a > b) & (shift(a) <= shift(b))
+
+
+# =============================
+# 指標計算
+# =============================
+
+def compute_indicators(high, low, close, with_carry=False):
+    """列名 -> float64 配列の dict を返す。
+    with_carry=True なら (指標, carry) を返す。carry は EWM 系の最終値で、extend_indicators で続きを計算するのに使う。
+    """
+    high  = np.asarray(high, dtype=np.float64)
+    low   = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+
+    # ストキャスティクス（期間10: より早い反応）
+    low_10   = rolling_min(low, 10)
+    high_10  = rolling_max(high, 10)
+    range_10 = high_10 - low_10
+    with np.errstate(invalid='ignore', divide='ignore'):
+        raw_k = (close - low_10) / np.where(np.abs(range_10) > 1e-10, range_10, np.nan)
+    # 従来実装 100 * (...).fillna(50) に合わせ、レンジ未確定/ゼロのバーは 5000
+    stoch_k = 100 * np.where(np.isnan(raw_k), 50.0, raw_k)
+    stoch_d = rolling_mean(stoch_k, 3)
+
+    # RSI（期間14: Wilderの平滑化EWM）
+    delta    = close - shift(close)
+    avg_gain = ewm(np.clip(delta, 0, None), 1 / 14, min_periods=14)
+    avg_loss = ewm(-np.clip(delta, None, 0), 1 / 14, min_periods=14)
+    rsi      = 100 - (100 / (1 + avg_gain / np.maximum(avg_loss, 1e-10)))
+
+    # MACD（12/26/9）
+    ema_fast    = ewm(close, 2 / 13)
+    ema_slow    = ewm(close, 2 / 27)
+    macd        = ema_fast - ema_slow
+    macd_signal = ewm(macd, 2 / 10)
+
+    out = {
+        'STOCHk': stoch_k, 'STOCHd': stoch_d, 'RSI': rsi,
+        'MA50': rolling_mean(close, 50), 'MA200': rolling_mean(close, 200),
+        'MACD': macd, 'MACD_signal': macd_signal,
+    }
+    if not with_carry:
+        return out
+    carry = {name: float(a[-1]) if len(a) else np.nan
+             for name, a in (('avg_gain', avg_gain), ('avg_loss', avg_loss), ('ema_fast', ema_fast), ('ema_slow', ema_slow))}
+    return out, carry
+
+
+EXTEND_MIN_BARS = 200  # extend_indicators の前提（既存分がローリング窓・EWM の立ち上がりより長い）
+
+
+def _ewm_from(prev, x, alpha):
+    """値 prev の続きから x の EWM を計算する（adjust=False の漸化式をそのまま続ける）。"""
+    return _ewm(np.concatenate(([prev], x)), alpha)[1:]
+
+
+def extend_indicators(prev, carry, high, low, close):
+    """prev（先頭 n 本の指標）と carry（その時点の EWM の値）から、high/low/close（全 m 本）の
+    n 本目以降だけを計算して連結した (指標, carry) を返す。
+    ローリング系は窓の本数だけ遡り、EWM 系は carry から漸化式を続ける。n < EXTEND_MIN_BARS は ValueError。
+    """
+    high  = np.asarray(high, dtype=np.float64)
+    low   = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n, m  = len(prev['RSI']), len(close)
+    if n < EXTEND_MIN_BARS or n > m:
+        raise ValueError(f"extend_indicators: 既存 {n} 本からは続きを計算できません（全 {m} 本）")
+    if n == m:
+        return {col: prev[col] for col in INDICATOR_COLUMNS}, dict(carry)
+
+    lo = n - 199  # MA200 の窓（最長のローリング窓）の分だけ遡る
+    h, l, c = high[lo:], low[lo:], close[lo:]
+    k = n - lo
+    range_10 = rolling_max(h, 10) - rolling_min(l, 10)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        raw_k = (c - rolling_min(l, 10)) / np.where(np.abs(range_10) > 1e-10, range_10, np.nan)
+    stoch_k = (100 * np.where(np.isnan(raw_k), 50.0, raw_k))[k:]
+    stoch_d = rolling_mean(np.concatenate((prev['STOCHk'][n - 2:n], stoch_k)), 3)[2:]
+
+    delta    = close[n:] - close[n - 1:m - 1]
+    avg_gain = _ewm_from(carry['avg_gain'], np.clip(delta, 0, None), 1 / 14)
+    avg_loss = _ewm_from(carry['avg_loss'], -np.clip(delta, None, 0), 1 / 14)
+    rsi      = 100 - (100 / (1 + avg_gain / np.maximum(avg_loss, 1e-10)))
+
+    ema_fast    = _ewm_from(carry['ema_fast'], close[n:], 2 / 13)
+    ema_slow    = _ewm_from(carry['ema_slow'], close[n:], 2 / 27)
+    macd        = ema_fast - ema_slow
+    macd_signal = _ewm_from(prev['MACD_signal'][n - 1], macd, 2 / 10)
+
+    new = {
+        'STOCHk': stoch_k, 'STOCHd': stoch_d, 'RSI': rsi,
+        'MA50': rolling_mean(c, 50)[k:], 'MA200': rolling_mean(c, 200)[k:],
+        'MACD': macd, 'MACD_signal': macd_signal,
+    }
+    out   = {col: np.concatenate((prev[col][:n], new[col])) for col in INDICATOR_COLUMNS}
+    carry = {'avg_gain': float(avg_gain[-1]), 'avg_loss': float(avg_loss[-1]),
+             'ema_fast': float(ema_fast[-1]), 'ema_slow': float(ema_slow[-1])}
+    return out, carry
+
+
+def add_indicators(df):
+    """df に指標列を加えた DataFrame を返す（元の df は変更しない）。"""
+    return df.assign(**compute_indicators(df['High'], df['Low'], df['Close']))
+
+
+# =============================
+# シグナル強度コード（条件式は strategies.json / strategies.py）
+# =============================
+
+def strength_labels(codes):
+    """int8 コード -> 'strong' / 'medium' / '' の配列（表示・CSV 用）。"""
+    return STRENGTH_LABELS[np.asarray(codes)]
+
+
+def signal_mask(codes, min_strength='any'):
+    """min_strength: 'any'=strong+medium / 'strong'=strong のみ"""
+    if min_strength == 'strong':
+        return codes == STRENGTH_CODES['strong']
+    return codes > 0
+
+
+# =============================
+# 従来の pandas 実装との突き合わせ
+# =============================
+
+def _pandas_reference(df):
+    """共通化前の main.py / backtest.py の add_indicators・シグナル関数（突き合わせ専用）。"""
+    import pandas as pd
+    df = df.copy()
+    low_10   = df['Low'].rolling(10).min()
+    high_10  = df['High'].rolling(10).max()
+    range_10 = high_10 - low_10
+    df['STOCHk'] = 100 * ((df['Close'] - low_10) / range_10.where(range_10.abs() > 1e-10, other=pd.NA)).fillna(50)
+    df['STOCHd'] = df['STOCHk'].rolling(3).mean()
+    delta    = df['Close'].diff()
+    avg_gain = delta.clip(lower=0).ewm(alpha=1/14, min_periods=14, adjust=False).mean()
+    avg_loss = (-delta.clip(upper=0)).ewm(alpha=1/14, min_periods=14, adjust=False).mean()
+    df['RSI'] = 100 - (100 / (1 + avg_gain / avg_loss.clip(lower=1e-10)))
+    df['MA50']  = df['Close'].rolling(50).mean()
+    df['MA200'] = df['Close'].rolling(200).mean()
+    ema12 = df['Close'].ewm(span=12, adjust=False).mean()
+    ema26 = df['Close'].ewm(span=26, adjust=False).mean()
+    df['MACD']        = ema12 - ema26
+    df['MACD_signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
+
+    def cross(a, b):
+        return (df[a] > df[b]) & (df[a].shift(1) <= df[b].shift(1))
+
+    def strength(cond_a, cond_b):
+        s = pd.Series('', index=df.index)
+        return s.where(~cond_b, 'medium').where(~cond_a, 'strong')
+
+    vol_ok = ((df['High'] - df['Low']) / df['Close'].replace(0, 1)) > 0.03
+    stoch_ok = ((df['STOCHk'] <= 20) | (df['STOCHd'] <= 20)) & cross('STOCHk', 'STOCHd')
+    jmia = strength(stoch_ok & (df['RSI'] <= 35) & vol_ok, cross('MACD', 'MACD_signal') & vol_ok)
+
+    above = df['Close'] > df['MA200']
+    nu = strength(
+        above & (df['RSI'] >= 40) & (df['RSI'] <= 55) & (df['STOCHk'] <= 30),
+        above & (cross('MACD', 'MACD_signal') | ((df['STOCHk'] <= 40) & (df['RSI'] <= 50))),
+    )
+    return df, {'jmia': jmia.to_numpy(object), 'nu': nu.to_numpy(object)}
+
+
+def verify(symbol, csv_root='.', rtol=1e-9, atol=1e-8):
+    """{symbol}_history.csv で共通ライブラリ・戦略レジストリと従来の pandas 実装を比較する。"""
+    from history_store import CsvHistoryStore
+    from strategies import load_registry
+
+    df = CsvHistoryStore(csv_root).load(symbol).dropna(subset=['Close'])
+    ref, ref_signals = _pandas_reference(df)
+    ind = add_indicators(df)
+
+    ok = True
+    for col in INDICATOR_COLUMNS:
+        a, b  = ref[col].to_numpy(float), ind[col].to_numpy(float)
+        match = np.allclose(a, b, rtol=rtol, atol=atol, equal_nan=True) and np.array_equal(np.isnan(a), np.isnan(b))
+        diff  = np.nanmax(np.abs(a - b)) if np.isfinite(a - b).any() else 0.0
+        print(f"  {symbol} {col:<12} {'OK' if match else 'NG'} (最大誤差 {diff:.2e})")
+        ok &= match
+    registry = load_registry()
+    for name, func in (('jmia', registry['JMIA']), ('nu', registry['NU'])):
+        match = np.array_equal(ref_signals[name], strength_labels(func(ind)))
+        print(f"  {symbol} {name}_signal  {'OK' if match else 'NG'}")
+        ok &= match
+    return ok
+
+
+if __name__ == "__main__":
+    print(f"JIT: {'numba' if HAVE_JIT else 'なし（NumPy 版）'}")
+    targets = sys.argv[1:] or ['JMIA', 'NU']
+    results = [verify(s) for s in targets]
+    sys.exit(0 if all(results) else 1)
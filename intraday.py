@@ -0,0 +1,449 @@
+"""日中モード（分足のストリームを取り込み、当日の暫定日足でシグナルを判定して即時に通知する）
+
+日次チェック（main.py）は米国の引け後に 1 回だけ判定する。日中モードは常駐して分足を取り込み、
+  1. 銘柄ごとに当日の分足を集計した暫定の日足（始値・高値・安値・現在値・出来高）を持つ
+  2. 前日までの指標状態（IndicatorState）に暫定バーを足した指標を peek() で求め（状態は変えない・O(1)）、
+     SIGNAL_CONFIG の戦略を直近 lookback + 1 本の配列で評価する
+  3. 条件が成立したら台帳（同日の signal/holding・冷却期間・通知済みの速報）と照合して速報を送る
+日付が変わったら前日の暫定バーを確定して状態を 1 本進める。1 本の分足あたりの処理は銘柄数・履歴の長さに
+よらず一定。台帳の signal は従来どおり日次チェックが終値で登録する（日中の速報は引けまでに条件が
+崩れることがあるため、台帳の alerts に記録して重複通知を防ぐだけ）。
+
+ストリームは「分足（IntradayBar。time は米国東部時間の Timestamp）のリストを順に返す反復可能オブジェクト」なら何でもよい。
+  PollingFeed : データプロバイダーの分足（yfinance の interval=1m）を一定間隔で取得（--record で CSV に保存）
+  FileFeed    : 保存した分足の CSV（Datetime,Symbol,Open,High,Low,Close,Volume）を再生（--speed で再生速度）
+
+  python intraday.py [--symbols ...] [--feed poll|file] [--file CSV] [--speed X] [--poll-sec 60] [--record CSV] [--no-notify]
+  python intraday.py --verify  : 合成分足（FakeProvider）で PollingFeed をオフライン確認
+"""
+import os
+import sys
+import math
+import time
+import argparse
+import datetime
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import run_metrics
+from run_metrics import count, stage
+from backtest_engine import COOLDOWN_SESSIONS
+from daily_report import LEDGER_DB, NYSE, SYMBOLS, US_EAST, deliver
+from data_provider import FakeProvider, get_provider
+from history_store import OHLCV_COLUMNS, load_history
+from indicator_state import advance, load_state
+from indicators import INDICATOR_COLUMNS, STRENGTH_LABELS, compute_indicators, signal_mask
+from ledger import open_ledger
+from main import HISTORY_STORE, SIGNAL_CONFIG
+
+if sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+MARKET_OPEN  = datetime.time(9, 30)  # 米国東部時間の立会時間（短縮取引日は考慮しない）
+MARKET_CLOSE = datetime.time(16, 0)
+POLL_SEC     = float(os.getenv('INTRADAY_POLL_SEC', '60'))  # 分足の取得間隔
+POLL_BATCH   = 100                                          # 1 リクエストあたりの銘柄数
+FEED_COLUMNS = ['Datetime', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+IntradayBar = namedtuple('IntradayBar', ['symbol', 'time', 'open', 'high', 'low', 'close', 'volume'])
+
+
+def _eastern(ts):
+    """Timestamp -> 米国東部時間（タイムゾーン無しは東部時間とみなす）。"""
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize(US_EAST) if ts.tzinfo is None else ts.tz_convert(US_EAST)
+
+
+def market_open(now):
+    """now（タイムゾーン付き）が NYSE の立会時間中か。"""
+    now_us = _eastern(now)
+    return bool(NYSE.is_session(now_us.date())) and MARKET_OPEN <= now_us.time() < MARKET_CLOSE
+
+
+# =============================
+# ストリーム
+# =============================
+
+class FileFeed:
+    """分足の CSV を時刻順に再生する。speed > 0 なら実時間の speed 倍で待ちながら返す（0 は待たない）。"""
+
+    def __init__(self, path, speed=0.0, symbols=None):
+        self.path    = path
+        self.speed   = speed
+        self.symbols = set(symbols) if symbols else None
+
+    def __iter__(self):
+        df = pd.read_csv(self.path)
+        if self.symbols is not None:
+            df = df[df['Symbol'].isin(self.symbols)]
+        times = pd.to_datetime(df['Datetime'], utc=True).dt.tz_convert(US_EAST)
+        df    = df.assign(Datetime=times).sort_values('Datetime', kind='stable')
+        cols  = [df[c].to_numpy() for c in FEED_COLUMNS]
+        prev  = None
+        start = 0
+        for k in range(1, len(df) + 1):
+            if k < len(df) and cols[0][k] == cols[0][start]:
+                continue
+            t = cols[0][start]
+            if self.speed and prev is not None:
+                time.sleep(max(0.0, (t - prev).total_seconds() / self.speed))
+            prev = t
+            yield [IntradayBar(cols[1][j], cols[0][j], float(cols[2][j]), float(cols[3][j]), float(cols[4][j]),
+                               float(cols[5][j]), float(cols[6][j])) for j in range(start, k)]
+            start = k
+
+
+class PollingFeed:
+    """プロバイダーから当日の分足を poll_sec 秒ごとに取得し、前回以降の分足を返す。
+    最後の分足は形成中のため毎回返し直す（集計側で同じ時刻の分足は置き換える）。
+    立会時間の前は開始まで待ち、引けたら終わる。record を指定すると取得した分足を CSV に追記する。
+    """
+
+    def __init__(self, symbols, provider=None, interval='1m', poll_sec=POLL_SEC, batch_size=POLL_BATCH,
+                 record=None, clock=None):
+        self.symbols    = list(symbols)
+        self.provider   = provider or get_provider()
+        self.interval   = interval
+        self.poll_sec   = poll_sec
+        self.batch_size = batch_size
+        self.record     = record
+        self.clock      = clock or (lambda: datetime.datetime.now(US_EAST))
+
+    def _wait_open(self):
+        """立会時間になるまで待つ。当日が休場・引け後なら False。"""
+        while not market_open(self.clock()):
+            now_us = _eastern(self.clock())
+            if not NYSE.is_session(now_us.date()) or now_us.time() >= MARKET_CLOSE:
+                return False
+            time.sleep(min(60.0, self.poll_sec))
+        return True
+
+    def _poll(self, last):
+        bars = []
+        for i in range(0, len(self.symbols), self.batch_size):
+            chunk = self.symbols[i:i + self.batch_size]
+            count('intraday.poll_requests')
+            try:
+                with stage('intraday.poll'):
+                    frames = self.provider.download(chunk, period='1d', interval=self.interval)
+            except Exception as e:
+                count('intraday.poll_errors')
+                print(f"【エラー】分足の取得失敗 ({len(chunk)}銘柄): {e}")
+                continue
+            for symbol, df in frames.items():
+                df = df.dropna(subset=['Close'])
+                if df.empty:
+                    continue
+                index = df.index.tz_localize(US_EAST) if df.index.tz is None else df.index.tz_convert(US_EAST)
+                seen  = last.get(symbol)
+                keep  = index >= seen if seen is not None else np.ones(len(df), dtype=bool)
+                for t, o, h, l, c, v in zip(index[keep], *(df[col].to_numpy(float)[keep]
+                                                          for col in ('Open', 'High', 'Low', 'Close', 'Volume'))):
+                    bars.append(IntradayBar(symbol, t, o, h, l, c, v))
+                last[symbol] = index[-1]
+        return bars
+
+    def _save(self, bars):
+        new = not os.path.exists(self.record)
+        rows = pd.DataFrame([(b.time.isoformat(), b.symbol, b.open, b.high, b.low, b.close, b.volume) for b in bars],
+                            columns=FEED_COLUMNS)
+        rows.to_csv(self.record, mode='a', header=new, index=False)
+
+    def __iter__(self):
+        if not self._wait_open():
+            print("【情報】米国市場の立会時間外のため終了します。")
+            return
+        last = {}
+        while market_open(self.clock()):
+            t0   = time.monotonic()
+            bars = self._poll(last)
+            if self.record and bars:
+                self._save(bars)
+            yield bars
+            time.sleep(max(0.0, self.poll_sec - (time.monotonic() - t0)))
+
+
+# =============================
+# 判定
+# =============================
+
+class SymbolMonitor:
+    """1 銘柄分の暫定日足・指標状態・判定用の配列（直近 lookback 本の確定バー + 暫定バー）。"""
+
+    def __init__(self, symbol, strategy, min_strength, daily, state=None):
+        lookback = strategy.lookback()
+        if not math.isfinite(lookback):
+            raise ValueError(f"{symbol}: 戦略の参照範囲（lookback）が決まらないため日中モードでは判定できません")
+        self.symbol       = symbol
+        self.strategy     = strategy
+        self.min_strength = min_strength
+        self.lookback     = k = int(lookback)
+        self.state        = advance(state, daily)  # 前日までの確定バーで指標状態を進める
+
+        rows = [r for r in (self.state.prev_row, self.state.last_row) if r is not None]
+        if k > len(rows):
+            ind  = compute_indicators(daily['High'], daily['Low'], daily['Close'])
+            rows = [{col: ind[col][j] for col in INDICATOR_COLUMNS} for j in range(len(daily) - k, len(daily))]
+        rows = rows[len(rows) - k:] if k else []
+        # 列名 -> (lookback + 1) 本の配列。最後の 1 本を暫定バーとして分足ごとに上書きする
+        self.data = {col: np.full(k + 1, np.nan) for col in OHLCV_COLUMNS + INDICATOR_COLUMNS}
+        for col in OHLCV_COLUMNS:
+            if col in daily and k:
+                self.data[col][:k] = daily[col].to_numpy(float)[-k:]
+        for j, row in enumerate(rows):
+            for col in INDICATOR_COLUMNS:
+                self.data[col][j] = row[col]
+
+        self.date     = None  # 暫定バーの日付（'YYYY-MM-DD'）
+        self.bar_time = None  # 最後に取り込んだ分足の時刻
+        self.open = self.high = self.low = self.close = math.nan
+        self.volume = self.bar_volume = 0.0
+
+    def _roll(self, date):
+        """日付が変わったら前日の暫定バーを確定し、判定用の配列を 1 本ずらす。"""
+        if self.date is not None:
+            self.state.update(self.date, self.high, self.low, self.close)
+            for a in self.data.values():
+                a[:-1] = a[1:]
+        self.date     = date
+        self.bar_time = None
+        self.open = self.high = self.low = self.close = math.nan
+        self.volume = self.bar_volume = 0.0
+
+    def on_bar(self, bar, date):
+        """分足（date はその米国東部時間の日付 'YYYY-MM-DD'）を取り込み、暫定バーの強度コードを返す。
+        古い分足は無視して None。
+        """
+        t = bar.time
+        if self.date is None or date > self.date:
+            self._roll(date)
+        elif date < self.date or (self.bar_time is not None and t < self.bar_time):
+            count('intraday.stale_bars')
+            return None
+
+        # 暫定日足の集計（同じ時刻の分足は形成中の更新として出来高を置き換える）
+        if self.bar_time is None or t > self.bar_time:
+            self.volume  += self.bar_volume
+            self.bar_time = t
+        if math.isnan(self.open):
+            self.open = bar.open
+        self.high       = bar.high if math.isnan(self.high) else max(self.high, bar.high)
+        self.low        = bar.low if math.isnan(self.low) else min(self.low, bar.low)
+        self.close      = bar.close
+        self.bar_volume = bar.volume
+
+        row = self.state.peek(self.high, self.low, self.close)
+        k, d = self.lookback, self.data
+        d['Open'][k], d['High'][k], d['Low'][k], d['Close'][k] = self.open, self.high, self.low, self.close
+        d['Volume'][k] = self.volume + self.bar_volume
+        for col in INDICATOR_COLUMNS:
+            d[col][k] = row[col]
+        return int(self.strategy(d)[-1])
+
+
+class IntradayMonitor:
+    """全銘柄の SymbolMonitor と、速報の重複防止・送信。"""
+
+    def __init__(self, ledger, symbols=None, signal_config=None, notifier=None, load=None, states=None):
+        self.ledger        = ledger
+        self.symbols       = set(symbols or SYMBOLS)
+        self.signal_config = signal_config or SIGNAL_CONFIG
+        self.notifier      = notifier
+        self.load          = load or (lambda symbol: load_history(symbol, HISTORY_STORE))
+        self.states        = states  # None なら indicator_state/ の保存済み状態から始める
+        self.monitors      = {}      # 銘柄 -> SymbolMonitor（判定できない銘柄は None）
+        self.handled       = {}      # (日付, 銘柄) -> 通知済み・抑止済みの最大強度コード
+        self.alerts        = []      # 送信した速報（日付, 銘柄, 強度, 価格, 時刻）
+
+    def _monitor(self, symbol, date):
+        """銘柄の初回の分足で、その日より前の日足から SymbolMonitor を作る。"""
+        if symbol in self.monitors:
+            return self.monitors[symbol]
+        monitor = None
+        config  = self.signal_config.get(symbol)
+        if config is None:
+            count('intraday.unknown_symbols')
+        else:
+            with stage('intraday.setup'):
+                daily = self.load(symbol)
+                daily = daily[daily.index < pd.Timestamp(date)].dropna(subset=['Close']) if not daily.empty else daily
+                if len(daily) < 200:
+                    count('symbols.short_history')
+                    print(f"【警告】{symbol}: 指標計算に必要なデータ不足 (最低200日分必要) のため日中判定しません")
+                else:
+                    prev = pd.Timestamp(NYSE.previous_session(date))
+                    if daily.index[-1] < prev:
+                        count('intraday.stale_history')
+                        print(f"【警告】{symbol}: 日足が {prev.date()} まで揃っていません（最終 {daily.index[-1].date()}）")
+                    state   = load_state(symbol) if self.states is None else self.states.get(symbol)
+                    monitor = SymbolMonitor(symbol, config['func'], config['min_strength'], daily, state)
+        self.monitors[symbol] = monitor
+        return monitor
+
+    def _check(self, monitor, code, bar):
+        """条件成立時に台帳と照合し、通知する場合は通知行を返す。"""
+        date, symbol = monitor.date, monitor.symbol
+        key = (date, symbol)
+        if self.handled.get(key, 0) >= code:
+            return None
+        self.handled[key] = code
+        strength = str(STRENGTH_LABELS[code])
+        cutoff   = str(NYSE.offset(date, -COOLDOWN_SESSIONS))
+        with stage('ledger'):
+            if self.ledger.has_active(date, symbol) or self.ledger.has_trades_since(symbol, cutoff):
+                count('intraday.suppressed')
+                return None
+            time_str = bar.time.strftime('%H:%M')
+            if not self.ledger.add_alert(date, symbol, strength, monitor.close, time_str):
+                count('intraday.duplicate_alerts')
+                return None
+        count('intraday.alerts')
+        self.alerts.append((date, symbol, strength, monitor.close, time_str))
+        icon = '🔴' if strength == 'strong' else '🟡'
+        print(f"【速報】{symbol} 強度: {icon} {strength} 現在値 ${monitor.close:.2f} ({time_str} ET)")
+        return f"⚡ {symbol} {icon} **{strength}** 現在値 ${monitor.close:.2f} ({time_str} ET)"
+
+    def on_bars(self, bars):
+        """1 回分の分足を取り込んで判定し、速報があれば送る。送った通知行のリストを返す。"""
+        lines = []
+        count('intraday.bars', len(bars))
+        with stage('intraday.evaluate'):
+            last_time = date = None
+            for bar in bars:
+                if bar.symbol not in self.symbols:
+                    continue
+                if bar.time != last_time:  # 同じ回の分足は時刻が同じことが多いので日付の変換を使い回す
+                    last_time, date = bar.time, bar.time.strftime('%Y-%m-%d')
+                monitor = self._monitor(bar.symbol, date)
+                if monitor is None:
+                    continue
+                code = monitor.on_bar(bar, date)
+                if code and signal_mask(np.array([code]), monitor.min_strength)[0]:
+                    line = self._check(monitor, code, bar)
+                    if line:
+                        lines.append(line)
+        if lines:
+            msg = (f"📢 **{date} 日中シグナル速報（暫定）**\n" + "\n".join(lines)
+                   + "\n\n📌 ※現在値で判定した暫定のシグナルです。終値で条件を満たした場合のみ、日次チェックで翌営業日の約定対象になります。")
+            deliver(msg, self.notifier)
+        return lines
+
+    def run(self, feed):
+        """feed（分足のリストを返す反復可能オブジェクト）が尽きるまで処理し、送った速報の件数を返す。"""
+        sent = 0
+        for bars in feed:
+            if bars:
+                sent += len(self.on_bars(bars))
+        return sent
+
+
+# =============================
+# 動作確認（オフライン）
+# =============================
+
+def verify_polling(symbols=('AAA', 'BBB', 'CCC'), step_min=15):
+    """FakeProvider の合成分足で PollingFeed を直近の営業日 1 日分動かし、全銘柄の分足が欠けずに届くか確認する。
+    時計は 1 回の取得ごとに step_min 分進める（待たない）。2 銘柄目は前営業日で終わる分足にして、
+    同じリクエスト内で最終日の異なる銘柄があっても period が銘柄ごとに効くことを確かめる。
+    """
+    day   = NYSE.previous_session(datetime.date.today())
+    open_ = pd.Timestamp(f"{day} {MARKET_OPEN}", tz=US_EAST)
+    rng   = np.random.default_rng(0)
+    frames, indexes = {}, {}
+    for k, symbol in enumerate(symbols):
+        bar_day = NYSE.previous_session(day) if k == 1 else day
+        index   = pd.date_range(pd.Timestamp(f"{bar_day} {MARKET_OPEN}", tz=US_EAST), periods=390, freq='min')
+        close   = 100 * np.exp(np.cumsum(rng.normal(0, 1e-3, len(index))))
+        frames[symbol] = pd.DataFrame({'Open': close, 'High': close * 1.001, 'Low': close * 0.999,
+                                       'Close': close, 'Volume': 1000.0}, index=index)
+        indexes[symbol] = index
+    index = indexes[symbols[0]]
+    ticks = iter(pd.date_range(open_, index[-1] + pd.Timedelta(minutes=step_min), freq=f"{step_min}min"))
+    now   = [open_]
+
+    def clock():
+        now[0] = next(ticks, now[0])
+        return now[0]
+
+    feed = PollingFeed(symbols, provider=FakeProvider(frames), poll_sec=0, batch_size=2, clock=clock)
+    got  = {symbol: {} for symbol in symbols}
+    polls = 0
+    for bars in feed:
+        polls += 1
+        for bar in bars:
+            got[bar.symbol][bar.time] = bar.close
+    ok = polls > 0
+    for symbol in symbols:
+        index = indexes[symbol]
+        match = len(got[symbol]) == len(index) and np.allclose(
+            [got[symbol].get(t, np.nan) for t in index], frames[symbol]['Close'].to_numpy())
+        print(f"  {symbol:<6} {'OK' if match else 'NG'} (分足 {len(got[symbol])}/{len(index)}, {index[0].date()})")
+        ok &= match
+    print(f"  取得 {polls}回 ({day})")
+    return ok
+
+
+# =============================
+# 実行
+# =============================
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='日中モード（分足を取り込み暫定の日足でシグナルを速報）')
+    parser.add_argument('--symbols', nargs='+', default=SYMBOLS, help='対象の銘柄（strategies.json に戦略が必要）')
+    parser.add_argument('--feed', choices=['poll', 'file'], default='poll', help='分足の取り込み元')
+    parser.add_argument('--file', help='--feed file で再生する分足の CSV')
+    parser.add_argument('--speed', type=float, default=0.0, help='--feed file の再生速度（実時間の倍率。0 は待たない）')
+    parser.add_argument('--interval', default='1m', help='--feed poll の足の間隔')
+    parser.add_argument('--poll-sec', type=float, default=POLL_SEC, help='--feed poll の取得間隔（秒）')
+    parser.add_argument('--record', help='--feed poll で取得した分足を追記する CSV（--feed file で再生できる）')
+    parser.add_argument('--ledger', default=LEDGER_DB, help="取引台帳（':memory:' で保存しない）")
+    parser.add_argument('--no-notify', action='store_true', help='Discord に送信しない（速報は表示のみ）')
+    parser.add_argument('--verify', action='store_true', help='合成分足（FakeProvider）で PollingFeed の動作を確認して終了')
+    parser.add_argument('--profile', choices=run_metrics.PROFILE_MODES, help='プロファイラを有効にする')
+    parser.add_argument('--report', help='実行レポート（JSON Lines）の追記先')
+    return parser.parse_args(argv)
+
+
+def _main(args):
+    if args.verify:
+        sys.exit(0 if verify_polling() else 1)
+    if args.feed == 'file' and not args.file:
+        print("【エラー】--feed file には --file で分足の CSV を指定してください。")
+        sys.exit(1)
+    unknown = [s for s in args.symbols if s not in SIGNAL_CONFIG]
+    if unknown:
+        print(f"【エラー】strategies.json に戦略が割り当てられていない銘柄です: {', '.join(unknown)}")
+        sys.exit(1)
+
+    metrics = run_metrics.start_run('intraday')
+    metrics.set_info(symbols=len(args.symbols), feed=args.feed)
+    if args.feed == 'file':
+        feed = FileFeed(args.file, args.speed, args.symbols)
+    else:
+        feed = PollingFeed(args.symbols, interval=args.interval, poll_sec=args.poll_sec, record=args.record)
+    notifier = None
+    if args.no_notify:
+        from replay import NullNotifier
+        notifier = NullNotifier()
+
+    print(f"--- 日中モード開始 ({len(args.symbols)}銘柄 / {args.feed}) ---")
+    ledger  = open_ledger(args.ledger)
+    monitor = IntradayMonitor(ledger, args.symbols, notifier=notifier)
+    try:
+        monitor.run(feed)
+    except KeyboardInterrupt:
+        print("【情報】中断しました。")
+    finally:
+        ledger.close()
+    print(f"【完了】速報 {len(monitor.alerts)}件")
+    print("\n" + metrics.summary())
+    if args.report:
+        metrics.save(args.report)
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    with run_metrics.profile(args.profile, 'intraday'):
+        _main(args)
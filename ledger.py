@@ -0,0 +1,250 @@
+"""取引台帳（SQLite）
+
+trade_history.csv の全件読み込み・全件書き直しを置き換える。
+  - (symbol, date, status) のインデックスで銘柄ごとの検索を行う
+  - signal / holding は (date, symbol, status) で一意（従来の drop_duplicates の代わり）
+  - 1 回の実行分をトランザクションでまとめ、途中で落ちても書きかけの状態を残さない
+  - 旧形式の trade_history2.csv は legacy_trades に保管（保有・冷却期間の判定には使わない）
+  - 日中モードの速報は alerts に記録（通知の重複防止のみ。保有・冷却期間の判定には使わない）
+
+  python ledger.py import [CSV ...]  : CSV を取り込む（既定: trade_history.csv trade_history2.csv）
+  python ledger.py export [CSV]      : CSV に書き出す（既定: trade_history.csv）
+"""
+import os
+import sys
+import csv
+import sqlite3
+from contextlib import contextmanager
+
+LEDGER_DB = os.getenv('LEDGER_DB', 'trade_ledger.db')
+LEGACY_CSV_FILES = ['trade_history.csv', 'trade_history2.csv']
+CSV_COLUMNS = ['Date', 'Symbol', 'Status', 'Buy_Price', 'Shares', 'Signal_Strength']
+ACTIVE_STATUSES = ('signal', 'holding')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id              INTEGER PRIMARY KEY,
+    date            TEXT    NOT NULL,
+    symbol          TEXT    NOT NULL,
+    status          TEXT    NOT NULL,
+    buy_price       REAL    NOT NULL DEFAULT 0.0,
+    shares          INTEGER NOT NULL DEFAULT 1,
+    signal_strength TEXT    NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_trades_symbol_date_status ON trades (symbol, date, status);
+CREATE INDEX IF NOT EXISTS idx_trades_status_date ON trades (status, date);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_trades_active ON trades (date, symbol, status)
+    WHERE status IN ('signal', 'holding');
+
+-- 旧形式（Date,Symbol,Status,Buy_Price）の履歴。保管のみでトレードロジックからは参照しない
+CREATE TABLE IF NOT EXISTS legacy_trades (
+    id        INTEGER PRIMARY KEY,
+    date      TEXT NOT NULL,
+    symbol    TEXT NOT NULL,
+    status    TEXT NOT NULL,
+    buy_price REAL NOT NULL DEFAULT 0.0,
+    UNIQUE (date, symbol, status, buy_price)
+);
+
+-- 日中モード（intraday.py）の速報。同日・同銘柄・同強度は 1 回だけ通知する（再起動しても重複しない）
+CREATE TABLE IF NOT EXISTS alerts (
+    id       INTEGER PRIMARY KEY,
+    date     TEXT NOT NULL,
+    symbol   TEXT NOT NULL,
+    strength TEXT NOT NULL,
+    price    REAL NOT NULL DEFAULT 0.0,
+    time     TEXT NOT NULL DEFAULT '',
+    UNIQUE (date, symbol, strength)
+);
+"""
+
+
+class TradeLedger:
+    def __init__(self, path=LEDGER_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def transaction(self):
+        """ブロック全体をまとめてコミット。例外時はロールバックする。"""
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+
+    # --- トレードロジック用 ---
+
+    def fill_signals(self, symbol, open_price):
+        """未約定シグナルを始値で holding に更新し、更新件数を返す。
+        同日・同銘柄の holding が既にある場合は既存行を残してシグナルを破棄する（従来の keep='first' 相当）。
+        """
+        cur = self.conn.execute(
+            "UPDATE OR IGNORE trades SET status = 'holding', buy_price = ? WHERE symbol = ? AND status = 'signal'",
+            (float(open_price), symbol),
+        )
+        self.conn.execute("DELETE FROM trades WHERE symbol = ? AND status = 'signal'", (symbol,))
+        return cur.rowcount
+
+    def has_trades_since(self, symbol, date_str):
+        """date_str 以降にその銘柄の取引（ステータス問わず）があるか（冷却期間チェック）。"""
+        row = self.conn.execute(
+            "SELECT 1 FROM trades WHERE symbol = ? AND date >= ? LIMIT 1", (symbol, date_str)
+        ).fetchone()
+        return row is not None
+
+    def has_active(self, date_str, symbol):
+        """同日・同銘柄の signal / holding があるか（重複登録防止）。"""
+        row = self.conn.execute(
+            "SELECT 1 FROM trades WHERE symbol = ? AND date = ? AND status IN (?, ?) LIMIT 1",
+            (symbol, date_str, *ACTIVE_STATUSES),
+        ).fetchone()
+        return row is not None
+
+    def add_signal(self, date_str, symbol, strength, shares=1):
+        """新規シグナルを登録する。一意制約に掛かった場合は False。"""
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO trades (date, symbol, status, buy_price, shares, signal_strength) "
+            "VALUES (?, ?, 'signal', 0.0, ?, ?)",
+            (date_str, symbol, int(shares), strength),
+        )
+        return cur.rowcount == 1
+
+    def add_alert(self, date_str, symbol, strength, price=0.0, time_str=''):
+        """日中の速報を記録する。同日・同銘柄・同強度が通知済みなら False。"""
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO alerts (date, symbol, strength, price, time) VALUES (?, ?, ?, ?, ?)",
+            (date_str, symbol, strength, float(price), time_str),
+        )
+        return cur.rowcount == 1
+
+    def alerts(self, date_str):
+        """その日の速報（通知順）。"""
+        return [dict(r) for r in self.conn.execute(
+            "SELECT date, symbol, strength, price, time FROM alerts WHERE date = ? ORDER BY id", (date_str,)
+        )]
+
+    def holdings(self, symbol):
+        """(保有株数, 取得総額) を返す。"""
+        row = self.conn.execute(
+            "SELECT COALESCE(SUM(shares), 0), COALESCE(SUM(buy_price * shares), 0.0) "
+            "FROM trades WHERE symbol = ? AND status = 'holding'",
+            (symbol,),
+        ).fetchone()
+        return int(row[0]), float(row[1])
+
+    def fills_since(self, date_str):
+        """date_str 以降の holding 行（週報用）。"""
+        return [dict(r) for r in self.conn.execute(
+            "SELECT date, symbol, buy_price, shares, signal_strength FROM trades "
+            "WHERE status = 'holding' AND date >= ? ORDER BY id",
+            (date_str,),
+        )]
+
+    def trades(self, symbol=None):
+        """取引行の一覧（登録順）。symbol 省略時は全銘柄。"""
+        sql, args = "SELECT date, symbol, status, buy_price, shares, signal_strength FROM trades", ()
+        if symbol is not None:
+            sql, args = sql + " WHERE symbol = ?", (symbol,)
+        return [dict(r) for r in self.conn.execute(sql + " ORDER BY id", args)]
+
+    def is_empty(self):
+        return all(
+            self.conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is None
+            for table in ('trades', 'legacy_trades')
+        )
+
+    # --- CSV インポート / エクスポート ---
+
+    def import_csv(self, path):
+        """CSV を取り込み、追加件数を返す。
+        trade_history.csv 形式は trades へ（完全に同じ行は 1 件、signal / holding の重複は先勝ち）。
+        Shares 列の無い旧形式（trade_history2.csv）は legacy_trades へ保管する。
+        """
+        added = 0
+        with open(path, newline='', encoding='utf-8') as f, self.transaction():
+            reader = csv.DictReader(f)
+            legacy = 'Shares' not in (reader.fieldnames or [])
+            for rec in reader:
+                date, symbol = (rec.get('Date') or '').strip(), (rec.get('Symbol') or '').strip()
+                status = (rec.get('Status') or '').strip()
+                if not date or not symbol or not status:
+                    continue
+                price = _to_float(rec.get('Buy_Price'), 0.0)
+                if legacy:
+                    cur = self.conn.execute(
+                        "INSERT OR IGNORE INTO legacy_trades (date, symbol, status, buy_price) VALUES (?, ?, ?, ?)",
+                        (date, symbol, status, price),
+                    )
+                    added += cur.rowcount
+                    continue
+                row = (date, symbol, status, price,
+                       int(_to_float(rec.get('Shares'), 1)), (rec.get('Signal_Strength') or '').strip())
+                dup = self.conn.execute(
+                    "SELECT 1 FROM trades WHERE date = ? AND symbol = ? AND status = ? AND buy_price = ? "
+                    "AND shares = ? AND signal_strength = ? LIMIT 1", row,
+                ).fetchone()
+                if dup:
+                    continue
+                cur = self.conn.execute(
+                    "INSERT OR IGNORE INTO trades (date, symbol, status, buy_price, shares, signal_strength) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", row,
+                )
+                added += cur.rowcount
+        return added
+
+    def export_csv(self, path):
+        rows = self.conn.execute(
+            "SELECT date, symbol, status, buy_price, shares, signal_strength FROM trades ORDER BY id"
+        ).fetchall()
+        tmp = path + '.tmp'
+        with open(tmp, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_COLUMNS)
+            writer.writerows(tuple(r) for r in rows)
+        os.replace(tmp, path)
+        return len(rows)
+
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def open_ledger(path=LEDGER_DB, legacy_files=LEGACY_CSV_FILES):
+    """台帳を開く。新規作成時は既存の CSV を一度だけ取り込む。"""
+    ledger = TradeLedger(path)
+    if ledger.is_empty():
+        for csv_path in legacy_files:
+            if os.path.exists(csv_path):
+                added = ledger.import_csv(csv_path)
+                print(f"【情報】取引台帳へ取り込みました: {csv_path} ({added}件)")
+    return ledger
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ('import', 'export'):
+        print("使い方: python ledger.py import [CSV ...] | export [CSV]")
+        sys.exit(1)
+    with TradeLedger() as ledger:
+        if sys.argv[1] == 'import':
+            for csv_path in sys.argv[2:] or LEGACY_CSV_FILES:
+                print(f"【取込】{csv_path}: {ledger.import_csv(csv_path)}件")
+        else:
+            target = sys.argv[2] if len(sys.argv) > 2 else 'trade_history.csv'
+            print(f"【出力】{target}: {ledger.export_csv(target)}件")
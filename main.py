@@ -1,311 +1,295 @@
 import os
 import sys
-import datetime
+import numpy as np
 import pandas as pd
-import yfinance as yf
-from discord import SyncWebhook
-import pytz
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 import time
-import holidays
+from data_provider import get_provider
+from history_store import get_store, load_history, merge_history
+from indicator_state import advance, clear_state, load_state, save_state
+from indicators import signal_mask, strength_labels
+from strategies import signal_config
+from backtest_engine import COOLDOWN_SESSIONS
+import run_metrics
+from run_metrics import add_time, count, stage
+# 設定（SYMBOLS・台帳・タイムゾーン・カレンダー）と通知本文は pandas を使わない daily_report に置く
+from daily_report import (
+    NYSE, SYMBOLS, US_EAST,
+    build_message, deliver, parse_args, run_daily, status_line,
+)
 
 # Windows環境でのUTF-8出力を強制
 if sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 
-# --- 設定 ---
-SYMBOLS = ['JMIA', 'NU']
-CSV_FILE = 'trade_history.csv'
-DISCORD_WEBHOOK_URL = os.getenv('DISCORD_WEBHOOK_URL')
+# 株価キャッシュ（history_store 参照。既定は history/{symbol}/*.npy）
+HISTORY_STORE          = get_store()
+HISTORY_FULL_PERIOD    = '2y'  # キャッシュが無い場合の初回取得期間
+HISTORY_RETENTION_DAYS = 3650  # 保持期間（暦日）。ウォークフォワード用の長期履歴を切り捨てない
+HISTORY_OVERLAP_DAYS   = 7     # 差分取得時に遡る日数（直近バーの修正値を取り込む）
+HISTORY_ADJUST_RTOL    = 1e-4  # 重複期間の価格がこれ以上ずれたら分割・配当で調整済み価格が変わったとみなす
 
-# タイムゾーン
-JST = pytz.timezone('Asia/Tokyo')
-US_EAST = pytz.timezone('US/Eastern')
-
-# 米国祝日
-US_HOLIDAYS = holidays.US()
-
-# 銘柄別 RSI 閾値（JMIA のみ使用。NU は nu_signal() 内で独自定義）
-RSI_THRESHOLDS = {
-    'JMIA': 35,
-}
+# 一括取得
+FETCH_BATCH_SIZE   = 100  # 1 リクエストあたりの銘柄数
+FETCH_WORKERS      = 8    # 個別再試行のスレッド数
+FETCH_DEADLINE_SEC = float(os.getenv('FETCH_DEADLINE_SEC', '600'))  # データ取得全体の締め切り
 
 # =============================
-# 共通指標計算
+# シグナル設定（戦略の条件式は strategies.json）
 # =============================
 
-def add_indicators(df):
-    # ストキャスティクス（期間10: より早い反応）
-    low_10   = df['Low'].rolling(10).min()
-    high_10  = df['High'].rolling(10).max()
-    range_10 = high_10 - low_10
-    df['STOCHk'] = 100 * ((df['Close'] - low_10) / range_10.where(range_10.abs() > 1e-10, other=pd.NA)).fillna(50)
-    df['STOCHd'] = df['STOCHk'].rolling(3).mean()
-    # RSI（期間14: Wilderの平滑化EWM）
-    delta    = df['Close'].diff()
-    avg_gain = delta.clip(lower=0).ewm(alpha=1/14, min_periods=14, adjust=False).mean()
-    avg_loss = (-delta.clip(upper=0)).ewm(alpha=1/14, min_periods=14, adjust=False).mean()
-    df['RSI'] = 100 - (100 / (1 + avg_gain / avg_loss.clip(lower=1e-10)))
-    # 移動平均線
-    df['MA50']  = df['Close'].rolling(50).mean()
-    df['MA200'] = df['Close'].rolling(200).mean()
-    # MACD（12/26/9）
-    ema12 = df['Close'].ewm(span=12, adjust=False).mean()
-    ema26 = df['Close'].ewm(span=26, adjust=False).mean()
-    df['MACD']        = ema12 - ema26
-    df['MACD_signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
-    return df
-
-
-def _composite_signal(df, rsi_threshold=35, base_condition=None):
-    """JMIA 用複合シグナル判定。'strong' / 'medium' / '' を返す Series。
-    条件A (strong): STOCHk<=20(クロスアップ) AND RSI<=閾値
-    条件B (medium): MACDゴールデンクロス
-    優先順: A > B
-    """
-    stoch_oversold = (df['STOCHk'] <= 20) | (df['STOCHd'] <= 20)
-    stoch_cross_up = (df['STOCHk'] > df['STOCHd']) & (df['STOCHk'].shift(1) <= df['STOCHd'].shift(1))
-    stoch_ok   = stoch_oversold & stoch_cross_up
-    rsi_ok     = df['RSI'] <= rsi_threshold
-    macd_cross = (df['MACD'] > df['MACD_signal']) & (df['MACD'].shift(1) <= df['MACD_signal'].shift(1))
-
-    cond_a = stoch_ok & rsi_ok  # strong
-    cond_b = macd_cross          # medium
-
-    if base_condition is not None:
-        cond_a = cond_a & base_condition
-        cond_b = cond_b & base_condition
-
-    strength = pd.Series('', index=df.index)
-    strength = strength.where(~cond_b, 'medium')
-    strength = strength.where(~cond_a, 'strong')  # A が B を上書き
-    return strength
-
-
-def jmia_signal(df):
-    """JMIA: 逆張り反転シグナル — ボラティリティフィルター付き"""
-    vol_ok = ((df['High'] - df['Low']) / df['Close'].replace(0, 1)) > 0.03
-    return _composite_signal(df, rsi_threshold=RSI_THRESHOLDS['JMIA'], base_condition=vol_ok)
-
-
-def nu_signal(df):
-    """NU: トレンドフォロー型プルバック戦略（調整版）
-    前提 : Close > MA200
-    strong: RSI 40-55 AND STOCHk <= 40
-    medium: MACDゴールデンクロス OR (STOCHk <= 40 AND RSI <= 50)
-    優先順: strong > medium
-    """
-    above_ma200 = df['Close'] > df['MA200']
-    macd_cross  = (df['MACD'] > df['MACD_signal']) & (df['MACD'].shift(1) <= df['MACD_signal'].shift(1))
-    rsi_sweet   = (df['RSI'] >= 40) & (df['RSI'] <= 55)
-    stoch_40    = df['STOCHk'] <= 40
-    rsi_50      = df['RSI'] <= 50
-
-    stoch_30    = df['STOCHk'] <= 30
-
-    cond_a = above_ma200 & rsi_sweet & stoch_30                # strong
-    cond_b = above_ma200 & (macd_cross | (stoch_40 & rsi_50))  # medium
-
-    strength = pd.Series('', index=df.index)
-    strength = strength.where(~cond_b, 'medium')
-    strength = strength.where(~cond_a, 'strong')
-    return strength
-
-
-SIGNAL_CONFIG = {
-    'JMIA': {'func': jmia_signal, 'min_strength': 'any'},    # strong + medium 両方実行
-    'NU':   {'func': nu_signal,   'min_strength': 'strong'},  # strong のみ実行
-}
+SIGNAL_CONFIG = signal_config()  # 銘柄 -> {'func': Strategy, 'min_strength': 'any' / 'strong'}
 
 # =============================
 # データ取得
 # =============================
 
-def get_stock_data(symbol, date_today_us):
-    # 土日または米国祝日はスキップ
-    if date_today_us.weekday() >= 5 or date_today_us in US_HOLIDAYS:
-        print(f"【情報】米国市場休場のためスキップ: {symbol}")
-        return None
+def _fetch_kwargs(cached):
+    """キャッシュがあれば最終日付（から重複期間を差し引いた日）以降のみ取得する。"""
+    if cached.empty:
+        return {'period': HISTORY_FULL_PERIOD}
+    start = cached.index[-1] - pd.Timedelta(days=HISTORY_OVERLAP_DAYS)
+    return {'start': start.strftime('%Y-%m-%d')}
+
 
-    filename = f"{symbol}_history.csv"
+def _price_adjusted(cached, fresh):
+    """差分取得の重複期間で、キャッシュと新規取得分の価格がずれているか（分割・配当で過去の調整済み価格が変わった）。
+    キャッシュの最終バーは修正値の取り込み対象なので比較しない。
+    """
+    common = cached.index[:-1].intersection(fresh.index)
+    cols   = [col for col in ('Open', 'High', 'Low', 'Close') if col in cached and col in fresh]
+    if common.empty or not cols:
+        return False
+    a = cached.loc[common, cols].to_numpy(float)
+    b = fresh.loc[common, cols].to_numpy(float)
+    ok = np.isfinite(a) & np.isfinite(b)
+    return bool((np.abs(a - b)[ok] > HISTORY_ADJUST_RTOL * np.abs(b)[ok]).any())
+
+
+def _fetch_with_retry(provider, symbol, fetch_kwargs, deadline):
+    """1 銘柄ずつの再取得（最大 3 回）。締め切りを過ぎたら打ち切る。"""
     for attempt in range(3):
+        if time.monotonic() >= deadline:
+            break
+        count('fetch.retry_attempts')
         try:
-            df = yf.download(symbol, period='1y', progress=False)
-            if not df.empty:
-                if isinstance(df.columns, pd.MultiIndex):
-                    df.columns = df.columns.get_level_values(0)
-                df.index = pd.to_datetime(df.index)
-                df.to_csv(filename)
-                return df
-            time.sleep(2)
+            fresh = provider.download([symbol], **fetch_kwargs).get(symbol)
+            if fresh is not None and not fresh.empty:
+                return fresh
         except Exception as e:
+            count('fetch.retry_errors')
             print(f"【エラー】データ取得失敗 {symbol} (試行 {attempt+1}/3): {e}")
-            time.sleep(2)
-
-    if os.path.exists(filename):
-        try:
-            print(f"【警告】最新データ取得失敗。ローカルキャッシュを利用します: {symbol}")
-            return pd.read_csv(filename, index_col=0, parse_dates=True)
-        except Exception:
-            return pd.DataFrame()
-    return pd.DataFrame()
+        wait = min(2, max(0.0, deadline - time.monotonic()))
+        time.sleep(wait)
+        add_time('fetch.retry_sleep', wait)
+    return None
+
+
+def get_stock_data_batch(symbols, date_today_us, provider=None, deadline_sec=FETCH_DEADLINE_SEC):
+    """複数銘柄をまとめて取得し {symbol: DataFrame} を返す。
+    1. 取得開始日が同じ銘柄を FETCH_BATCH_SIZE 件ずつ一括取得
+    2. 一括取得で欠けた銘柄はスレッドプールで個別に再試行
+    3. 締め切り（deadline_sec）までに取れなかった銘柄はローカルキャッシュを利用
+    4. 重複期間の価格がキャッシュとずれた銘柄（分割・配当）はキャッシュの期間を全て取り直す
+    休場日は全銘柄 None。
+    """
+    # NYSE の休場日（土日・取引所の祝日・臨時休場）はスキップ
+    if not NYSE.is_session(date_today_us):
+        for symbol in symbols:
+            print(f"【情報】米国市場休場のためスキップ: {symbol}")
+        count('fetch.market_closed', len(symbols))
+        return {symbol: None for symbol in symbols}
+
+    provider = provider or get_provider()
+    deadline = time.monotonic() + deadline_sec
+    with stage('fetch.cache_load'):
+        cached = {symbol: load_history(symbol, HISTORY_STORE) for symbol in symbols}
+    kwargs = {symbol: _fetch_kwargs(cached[symbol]) for symbol in symbols}
+    fresh  = {}
+    # キャッシュあり = 差分取得 / なし = 全期間取得
+    count('fetch.cache_hit', sum(not df.empty for df in cached.values()))
+    count('fetch.cache_miss', sum(df.empty for df in cached.values()))
+
+    groups = {}
+    for symbol in symbols:
+        groups.setdefault(tuple(sorted(kwargs[symbol].items())), []).append(symbol)
+    with stage('fetch.batch'):
+        for key, group in groups.items():
+            for i in range(0, len(group), FETCH_BATCH_SIZE):
+                if time.monotonic() >= deadline:
+                    break
+                chunk = group[i:i + FETCH_BATCH_SIZE]
+                count('fetch.batch_requests')
+                try:
+                    fresh.update(provider.download(chunk, **dict(key)))
+                except Exception as e:
+                    count('fetch.batch_errors')
+                    print(f"【エラー】一括取得失敗 ({len(chunk)}銘柄): {e}")
+
+    missing = [s for s in symbols if s not in fresh]
+    count('fetch.retry_symbols', len(missing))
+    if missing and time.monotonic() < deadline:
+        with stage('fetch.retry'):
+            pool = ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(missing)))
+            futures = {pool.submit(_fetch_with_retry, provider, s, kwargs[s], deadline): s for s in missing}
+            try:
+                for future in as_completed(futures, timeout=max(0.0, deadline - time.monotonic())):
+                    result = future.result()
+                    if result is not None:
+                        fresh[futures[future]] = result
+            except FuturesTimeout:
+                count('fetch.deadline_exceeded')
+                print(f"【警告】データ取得の締め切り ({deadline_sec}秒) を超過しました。")
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    results = {}
+    with stage('fetch.store'):
+        for symbol in symbols:
+            base = cached[symbol]
+            if symbol in fresh and not base.empty and _price_adjusted(base, fresh[symbol]):
+                # 分割・配当で調整済み価格が変わった: 古いバーと混ぜず、キャッシュの期間を全て取り直す
+                count('fetch.adjusted')
+                print(f"【情報】分割・配当による価格調整を検出。全期間を再取得します: {symbol}")
+                full = _fetch_with_retry(provider, symbol, {'start': base.index[0].strftime('%Y-%m-%d')}, deadline)
+                if full is not None:
+                    base, fresh[symbol] = pd.DataFrame(), full
+                    clear_state(symbol)  # 指標状態も作り直す
+                else:
+                    del fresh[symbol]  # 混在した履歴は保存しない（次回の実行で再検出する）
+            if symbol in fresh:
+                df = merge_history(base, fresh[symbol], HISTORY_RETENTION_DAYS)
+                HISTORY_STORE.save(symbol, df)
+                results[symbol] = df
+            elif not cached[symbol].empty:
+                count('fetch.stale_cache')
+                print(f"【警告】最新データ取得失敗。ローカルキャッシュを利用します: {symbol}")
+                results[symbol] = cached[symbol]
+            else:
+                count('fetch.failed')
+                results[symbol] = pd.DataFrame()
+    return results
+
+
+def get_stock_data(symbol, date_today_us, provider=None):
+    return get_stock_data_batch([symbol], date_today_us, provider)[symbol]
 
 
 # =============================
-# メイン処理
+# 銘柄ごとの判定・台帳更新（ライブ実行とリプレイで共通）
 # =============================
 
-def main():
-    print("--- 株価チェック処理開始 ---")
-
-    now_jst   = datetime.datetime.now(JST)
-    today_jst = now_jst.date()
-    now_us    = now_jst.astimezone(US_EAST)
-    today_us  = now_us.date()
+def _tail_length(func):
+    """判定に渡す直近の本数（戦略の lookback + 当日）。lookback を持たない関数は従来どおり 2 本。"""
+    lookback = getattr(func, 'lookback', None)
+    return 2 if lookback is None else lookback() + 1
 
-    # CSVの読み込みまたは新規作成
-    cols = ['Date', 'Symbol', 'Status', 'Buy_Price', 'Shares', 'Signal_Strength']
-    if os.path.exists(CSV_FILE):
-        try:
-            trade_log = pd.read_csv(CSV_FILE)
-            trade_log['Buy_Price'] = pd.to_numeric(trade_log['Buy_Price'], errors='coerce').fillna(0.0)
-            trade_log['Status']    = trade_log['Status'].astype(str).str.strip()
-            trade_log['Date']      = trade_log['Date'].astype(str)
-            if 'Shares' not in trade_log.columns:
-                trade_log['Shares'] = 1
-            trade_log['Shares'] = pd.to_numeric(trade_log['Shares'], errors='coerce').fillna(1).astype(int)
-            if 'Signal_Strength' not in trade_log.columns:
-                trade_log['Signal_Strength'] = ''
-            trade_log['Signal_Strength'] = trade_log['Signal_Strength'].fillna('').astype(str)
-        except Exception as e:
-            print(f"【エラー】CSV読み込みエラー: {e}")
-            trade_log = pd.DataFrame(columns=cols)
-    else:
-        trade_log = pd.DataFrame(columns=cols)
-
-    notifications = []
-    symbol_status = []
 
-    for symbol in SYMBOLS:
-        df = get_stock_data(symbol, today_us)
-        if df is None or df.empty:
-            symbol_status.append(f"【{symbol}】\n⚠️ 市場休場またはデータ取得失敗")
-            continue
-
-        valid_df = df.dropna(subset=['Close']).copy()
-        if len(valid_df) < 200:
-            symbol_status.append(f"【{symbol}】\n⚠️ 指標計算に必要なデータ不足 (最低200日分必要)")
-            continue
-
-        # 指標とシグナルの計算
-        valid_df = add_indicators(valid_df)
-        valid_df['signal_strength'] = SIGNAL_CONFIG[symbol]['func'](valid_df)
-        min_str  = SIGNAL_CONFIG[symbol]['min_strength']
-        valid_df['buy_signal'] = (
-            valid_df['signal_strength'] == 'strong'
-            if min_str == 'strong'
-            else valid_df['signal_strength'] != ''
-        )
-
-        last_row      = valid_df.tail(1).squeeze()
-        last_date_str = valid_df.index[-1].strftime('%Y-%m-%d')
-        current_price = float(last_row['Close'])
-
-        # --- トレードロジック ---
-        
+def run_symbol(symbol, df, ledger, states=None, signal_config=None):
+    """1 銘柄分の判定と台帳更新。(通知行 または None, ステータス文字列) を返す。
+    states: 指標状態の置き場（dict）。None なら indicator_state/ のファイルを使う。
+    """
+    config = (signal_config or SIGNAL_CONFIG)[symbol]
+    if df is None or df.empty:
+        count('symbols.no_data')
+        return None, f"【{symbol}】\n⚠️ 市場休場またはデータ取得失敗"
+
+    valid_df = df.dropna(subset=['Close']) if df['Close'].isna().any() else df
+    if len(valid_df) < 200:
+        count('symbols.short_history')
+        return None, f"【{symbol}】\n⚠️ 指標計算に必要なデータ不足 (最低200日分必要)"
+    count('symbols.evaluated')
+
+    # 指標とシグナルの計算（保存済みの指標状態を新しいバーの分だけ進め、戦略が参照する直近の本数で判定）
+    with stage('indicators.state_load'):
+        state = load_state(symbol) if states is None else states.get(symbol)
+    with stage('indicators'):
+        state  = advance(state, valid_df)
+        latest = state.tail_arrays(valid_df, _tail_length(config['func']))
+    with stage('indicators.state_save'):
+        if states is None:
+            save_state(symbol, state)
+        else:
+            states[symbol] = state
+    with stage('signals'):
+        codes      = config['func'](latest)
+        strength   = str(strength_labels(codes)[-1])
+        buy_signal = bool(signal_mask(codes, config['min_strength'])[-1])
+
+    last_date_str = valid_df.index[-1].strftime('%Y-%m-%d')
+    open_price    = float(latest['Open'][-1])
+    current_price = float(latest['Close'][-1])
+    notification  = None
+
+    # --- トレードロジック ---
+    with stage('ledger'):
         # 1. 前日に発生したシグナルを今日の始値で「約定(holding)」に変更
-        mask_signal = (trade_log['Symbol'] == symbol) & (trade_log['Status'] == 'signal')
-        if mask_signal.any():
-            trade_log.loc[mask_signal, 'Buy_Price'] = float(last_row['Open'])
-            trade_log.loc[mask_signal, 'Status']    = 'holding'
-            print(f"【約定】{symbol} を始値 ${last_row['Open']:.2f} で保有ステータスに更新しました。")
-
-        # 2. 冷却期間チェック（直近7日以内に取引があれば新規シグナルを無視）
-        recent_cutoff = (valid_df.index[-1] - pd.Timedelta(days=7)).strftime('%Y-%m-%d')
-        recent_trades = trade_log[
-            (trade_log['Symbol'] == symbol) &
-            (trade_log['Date'] >= recent_cutoff)
-        ]
-        cooldown_active = not recent_trades.empty
+        if ledger.fill_signals(symbol, open_price):
+            count('ledger.fills')
+            print(f"【約定】{symbol} を始値 ${open_price:.2f} で保有ステータスに更新しました。")
+
+        # 2. 冷却期間チェック（直近 COOLDOWN_SESSIONS 営業日以内に取引があれば新規シグナルを無視。バックテストと共通）
+        recent_cutoff   = str(NYSE.offset(valid_df.index[-1], -COOLDOWN_SESSIONS))
+        cooldown_active = ledger.has_trades_since(symbol, recent_cutoff)
 
         # 3. 新規買いシグナルの判定
-        if bool(last_row['buy_signal']) and not cooldown_active:
-            # 重複登録防止（同日・同銘柄・未約定シグナルの二重登録を防ぐ）
-            exists = not trade_log[
-                (trade_log['Date'] == last_date_str) &
-                (trade_log['Symbol'] == symbol) &
-                (trade_log['Status'].isin(['signal', 'holding']))
-            ].empty
-            if not exists:
-                strength      = str(last_row['signal_strength'])
+        if buy_signal and not cooldown_active:
+            # 重複登録防止（同日・同銘柄の signal / holding は一意制約でも弾かれる）
+            if not ledger.has_active(last_date_str, symbol):
                 strength_icon = '🔴' if strength == 'strong' else '🟡'
-                new_row = {
-                    'Date': last_date_str, 'Symbol': symbol,
-                    'Status': 'signal', 'Buy_Price': 0.0,
-                    'Shares': 1, 'Signal_Strength': strength,
-                }
-                trade_log = pd.concat([trade_log, pd.DataFrame([new_row])], ignore_index=True)
-                notifications.append(f"🚨 **買いシグナル発生**: {symbol} {strength_icon} **{strength}**")
-                print(f"【シグナル】{symbol} 強度: {strength_icon} {strength}")
+                if ledger.add_signal(last_date_str, symbol, strength):
+                    count('ledger.signals')
+                    notification = f"🚨 **買いシグナル発生**: {symbol} {strength_icon} **{strength}**"
+                    print(f"【シグナル】{symbol} 強度: {strength_icon} {strength}")
 
         # 4. 現在の保有状況の集計
-        holdings    = trade_log[(trade_log['Symbol'] == symbol) & (trade_log['Status'] == 'holding')]
-        num_shares  = int(holdings['Shares'].sum()) if not holdings.empty else 0
-        current_val = current_price * num_shares
-        cost_basis  = (holdings['Buy_Price'] * holdings['Shares']).sum() if not holdings.empty else 0.0
-        profit_loss = current_val - cost_basis
-        profit_str  = f"${profit_loss:+.2f}"
-
-        symbol_status.append(
-            f"【{symbol}】\n現在の株価: ${current_price:.2f}\n保有数: {num_shares}株\n評価額: ${current_val:.2f} (合計損益: {profit_str})"
-        )
-
-    # 重複を削除して保存
-    trade_log = trade_log.drop_duplicates(subset=['Date', 'Symbol', 'Status'], keep='first')
-    trade_log.to_csv(CSV_FILE, index=False)
-
-    # --- 通知メッセージ作成 ---
-    msg = f"📅 **{today_jst} トレード報告**\n\n"
-    msg += "📢 **シグナル判定**\n"
-    msg += "\n".join(notifications) if notifications else "✅ 新規シグナルはありません"
-    msg += "\n\n📊 **現在のステータス**\n" + "\n\n".join(symbol_status)
-
-    # 週次レポート（土曜日のみ）
-    if today_jst.weekday() == 5:
-        monday = (today_jst - datetime.timedelta(days=5)).strftime('%Y-%m-%d')
-        weekly = trade_log[
-            (trade_log['Date'] >= monday) &
-            (trade_log['Status'] == 'holding')
-        ]
-        msg += "\n\n📜 **【週報】今週の新規約定一覧**\n"
-        if not weekly.empty:
-            def _icon(s):
-                return '🔴' if s == 'strong' else ('🟡' if s == 'medium' else '')
-            msg += "\n".join([
-                f"・{r['Date']} : {r['Symbol']} 取得単価 ${float(r['Buy_Price']):.2f} {_icon(r.get('Signal_Strength', ''))}"
-                for _, r in weekly.iterrows()
-            ])
-        else:
-            msg += "今週の新規約定はありませんでした。"
+        num_shares, cost_basis = ledger.holdings(symbol)
+    return notification, status_line(symbol, current_price, num_shares, cost_basis)
 
-    # 市場休場日の補足
-    if today_jst.weekday() == 6 or today_jst in holidays.Japan():
-        msg += "\n\n📌 ※本日は日本の休日のため、前営業日時点のデータに基づいています。"
 
-    # --- Discord送信 ---
-    if DISCORD_WEBHOOK_URL:
-        try:
-            webhook = SyncWebhook.from_url(DISCORD_WEBHOOK_URL)
-            chunk_size = 1900
-            for i in range(0, len(msg), chunk_size):
-                webhook.send(msg[i:i+chunk_size])
-            print("【完了】Discord通知を送信しました。")
-        except Exception as e:
-            print(f"【エラー】Discord送信に失敗しました: {e}")
+def run_day(stock_data, ledger, symbols=None, states=None, signal_config=None):
+    """取得済みの {symbol: DataFrame} で全銘柄を判定する。(通知行リスト, ステータスリスト) を返す。"""
+    notifications = []
+    symbol_status = []
+    # 1 回の実行分の台帳更新をまとめてコミット（途中で落ちた場合はロールバック）
+    with ledger.transaction():
+        for symbol in symbols or SYMBOLS:
+            notification, status = run_symbol(symbol, stock_data[symbol], ledger, states, signal_config)
+            if notification:
+                notifications.append(notification)
+            symbol_status.append(status)
+    return notifications, symbol_status
+
+
+def run_once(now_jst, stock_data, ledger, notifier=None, symbols=None, states=None, signal_config=None):
+    """取得済みデータで 1 回分の判定・台帳更新・通知を行い、通知本文を返す（main / replay 共通）。"""
+    notifications, symbol_status = run_day(stock_data, ledger, symbols, states, signal_config)
+    msg = build_message(now_jst.date(), notifications, symbol_status, ledger)
+    deliver(msg, notifier)
+    return msg
 
-    print("\n--- 送信内容 ---")
-    print(msg)
-    print("\n--- 処理終了 ---")
+
+# =============================
+# メイン処理
+# =============================
+
+def trading_day(now_jst, ledger, provider=None, notifier=None):
+    """営業日の 1 回分: 株価取得 -> 判定・台帳更新 -> 通知。通知本文を返す。"""
+    with stage('fetch'):
+        stock_data = get_stock_data_batch(SYMBOLS, now_jst.astimezone(US_EAST).date(), provider)
+    return run_once(now_jst, stock_data, ledger, notifier)
+
+
+def main(provider=None, report_path=run_metrics.RUN_REPORT_FILE, clock=None, notifier=None):
+    """clock: 現在時刻（タイムゾーン付き）を返す関数。省略時は datetime.now(JST)。
+    休場日は daily_report の軽量パス（キャッシュの終値で保有評価のみ）になる。
+    """
+    return run_daily(
+        lambda now_jst, ledger: trading_day(now_jst, ledger, provider, notifier),
+        clock=clock, notifier=notifier, symbols=SYMBOLS, store=HISTORY_STORE, report_path=report_path,
+    )
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    with run_metrics.profile(args.profile, 'main'):
+        main(report_path=args.report)
@@ -0,0 +1,253 @@
+"""Discord 通知（非同期送信・レート制限対応・送信待ちキュー）
+
+  - 通知本文を空行区切りのブロック（銘柄ごとのステータス等）単位で 2000 文字以内のメッセージに詰める
+    （行や絵文字の途中では分割しない。1 行が上限を超える場合のみ文字単位で分割）
+  - aiohttp で複数メッセージを並行送信する（同時接続数は SEND_CONCURRENCY まで）
+  - 429 は retry_after / Retry-After だけ待って再送。X-RateLimit-Remaining が 0 になったら
+    X-RateLimit-Reset-After まで後続の送信を止める（Webhook 単位のバケット）
+  - 送れなかったメッセージは discord_outbox.jsonl に残し、次回実行の最初に再送する
+
+  python notifier.py flush     : 送信待ちキューを再送する（DISCORD_WEBHOOK_URL が必要）
+  python notifier.py selftest  : ローカルの HTTP サーバーを Webhook の代役にして送信処理を確認する
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import datetime
+
+from run_metrics import count
+
+DISCORD_WEBHOOK_URL = os.getenv('DISCORD_WEBHOOK_URL')
+OUTBOX_FILE       = os.getenv('DISCORD_OUTBOX', 'discord_outbox.jsonl')
+MESSAGE_LIMIT     = 1900  # Discord の content 上限は 2000 文字。ページ番号の分を残す
+SEND_CONCURRENCY  = 4
+MAX_ATTEMPTS      = 5
+REQUEST_TIMEOUT   = 15    # 1 リクエストあたりの秒数
+MAX_RETRY_AFTER   = 60.0  # これより長い待機を要求されたら今回は諦めて送信待ちキューへ
+
+
+# =============================
+# メッセージ分割
+# =============================
+
+def _split_long(line, limit):
+    return [line[i:i + limit] for i in range(0, len(line), limit)]
+
+
+def pack_messages(text, limit=MESSAGE_LIMIT):
+    """text を空行区切りのブロック単位で limit 文字以内のメッセージに詰める。
+    ブロックが limit を超える場合は行単位、行が超える場合のみ文字単位で分割する。
+    """
+    pieces = []
+    for block in text.split("\n\n"):
+        if len(block) <= limit:
+            pieces.append((block, "\n\n"))
+            continue
+        for line in block.split("\n"):
+            for part in _split_long(line, limit) if len(line) > limit else [line]:
+                pieces.append((part, "\n"))
+        pieces[-1] = (pieces[-1][0], "\n\n")
+
+    messages, buf, sep = [], '', ''
+    for piece, next_sep in pieces:
+        if buf and len(buf) + len(sep) + len(piece) > limit:
+            messages.append(buf)
+            buf = piece
+        else:
+            buf = buf + sep + piece if buf else piece
+        sep = next_sep
+    if buf.strip():
+        messages.append(buf)
+    if len(messages) > 1:
+        # 並行送信では到着順が前後するためページ番号を付ける
+        messages = [f"{m}\n({i}/{len(messages)})" for i, m in enumerate(messages, 1)]
+    return messages
+
+
+# =============================
+# 送信待ちキュー
+# =============================
+
+def load_outbox(path=OUTBOX_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_outbox(entries, path=OUTBOX_FILE):
+    """entries が空ならファイルを削除する。"""
+    if not entries:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+
+
+# =============================
+# 非同期送信
+# =============================
+
+class _RateLimit:
+    """Webhook 単位のレート制限バケット。残数 0 の間は全送信をリセットまで待たせる。"""
+
+    def __init__(self):
+        self.resume_at = 0.0
+
+    async def wait(self):
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def update(self, headers):
+        if headers.get('X-RateLimit-Remaining') == '0':
+            reset_after = float(headers.get('X-RateLimit-Reset-After', 1.0))
+            self.resume_at = max(self.resume_at, time.monotonic() + reset_after)
+
+    def block(self, seconds):
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+
+class DiscordNotifier:
+    """Discord Webhook への非同期送信。send() は送信待ちキューの再送も含めて同期的に完了を待つ。"""
+
+    def __init__(self, url=DISCORD_WEBHOOK_URL, outbox_path=OUTBOX_FILE,
+                 concurrency=SEND_CONCURRENCY, max_attempts=MAX_ATTEMPTS):
+        self.url          = url
+        self.outbox_path  = outbox_path
+        self.concurrency  = concurrency
+        self.max_attempts = max_attempts
+
+    async def _post(self, session, content, bucket, sem):
+        """1 メッセージを送信する。成功で True、再送しても無駄な 4xx は None、それ以外の失敗は False。"""
+        import aiohttp
+        async with sem:
+            for attempt in range(self.max_attempts):
+                await bucket.wait()
+                try:
+                    async with session.post(self.url, json={'content': content}) as resp:
+                        bucket.update(resp.headers)
+                        if resp.status < 300:
+                            count('discord.messages')
+                            return True
+                        if resp.status == 429:
+                            count('discord.rate_limited')
+                            try:
+                                retry_after = float((await resp.json(content_type=None)).get('retry_after'))
+                            except (ValueError, TypeError, AttributeError, aiohttp.ContentTypeError):
+                                retry_after = float(resp.headers.get('Retry-After', 1.0))
+                            if retry_after > MAX_RETRY_AFTER:
+                                print(f"【警告】Discord のレート制限が長すぎるため送信待ちに回します ({retry_after:.0f}秒)")
+                                return False
+                            bucket.block(retry_after)
+                            continue
+                        if resp.status < 500:
+                            print(f"【エラー】Discord送信に失敗しました: HTTP {resp.status} {await resp.text()}")
+                            return None
+                        error = f"HTTP {resp.status}"
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = str(e) or type(e).__name__
+                count('discord.retries')
+                print(f"【エラー】Discord送信失敗 (試行 {attempt+1}/{self.max_attempts}): {error}")
+                await asyncio.sleep(min(2 ** attempt, 10))
+            return False
+
+    async def send_async(self, messages):
+        """送信待ちキュー + messages を送り、送れなかったものをキューに戻す。(送信数, 未送信数) を返す。"""
+        import aiohttp
+        now     = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+        entries = load_outbox(self.outbox_path) + [{'created': now, 'content': m} for m in messages]
+        if not entries:
+            return 0, 0
+        bucket  = _RateLimit()
+        sem     = asyncio.Semaphore(self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            results = await asyncio.gather(*(self._post(session, e['content'], bucket, sem) for e in entries))
+        # 4xx（本文不正など）は再送しても通らないため破棄する
+        pending = [e for e, ok in zip(entries, results) if ok is False]
+        save_outbox(pending, self.outbox_path)
+        count('discord.outbox', len(pending))
+        return sum(ok is True for ok in results), len(pending)
+
+    def send(self, messages):
+        return asyncio.run(self.send_async(messages))
+
+
+# =============================
+# ローカル HTTP サーバーでの動作確認
+# =============================
+
+async def _selftest():
+    """Webhook の代役サーバーで、分割・並行送信・429 待機・送信待ちキューを確認する。"""
+    import tempfile
+    from aiohttp import web
+
+    received = []
+    state = {'calls': 0, 'down': False}
+
+    async def handler(request):
+        state['calls'] += 1
+        if state['down']:
+            return web.Response(status=503)
+        if state['calls'] % 3 == 0:
+            return web.json_response({'retry_after': 0.2, 'message': 'You are being rate limited.'}, status=429)
+        body = await request.json()
+        if len(body['content']) > 2000:
+            return web.Response(status=400, text='content too long')
+        received.append(body['content'])
+        return web.Response(status=204, headers={'X-RateLimit-Remaining': '1', 'X-RateLimit-Reset-After': '0.05'})
+
+    app = web.Application()
+    app.router.add_post('/webhook', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        outbox   = os.path.join(tmp, 'outbox.jsonl')
+        notifier = DiscordNotifier(f"http://127.0.0.1:{port}/webhook", outbox_path=outbox, max_attempts=2)
+        text = "📅 **テスト**\n\n" + "\n\n".join(f"【SYM{i:03d}】\n現在の株価: $1.00\n保有数: 0株 🔴" for i in range(200))
+        messages = pack_messages(text)
+        ok &= all(len(m) <= 2000 for m in messages)
+        ok &= all(not m.startswith("\n") for m in messages)
+
+        # 1. 通常送信（3 回に 1 回 429 を返す）
+        sent, pending = await notifier.send_async(messages)
+        ok &= sent == len(messages) and pending == 0 and sorted(received) == sorted(messages)
+        print(f"  送信 {sent}/{len(messages)} 件, 未送信 {pending} 件 {'OK' if ok else 'NG'}")
+
+        # 2. 障害時は送信待ちキューに残り、次回に再送される
+        state['down'] = True
+        received.clear()
+        _, pending = await notifier.send_async(["障害中のメッセージ"])
+        queued = len(load_outbox(outbox))
+        state['down'] = False
+        sent, pending2 = await notifier.send_async([])
+        step = pending == 1 and queued == 1 and sent == 1 and pending2 == 0 and not os.path.exists(outbox)
+        print(f"  送信待ちキュー {queued} 件 -> 再送 {sent} 件 {'OK' if step else 'NG'}")
+        ok &= step
+    await runner.cleanup()
+    return ok
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ('flush', 'selftest'):
+        print("使い方: python notifier.py flush | selftest")
+        sys.exit(1)
+    if sys.argv[1] == 'selftest':
+        sys.exit(0 if asyncio.run(_selftest()) else 1)
+    if not DISCORD_WEBHOOK_URL:
+        print("【エラー】DISCORD_WEBHOOK_URL が設定されていません。")
+        sys.exit(1)
+    sent, pending = DiscordNotifier().send([])
+    print(f"【完了】送信待ちキューを再送しました: 送信 {sent}件 / 未送信 {pending}件")
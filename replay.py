@@ -0,0 +1,170 @@
+"""ライブ判定のリプレイ（過去のバーを 1 日ずつ main.py の判定処理に流す）
+
+main.py の日次処理（シグナル -> 翌営業日の始値で約定、冷却期間、重複登録防止、保有評価）を
+そのまま使い、過去の期間を 1 暦日ずつ再生する。バックテストの別実装ではなく本番と同じコードを通す。
+  - 現在時刻は各日の 18:00 JST（ワークフローの実行時刻）を main.run_once に渡す
+  - その日に見えるバーは米国日付より前のもの（前営業日の終値まで）
+  - NYSE の休場日は本番の休場日パス（daily_report.run_closed: 前営業日の終値で保有評価のみ）を通す
+  - 取引台帳はメモリ上の SQLite、通知は送信しない（NullNotifier）
+  - 指標状態はメモリ上に持ち越し、毎日 1 本分だけ進める（全期間の再計算はしない）
+本番の trade_ledger.db / indicator_state/ には書き込まない。
+
+  python replay.py [--symbols JMIA NU] [--start 2025-05-01] [--end 2026-05-01] [--strategy reversal]
+                   [--source store|provider] [--export replay_trades.csv] [--verbose]
+"""
+import os
+import sys
+import argparse
+import datetime
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+
+import main
+import run_metrics
+from daily_report import JST, NYSE, SYMBOLS, run_closed
+from run_metrics import count, stage
+from data_provider import get_provider
+from history_store import load_history
+from ledger import TradeLedger
+from strategies import load_strategy, strategy_names
+
+if sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+RUN_TIME      = datetime.time(18, 0)  # ワークフローの実行時刻（JST）
+REPLAY_DAYS   = 365                    # --start 省略時に遡る暦日数
+REPLAY_PERIOD = '2y'                   # キャッシュが無い銘柄を取得する期間
+
+
+class NullNotifier:
+    """送信しない通知先。送ったことにした件数と最後の本文だけを記録する。"""
+
+    def __init__(self):
+        self.sent = 0
+        self.last = []
+
+    def send(self, messages):
+        self.sent += len(messages)
+        self.last  = list(messages)
+        return len(messages), 0
+
+
+def load_frames(symbols, source='store', period=REPLAY_PERIOD, provider=None):
+    """{symbol: DataFrame}。store なら history/ のキャッシュ（無い銘柄のみ取得）、provider なら全銘柄を取得する。
+    取得した分はキャッシュに保存しない。
+    """
+    frames = {s: load_history(s, main.HISTORY_STORE) for s in symbols} if source == 'store' else {}
+    missing = [s for s in symbols if s not in frames or frames[s].empty]
+    if missing:
+        try:
+            frames.update((provider or get_provider()).download(missing, period=period))
+        except Exception as e:
+            print(f"【エラー】データ取得に失敗しました ({len(missing)}銘柄): {e}")
+    for symbol in symbols:
+        if symbol not in frames or frames[symbol].empty:
+            print(f"【エラー】{symbol} のデータがありません。")
+    return {s: frames[s] for s in symbols if s in frames and not frames[s].empty}
+
+
+def replay(frames, start, end, signal_config=None, ledger=None, notifier=None, verbose=False):
+    """start〜end（米国日付・両端を含む）の毎日について main.run_once を実行し、台帳を返す。"""
+    frames   = {s: df.dropna(subset=['Close']) for s, df in frames.items()}
+    symbols  = list(frames)
+    ledger   = ledger or TradeLedger(':memory:')
+    notifier = notifier or NullNotifier()
+    states   = {}
+    days     = pd.date_range(start, end, freq='D')
+    # 各日の実行時点で見えるバーの本数（その日より前の日付のバー）
+    visible = {s: np.searchsorted(df.index.values, days.values, side='left') for s, df in frames.items()}
+    closes  = {s: df['Close'].to_numpy(dtype=np.float64) for s, df in frames.items()}
+
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, redirect_stdout(sys.stdout if verbose else devnull):
+        for k, day in enumerate(days):
+            now_jst = JST.localize(datetime.datetime.combine(day.date(), RUN_TIME))
+            if NYSE.is_session(day):
+                stock_data = {s: frames[s].iloc[:visible[s][k]] for s in symbols}
+                main.run_once(now_jst, stock_data, ledger, notifier, symbols, states, signal_config)
+            else:
+                # 休場日は本番と同じく取得・判定なしで、前営業日の終値で保有を評価する
+                count('replay.market_closed')
+                last = {s: float(closes[s][visible[s][k] - 1]) for s in symbols if visible[s][k]}
+                run_closed(now_jst, ledger, last, notifier, symbols)
+            count('replay.days')
+    return ledger
+
+
+def summarize(ledger, frames, end):
+    """銘柄ごとのシグナル数・約定数・保有と、最終日の実行時点の終値での評価額。"""
+    rows = []
+    for symbol, df in frames.items():
+        trades  = ledger.trades(symbol)
+        shares, cost = ledger.holdings(symbol)
+        closes  = df['Close'].dropna()
+        closes  = closes[closes.index < pd.Timestamp(end)]
+        price   = float(closes.iloc[-1]) if len(closes) else float('nan')
+        rows.append({
+            'Symbol':  symbol,
+            'Signals': len(trades),
+            'Fills':   sum(t['status'] == 'holding' for t in trades),
+            'Pending': sum(t['status'] == 'signal' for t in trades),
+            'Shares':  shares,
+            'Cost':    round(cost, 2),
+            'Value':   round(price * shares, 2),
+            'PnL':     round(price * shares - cost, 2),
+        })
+    return pd.DataFrame(rows).set_index('Symbol')
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='ライブ判定のリプレイ')
+    parser.add_argument('--symbols', nargs='+', default=SYMBOLS, help='対象銘柄（既定: 日次チェックの SYMBOLS）')
+    parser.add_argument('--start', help=f"開始日（既定: 終了日の {REPLAY_DAYS} 日前）")
+    parser.add_argument('--end', help='終了日（既定: データの最終日）')
+    parser.add_argument('--strategy', help=f"全銘柄に当てはめる戦略（{' / '.join(strategy_names())}。既定: strategies.json の銘柄設定）")
+    parser.add_argument('--source', choices=['store', 'provider'], default='store',
+                        help='store=history/ のキャッシュ（無い銘柄のみ取得） / provider=全銘柄を取得')
+    parser.add_argument('--export', help='リプレイ後の取引台帳を書き出す CSV')
+    parser.add_argument('--verbose', action='store_true', help='日ごとの判定ログを表示する')
+    parser.add_argument('--report', help='実行レポート（JSON Lines）の追記先')
+    return parser.parse_args(argv)
+
+
+def _main(args):
+    metrics = run_metrics.start_run('replay')
+
+    if args.strategy:
+        spec   = load_strategy(args.strategy)
+        config = {s: {'func': spec, 'min_strength': spec.min_strength} for s in args.symbols}
+    else:
+        unknown = [s for s in args.symbols if s not in main.SIGNAL_CONFIG]
+        if unknown:
+            print(f"【エラー】strategies.json に設定の無い銘柄です（--strategy で戦略を指定）: {', '.join(unknown)}")
+            sys.exit(1)
+        config = main.SIGNAL_CONFIG
+
+    with stage('load'):
+        frames = load_frames(args.symbols, args.source)
+    if not frames:
+        sys.exit(1)
+    end   = pd.Timestamp(args.end) if args.end else max(df.index[-1] for df in frames.values()) + pd.Timedelta(days=1)
+    start = pd.Timestamp(args.start) if args.start else end - pd.Timedelta(days=REPLAY_DAYS)
+    metrics.set_info(symbols=len(frames), start=str(start.date()), end=str(end.date()))
+    print(f"--- リプレイ開始 ({len(frames)}銘柄 / {start.date()} 〜 {end.date()}) ---")
+
+    with stage('replay'):
+        ledger = replay(frames, start, end, config, verbose=args.verbose)
+    print(summarize(ledger, frames, end).to_string())
+    if args.export:
+        n = ledger.export_csv(args.export)
+        print(f"【出力】{args.export}: {n}件")
+    ledger.close()
+
+    print("\n" + metrics.summary())
+    if args.report:
+        metrics.save(args.report)
+
+
+if __name__ == "__main__":
+    _main(_parse_args())
@@ -0,0 +1,159 @@
+"""実行計測（ステージ別の所要時間・カウンター・プロファイラ）
+
+main.py / backtest.py の各ステージを stage() で囲み、件数を count() で数える。
+計測結果は 1 実行 = 1 行の JSON として run_reports.jsonl に追記する（日次ジョブでコミットし推移を追う）。
+
+  with stage('fetch.batch'):     ... # 所要時間（秒）と呼び出し回数を加算
+  count('fetch.cache_hit', n)        # カウンター
+  add_time('fetch.retry_sleep', s)   # 計測済みの時間を加算（スレッドからも可）
+
+プロファイラ（profile() / main.py・backtest.py の --profile）:
+  cprofile : 標準の cProfile。profiles/{名前}_{時刻}.prof に保存し、累積時間の上位を表示
+  sample   : サンプリングプロファイラ（pyinstrument が必要）。profiles/{名前}_{時刻}.html に保存
+"""
+import os
+import json
+import time
+import threading
+import datetime
+from contextlib import contextmanager
+
+RUN_REPORT_FILE = os.getenv('RUN_REPORT_FILE', 'run_reports.jsonl')
+PROFILE_DIR     = 'profiles'
+PROFILE_MODES   = ('cprofile', 'sample')
+
+
+class RunMetrics:
+    """1 回の実行分のステージ時間・カウンター・付帯情報。"""
+
+    def __init__(self, name=''):
+        self.name     = name
+        self.started  = datetime.datetime.now(datetime.timezone.utc)
+        self.stages   = {}  # ステージ名 -> {'sec': 合計秒, 'calls': 回数}
+        self.counters = {}
+        self.info     = {}
+        self._t0      = time.perf_counter()
+        self._lock    = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def add_time(self, name, seconds, calls=1):
+        with self._lock:
+            entry = self.stages.setdefault(name, {'sec': 0.0, 'calls': 0})
+            entry['sec']   += seconds
+            entry['calls'] += calls
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_info(self, **info):
+        self.info.update(info)
+
+    def report(self):
+        return {
+            'run':       self.name,
+            'started':   self.started.isoformat(timespec='seconds'),
+            'total_sec': round(time.perf_counter() - self._t0, 6),
+            'stages':    {k: {'sec': round(v['sec'], 6), 'calls': v['calls']} for k, v in self.stages.items()},
+            'counters':  dict(self.counters),
+            'info':      dict(self.info),
+        }
+
+    def summary(self):
+        """所要時間の大きい順にステージを並べた表示用の文字列。"""
+        rep   = self.report()
+        total = rep['total_sec'] or 1.0
+        lines = [f"【計測】{self.name} 合計 {rep['total_sec']:.3f}秒"]
+        for name, v in sorted(rep['stages'].items(), key=lambda kv: -kv[1]['sec']):
+            lines.append(f"  {name:<24} {v['sec']:9.3f}秒 {v['sec'] / total:6.1%} ({v['calls']}回)")
+        if rep['counters']:
+            lines.append("  " + " / ".join(f"{k}={v}" for k, v in sorted(rep['counters'].items())))
+        return "\n".join(lines)
+
+    def save(self, path=RUN_REPORT_FILE):
+        """レポートを JSON Lines で追記する。"""
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.report(), ensure_ascii=False) + "\n")
+        return path
+
+
+# 記録先（start_run で差し替える）。計測対象のコードはモジュール関数経由で記録する
+_current = RunMetrics()
+
+
+def start_run(name):
+    global _current
+    _current = RunMetrics(name)
+    return _current
+
+
+def current():
+    return _current
+
+
+def stage(name):
+    return _current.stage(name)
+
+
+def add_time(name, seconds, calls=1):
+    _current.add_time(name, seconds, calls)
+
+
+def count(name, n=1):
+    _current.count(name, n)
+
+
+def set_info(**info):
+    _current.set_info(**info)
+
+
+# =============================
+# プロファイラ
+# =============================
+
+@contextmanager
+def profile(mode, name='run', out_dir=PROFILE_DIR):
+    """mode が None なら何もしない。'cprofile' / 'sample' でブロック全体をプロファイルする。"""
+    if not mode:
+        yield
+        return
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"未対応のプロファイラです: {mode}（{' / '.join(PROFILE_MODES)}）")
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, f"{name}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}")
+
+    if mode == 'cprofile':
+        import cProfile
+        import pstats
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            prof.dump_stats(base + '.prof')
+            print(f"\n【プロファイル】{base}.prof（累積時間の上位 20 件）")
+            pstats.Stats(prof).sort_stats('cumulative').print_stats(20)
+        return
+
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        raise RuntimeError("サンプリングプロファイラには pyinstrument が必要です（pip install pyinstrument）")
+    prof = Profiler()
+    prof.start()
+    try:
+        yield
+    finally:
+        prof.stop()
+        with open(base + '.html', 'w', encoding='utf-8') as f:
+            f.write(prof.output_html())
+        print(f"\n【プロファイル】{base}.html")
+        print(prof.output_text())
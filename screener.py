@@ -0,0 +1,237 @@
+"""ユニバース・スクリーナー（多数の銘柄から当日のシグナルを抽出）
+
+銘柄リストのファイルを読み、指定した戦略（strategies.json の strategies のキー）を全銘柄に当てはめて
+最終バーが strong / medium の銘柄を強度順に並べる。
+  - 指標は直近 SCREEN_WINDOW 本だけで計算する（MA200 + EWM 系の収束分）
+  - 銘柄は CHUNK_SIZE 件ずつ取得 -> プロセスプールで判定し、同時に保持するのは数チャンク分のみ
+  - --source store なら history/ のキャッシュ（メモリマップ）の末尾だけを各ワーカーが直接読む
+
+  python screener.py [--universe universe.txt] [--strategy reversal] [--min-strength any]
+                     [--source provider|store] [--window 300] [--chunk-size 200] [--workers N] [--top 50]
+
+ユニバースファイルは 1 行 1 銘柄（# 以降はコメント）、または Symbol 列を持つ CSV。
+結果は screener_results/{日付}_{戦略}.csv に保存する。
+"""
+import os
+import sys
+import csv
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import pandas as pd
+
+import run_metrics
+from run_metrics import count, stage
+from data_provider import get_provider
+from history_store import NpyHistoryStore, OHLCV_COLUMNS
+from indicators import STRENGTH_LABELS, compute_indicators, signal_mask
+from strategies import STRATEGY_FILE, load_strategy, strategy_names
+from trading_calendar import load_calendar
+
+if sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+UNIVERSE_FILE  = 'universe.txt'
+SCREENER_DIR   = 'screener_results'
+SCREEN_WINDOW  = 300   # MA200 の 200 本 + RSI / MACD の EWM が収束するまでの 100 本
+MIN_WINDOW     = 201   # MA200 と前バーとのクロス判定に最低限必要な本数
+SCREEN_MARGIN  = 20    # provider から取得する本数の余裕（売買停止などで欠けるバーの分。営業日）
+CHUNK_SIZE     = 200
+HIT_COLUMNS    = ['Symbol', 'Date', 'Strength', 'Close', 'RSI', 'STOCHk', 'STOCHd', 'MACD', 'MACD_signal', 'MA200']
+
+
+def load_universe(path=UNIVERSE_FILE):
+    """ユニバースファイルの銘柄リスト（重複は除き、順序は保つ）。"""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    first = text.lstrip().split('\n', 1)[0]
+    if 'Symbol' in first.split(','):
+        symbols = [row['Symbol'] for row in csv.DictReader(text.lstrip().splitlines())]
+    else:
+        symbols = [line.split('#', 1)[0] for line in text.splitlines()]
+    symbols = [s.strip().upper() for s in symbols if s and s.strip()]
+    return list(dict.fromkeys(symbols))
+
+
+# =============================
+# ワーカー
+# =============================
+
+_SCREEN_WORKER = {}
+
+
+def _screen_init(strategy, path, params, min_strength, window, store_root):
+    _SCREEN_WORKER['strategy'] = load_strategy(strategy, path, params, min_strength)
+    _SCREEN_WORKER['window']   = window
+    _SCREEN_WORKER['store']    = NpyHistoryStore(store_root) if store_root else None
+
+
+def _tail_from_store(store, symbol, window):
+    arrays = store.load_arrays(symbol)
+    if not arrays:
+        return None
+    tail = {col: np.array(a[-window:]) for col, a in arrays.items()}
+    tail['Date'] = tail['Date'].view('datetime64[ns]')
+    return tail
+
+
+def screen_arrays(strategy, symbol, tail):
+    """末尾 window 本の OHLCV 配列で判定し、最終バーがシグナルならヒット行（dict）を返す。"""
+    valid = ~np.isnan(tail['Close'])
+    if valid.sum() < MIN_WINDOW or not valid[-1]:
+        return None
+    data  = {col: tail[col][valid] for col in OHLCV_COLUMNS if col in tail}
+    data.update(compute_indicators(data['High'], data['Low'], data['Close']))
+    codes = strategy(data)
+    if not signal_mask(codes[-1:], strategy.min_strength)[0]:
+        return None
+    hit = {
+        'Symbol':   symbol,
+        'Date':     str(tail['Date'][valid][-1])[:10],
+        'Strength': STRENGTH_LABELS[codes[-1]],
+        'code':     int(codes[-1]),
+    }
+    for col in HIT_COLUMNS[3:]:
+        hit[col] = round(float(data[col][-1]), 4)
+    return hit
+
+
+def _screen_chunk(items):
+    """items: [(symbol, tail 配列 dict または None)]。None なら履歴ストアから読む。
+    戻り値は (ヒット一覧, 判定できた銘柄数)。
+    """
+    strategy, window, store = _SCREEN_WORKER['strategy'], _SCREEN_WORKER['window'], _SCREEN_WORKER['store']
+    hits, screened = [], 0
+    for symbol, tail in items:
+        if tail is None:
+            tail = _tail_from_store(store, symbol, window)
+        if tail is None:
+            continue
+        hit = screen_arrays(strategy, symbol, tail)
+        screened += 1
+        if hit:
+            hits.append(hit)
+    return hits, screened
+
+
+# =============================
+# スクリーニング
+# =============================
+
+def _frame_tail(df, window):
+    df = df.dropna(subset=['Close']).iloc[-window:]
+    tail = {col: df[col].to_numpy(dtype=np.float64) for col in OHLCV_COLUMNS if col in df}
+    tail['Date'] = df.index.values.astype('datetime64[ns]')
+    return tail
+
+
+def fetch_start(window, today=None):
+    """直近 window 本（+ SCREEN_MARGIN 営業日）を確保できる取得開始日（NYSE の営業日で数える）。"""
+    nyse  = load_calendar('XNYS')
+    today = today or datetime.date.today()
+    return str(nyse.sessions[nyse.session_index(today) - window - SCREEN_MARGIN])
+
+
+def _chunks(symbols, source, chunk_size, window, provider):
+    """(チャンク, 取得失敗数) を順に返す。provider の場合はここで一括取得して末尾だけを渡す。"""
+    start = fetch_start(window) if source == 'provider' else None
+    for i in range(0, len(symbols), chunk_size):
+        chunk = symbols[i:i + chunk_size]
+        if source == 'store':
+            yield [(s, None) for s in chunk], 0
+            continue
+        with stage('fetch'):
+            try:
+                frames = provider.download(chunk, start=start)
+            except Exception as e:
+                print(f"【エラー】一括取得失敗 ({len(chunk)}銘柄): {e}")
+                frames = {}
+        count('fetch.batch_requests')
+        items = [(s, _frame_tail(frames[s], window)) for s in chunk if s in frames and not frames[s].empty]
+        yield items, len(chunk) - len(items)
+
+
+def run_screen(symbols, strategy='reversal', min_strength=None, params=None, source='provider',
+               window=SCREEN_WINDOW, chunk_size=CHUNK_SIZE, workers=None, provider=None,
+               strategy_path=STRATEGY_FILE, store_root=None):
+    """ユニバース全体を判定し、ヒットを強度（strong 優先）-> RSI の低い順に並べた DataFrame を返す。"""
+    if window < MIN_WINDOW:
+        raise ValueError(f"window は {MIN_WINDOW} 本以上にしてください（MA200 とクロス判定に必要）")
+    spec = load_strategy(strategy, strategy_path, params, min_strength)  # 定義エラーはここで検出
+    provider = provider or (get_provider() if source == 'provider' else None)
+    store_root = (store_root or NpyHistoryStore().root) if source == 'store' else None
+    workers  = workers or os.cpu_count()
+    max_inflight = workers * 2
+
+    hits, screened, failed = [], 0, 0
+    init_args = (strategy, strategy_path, params, spec.min_strength, window, store_root)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_screen_init, initargs=init_args) as pool:
+        pending = set()
+        for items, missing in _chunks(symbols, source, chunk_size, window, provider):
+            failed += missing
+            if items:
+                pending.add(pool.submit(_screen_chunk, items))
+            # 取得済みで未判定のチャンクを溜めすぎない（メモリを数チャンク分に抑える）
+            while len(pending) >= max_inflight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    h, n = f.result()
+                    hits.extend(h)
+                    screened += n
+        with stage('screen.wait'):
+            for f in pending:
+                h, n = f.result()
+                hits.extend(h)
+                screened += n
+
+    count('symbols.screened', screened)
+    count('symbols.failed', failed + (len(symbols) - screened - failed if source == 'store' else 0))
+    count('hits', len(hits))
+    results = pd.DataFrame(hits, columns=HIT_COLUMNS + ['code'])
+    if not results.empty:
+        results = results.sort_values(['code', 'RSI', 'Symbol'], ascending=[False, True, True], kind='stable')
+    results = results.drop(columns='code').reset_index(drop=True)
+    results.index += 1
+    print(f"【完了】{len(symbols)}銘柄中 {screened}銘柄を判定し、{len(results)}銘柄がヒットしました。")
+    return results
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='ユニバース・スクリーナー')
+    parser.add_argument('--universe', default=UNIVERSE_FILE, help='銘柄リストのファイル')
+    parser.add_argument('--symbols', nargs='+', help='ユニバースファイルの代わりに銘柄を直接指定')
+    parser.add_argument('--strategy', default='reversal', help=f"戦略名（{' / '.join(strategy_names())}）")
+    parser.add_argument('--min-strength', choices=['any', 'strong'], default=None, help='最低強度（既定: 戦略の既定）')
+    parser.add_argument('--source', choices=['provider', 'store'], default='provider',
+                        help='provider=データ提供元から一括取得 / store=history/ のキャッシュを使う')
+    parser.add_argument('--window', type=int, default=SCREEN_WINDOW, help='指標計算に使う直近の本数')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='1 回に取得・判定する銘柄数')
+    parser.add_argument('--workers', type=int, default=None, help='ワーカープロセス数（既定: CPU 数）')
+    parser.add_argument('--top', type=int, default=50, help='表示する上位件数')
+    parser.add_argument('--report', help='実行レポート（JSON Lines）の追記先')
+    return parser.parse_args(argv)
+
+
+def _main(args):
+    metrics = run_metrics.start_run('screener')
+    symbols = args.symbols or load_universe(args.universe)
+    print(f"--- スクリーニング開始 ({len(symbols)}銘柄 / 戦略: {args.strategy} / 直近 {args.window}本) ---")
+    results = run_screen(symbols, args.strategy, args.min_strength, source=args.source, window=args.window,
+                         chunk_size=args.chunk_size, workers=args.workers)
+
+    os.makedirs(SCREENER_DIR, exist_ok=True)
+    today = datetime.date.today().strftime('%Y-%m-%d')
+    path  = os.path.join(SCREENER_DIR, f"{today}_{args.strategy}.csv")
+    results.to_csv(path, index_label='Rank')
+    if not results.empty:
+        print(results.head(args.top).to_string())
+    print(f"【完了】結果を保存しました: {path}")
+    print(metrics.summary())
+    if args.report:
+        metrics.save(args.report)
+
+
+if __name__ == "__main__":
+    _main(_parse_args())
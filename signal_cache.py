@@ -0,0 +1,293 @@
+"""指標・シグナルのディスクキャッシュ（バックテストの再実行用）
+
+キーは OHLCV と日付の内容ハッシュ（データキー）。
+  ind/{データキー}.npy             : (8, 本数) の float64。指標列 7 行 + EWM の途中値（carry。最終行の先頭 4 個）
+  codes/{データキー}-{戦略}.npy     : 強度コード（戦略キーはパラメータ埋め込み済みのソースのハッシュ）
+  series/{銘柄}.json               : 銘柄ごとの最新エントリー（データキーと本数）
+内容が同じなら再計算しない。銘柄の最新エントリーが今回のデータの先頭部分と一致する場合は
+（日次でバーが追加されただけの場合）、追加分だけ指標を計算し（indicators.extend_indicators）、
+コードも戦略の lookback 分だけ遡って追加分を評価する。それ以外は全期間を計算し直す。
+
+合計サイズが SIGNAL_CACHE_MAX_MB を超えたら最終利用（mtime）の古いエントリーから削除する。
+CI ではこのディレクトリをジョブ間で保存・復元して使い回す（actions/cache）。
+
+  SIGNAL_CACHE=0 で無効 / SIGNAL_CACHE_DIR（既定 .signal_cache）/ SIGNAL_CACHE_MAX_MB（既定 512）
+
+  python signal_cache.py stats  : エントリー数・合計サイズを表示
+  python signal_cache.py clear  : 全て削除
+"""
+import os
+import sys
+import json
+import shutil
+import hashlib
+
+import numpy as np
+
+from history_store import OHLCV_COLUMNS
+from indicators import EXTEND_MIN_BARS, INDICATOR_COLUMNS, compute_indicators, extend_indicators
+from run_metrics import count
+
+if sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+SIGNAL_CACHE_DIR    = os.getenv('SIGNAL_CACHE_DIR', '.signal_cache')
+SIGNAL_CACHE_MAX_MB = float(os.getenv('SIGNAL_CACHE_MAX_MB', '512'))
+CACHE_VERSION = 1  # 指標の計算式・保存形式を変えたら上げる（古いエントリーは使われなくなる）
+CARRY_KEYS    = ('avg_gain', 'avg_loss', 'ema_fast', 'ema_slow')
+
+
+def data_key(dates, data, n=None):
+    """日付と OHLCV（data にある列のみ）の先頭 n 本の内容ハッシュ。"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"v{CACHE_VERSION}".encode())
+    h.update(np.ascontiguousarray(np.asarray(dates).astype('datetime64[ns]')[:n]).view(np.int64).tobytes())
+    for col in OHLCV_COLUMNS:
+        if col in data:
+            a = np.ascontiguousarray(np.asarray(data[col])[:n])
+            h.update(f"{col}:{a.dtype.str}".encode())
+            h.update(a.tobytes())
+    return h.hexdigest()
+
+
+def strategy_key(strategy, **overrides):
+    """パラメータを埋め込んだ戦略ソースのハッシュ。"""
+    return hashlib.blake2b(strategy.source(**overrides).encode(), digest_size=8).hexdigest()
+
+
+def _safe_name(name):
+    return ''.join(c if c.isalnum() or c in '-_.^=' else '_' for c in name)
+
+
+class SignalCache:
+    """ディスク上の指標・コードのキャッシュ（1 プロセスから使う前提）。"""
+
+    def __init__(self, root=SIGNAL_CACHE_DIR, max_mb=SIGNAL_CACHE_MAX_MB):
+        self.root      = root
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._files    = None  # パス -> [サイズ, mtime]（初回の書き込み時に走査）
+        self._total    = 0     # _files の合計サイズ
+        self._parents  = {}    # データキー -> (元にしたデータキー, その本数)。このプロセスで続きを計算したもの
+
+    def _path(self, kind, name, ext):
+        return os.path.join(self.root, kind, f"{name}{ext}")
+
+    # --- 読み書き ---
+
+    def _touch(self, path):
+        """LRU 用に最終利用時刻を更新する。"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        if self._files is not None and path in self._files:
+            self._files[path][1] = os.path.getmtime(path)
+
+    def _write(self, path, save):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            save(f)
+        os.replace(tmp, path)
+        if self._files is None:
+            self._scan()
+        stat = os.stat(path)
+        if path in self._files:
+            self._total -= self._files[path][0]
+        self._files[path] = [stat.st_size, stat.st_mtime]
+        self._total += stat.st_size
+        if self._total > self.max_bytes:
+            self._evict(keep=path)
+
+    def _scan(self):
+        self._files = {}
+        for kind in ('ind', 'codes'):
+            folder = os.path.join(self.root, kind)
+            if not os.path.isdir(folder):
+                continue
+            for entry in os.scandir(folder):
+                if entry.name.endswith('.tmp'):
+                    continue
+                stat = entry.stat()
+                self._files[entry.path] = [stat.st_size, stat.st_mtime]
+        self._total = sum(size for size, _ in self._files.values())
+
+    def _evict(self, keep=None):
+        """合計サイズが上限以下になるまで、最終利用の古い順に削除する。"""
+        for path, (size, _) in sorted(self._files.items(), key=lambda kv: kv[1][1]):
+            if self._total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            del self._files[path]
+            self._total -= size
+            count('signal_cache.evicted')
+
+    def _load_entry(self, key):
+        """(指標 dict, carry dict) または None。"""
+        path = self._path('ind', key, '.npy')
+        try:
+            block = np.load(path)
+        except (OSError, ValueError):
+            return None
+        if block.ndim != 2 or len(block) != len(INDICATOR_COLUMNS) + 1:
+            return None
+        self._touch(path)
+        carry = dict(zip(CARRY_KEYS, block[-1, :len(CARRY_KEYS)].tolist()))
+        return dict(zip(INDICATOR_COLUMNS, block)), carry
+
+    def _save_entry(self, key, ind, carry):
+        n     = len(ind['RSI'])
+        block = np.full((len(INDICATOR_COLUMNS) + 1, n), np.nan)
+        for k, col in enumerate(INDICATOR_COLUMNS):
+            block[k] = ind[col]
+        if n >= len(CARRY_KEYS):
+            block[-1, :len(CARRY_KEYS)] = [carry[k] for k in CARRY_KEYS]
+        self._write(self._path('ind', key, '.npy'), lambda f: np.save(f, block))
+
+    def _tip(self, name):
+        try:
+            with open(self._path('series', _safe_name(name), '.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _set_tip(self, name, key, n):
+        path = self._path('series', _safe_name(name), '.json')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'n': n}, f)
+        os.replace(path + '.tmp', path)
+
+    # --- 指標 ---
+
+    def indicators(self, data, dates, name=None):
+        """data（High/Low/Close を含む列 -> 配列）の指標。(データキー, 列名 -> float64 配列) を返す。
+        name（銘柄名）を渡すと、前回のエントリーに追加されたバーの分だけ計算する。
+        """
+        m   = len(dates)
+        key = data_key(dates, data)
+        if name:
+            name = f"{name}.{np.asarray(data['Close']).dtype.name}"  # float64（DataFrame）と float32（BarSet）は別系列
+        entry = self._load_entry(key)
+        if entry is not None:
+            count('signal_cache.hit')
+            return key, entry[0]
+
+        tip  = self._tip(name) if name else None
+        prev = None
+        if tip and EXTEND_MIN_BARS <= tip['n'] < m and data_key(dates, data, tip['n']) == tip['key']:
+            prev = self._load_entry(tip['key'])
+        if prev is not None and np.isfinite(list(prev[1].values())).all():
+            count('signal_cache.extend')
+            ind, carry = extend_indicators(prev[0], prev[1], data['High'], data['Low'], data['Close'])
+            self._parents[key] = (tip['key'], tip['n'])
+        else:
+            count('signal_cache.miss')
+            ind, carry = compute_indicators(data['High'], data['Low'], data['Close'], with_carry=True)
+        self._save_entry(key, ind, carry)
+        if name:
+            self._set_tip(name, key, m)
+        return key, ind
+
+    # --- 強度コード ---
+
+    def codes(self, strategy, data, key, **overrides):
+        """strategy(data, **overrides) のキャッシュ版。data は指標列を含むこと（DataFrame でも可）、
+        key は indicators() の戻り値。このプロセスで指標の続きを計算したデータで、元のデータのコードがあれば、
+        戦略の lookback 分だけ遡って追加分のバーだけ評価する。
+        """
+        skey = strategy_key(strategy, **overrides)
+        path = self._path('codes', f"{key}-{skey}", '.npy')
+        if os.path.exists(path):
+            try:
+                codes = np.load(path)
+                self._touch(path)
+                count('signal_cache.codes_hit')
+                return codes
+            except (OSError, ValueError):
+                pass
+
+        codes    = None
+        lookback = strategy.lookback(**overrides)
+        parent, parent_n = self._parents.get(key, (None, 0))
+        parent_path = self._path('codes', f"{parent}-{skey}", '.npy') if parent else None
+        if parent_path and lookback < parent_n and os.path.exists(parent_path):
+            try:
+                prev = np.load(parent_path)
+            except (OSError, ValueError):
+                prev = None
+            if prev is not None and len(prev) == parent_n:
+                count('signal_cache.codes_extend')
+                lo    = parent_n - lookback
+                tail  = strategy({col: np.asarray(data[col])[lo:] for col in data}, **overrides)
+                codes = np.concatenate((prev, tail[lookback:]))
+        if codes is None:
+            count('signal_cache.codes_miss')
+            codes = strategy(data, **overrides)
+        self._write(path, lambda f: np.save(f, codes))
+        return codes
+
+    # --- 管理 ---
+
+    def stats(self):
+        self._scan()
+        out = {'root': self.root, 'max_bytes': self.max_bytes, 'bytes': self._total}
+        for kind in ('ind', 'codes'):
+            out[kind] = sum(1 for p in self._files if os.path.basename(os.path.dirname(p)) == kind)
+        return out
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        self._files   = None
+        self._total   = 0
+        self._parents = {}
+
+
+def get_cache(root=None, max_mb=None):
+    """既定のキャッシュ。SIGNAL_CACHE=0 なら None（キャッシュしない）。"""
+    if os.getenv('SIGNAL_CACHE', '1') == '0':
+        return None
+    return SignalCache(root or SIGNAL_CACHE_DIR, SIGNAL_CACHE_MAX_MB if max_mb is None else max_mb)
+
+
+# =============================
+# DataFrame 用（backtest.py）
+# =============================
+
+def add_cached_indicators(df, name=None, cache=None):
+    """indicators.add_indicators のキャッシュ版。(指標付き DataFrame, データキー) を返す。
+    cache が None なら毎回計算する（データキーも None）。
+    """
+    if cache is None:
+        return df.assign(**compute_indicators(df['High'], df['Low'], df['Close'])), None
+    data = {col: df[col].to_numpy() for col in OHLCV_COLUMNS if col in df}
+    key, ind = cache.indicators(data, df.index.values, name)
+    return df.assign(**ind), key
+
+
+def cached_codes(strategy, df, key, cache=None, **overrides):
+    """strategy(df, **overrides) のキャッシュ版（cache / key が None、または Strategy 以外なら毎回評価）。"""
+    if cache is None or key is None or not hasattr(strategy, 'lookback'):
+        return strategy(df, **overrides)
+    return cache.codes(strategy, df, key, **overrides)
+
+
+if __name__ == "__main__":
+    cache = SignalCache()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    if command == 'clear':
+        cache.clear()
+        print(f"【完了】キャッシュを削除しました: {cache.root}")
+    elif command == 'stats':
+        s = cache.stats()
+        print(f"キャッシュ: {s['root']}")
+        print(f"  指標エントリー: {s['ind']}件 / コード: {s['codes']}件")
+        print(f"  合計サイズ    : {s['bytes'] / 1024 / 1024:.1f} MB / 上限 {s['max_bytes'] / 1024 / 1024:.0f} MB")
+    else:
+        print("使い方: python signal_cache.py stats | clear")
+        sys.exit(1)
@@ -0,0 +1,266 @@
+"""宣言的シグナル戦略レジストリ
+
+strategies.json に戦略（条件式）と銘柄への割り当てを定義する。
+  strategies: 戦略名 -> {params, base, strong, medium}
+  symbols   : 銘柄 -> {strategy, min_strength, params（戦略の既定値を上書き）}
+
+条件式は Python 式のサブセット:
+  列名     : Open / High / Low / Close / Volume / STOCHk / STOCHd / RSI / MA50 / MA200 / MACD / MACD_signal
+  パラメータ: params のキー（コンパイル時に定数として埋め込む）
+  演算     : and / or / not, 比較（40 <= RSI <= 55 の連鎖も可）, + - * /
+  関数     : cross_up(a, b), cross_down(a, b), shift(x, n), nonzero(x)（0 を 1 に置換）, abs(x)
+base は strong / medium の両方に AND される。優先順は strong > medium。
+
+各戦略は全条件を 1 つの関数にコンパイルし（共通部分式は 1 回だけ評価）、int8 の強度コードを返す。
+
+  python strategies.py [SYMBOL ...]  : コンパイル結果のソースを表示
+"""
+import os
+import ast
+import sys
+import json
+import math
+import numpy as np
+
+from indicators import INDICATOR_COLUMNS, STRENGTH_CODES, cross_up, shift
+
+# 既定はこのモジュールと同じ場所（カレントディレクトリによらず読める）。環境変数 STRATEGY_FILE で差し替え可
+STRATEGY_FILE = os.getenv('STRATEGY_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'strategies.json'))
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume'] + INDICATOR_COLUMNS
+RULE_KEYS = ('base', 'strong', 'medium')
+
+_BINOPS  = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/'}
+_CMPOPS  = {ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.Eq: '==', ast.NotEq: '!='}
+_FUNCS   = {'cross_up': 2, 'cross_down': 2, 'shift': 2, 'nonzero': 1, 'abs': 1}
+
+
+def _cross_down(a, b):
+    return cross_up(b, a)
+
+
+def _nonzero(x):
+    return np.where(x == 0, 1.0, x)
+
+
+_RUNTIME = {
+    'np': np, 'cross_up': cross_up, 'cross_down': _cross_down,
+    'shift': lambda x, n: shift(x, int(n)), 'nonzero': _nonzero, 'abs': np.abs,
+}
+
+
+class _Compiler:
+    """条件式の AST を NumPy の代入文の列に変換する（同じ部分式は同じ一時変数を再利用）。
+    一時変数ごとに、何本前のバーまで参照するか（lags）も記録する。
+    """
+
+    def __init__(self, name, params):
+        self.name    = name
+        self.params  = params
+        self.lines   = []
+        self.columns = []
+        self.memo    = {}
+        self.lags    = {}
+
+    def lag(self, *exprs):
+        """式（列名・定数・一時変数）が参照する過去のバー数の最大値。"""
+        return max([self.lags.get(e, 0) for e in exprs], default=0)
+
+    def error(self, msg):
+        raise ValueError(f"戦略 {self.name}: {msg}")
+
+    def temp(self, node, expr, lag=0):
+        key = ast.dump(node)
+        if key not in self.memo:
+            var = f"_t{len(self.memo)}"
+            self.lines.append(f"{var} = {expr}")
+            self.memo[key] = var
+            self.lags[var] = lag
+        return self.memo[key]
+
+    def emit(self, node):
+        if isinstance(node, ast.Expression):
+            return self.emit(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            return repr(float(node.value))
+        if isinstance(node, ast.Name):
+            if node.id in self.params:
+                return repr(float(self.params[node.id]))
+            if node.id in COLUMNS:
+                if node.id not in self.columns:
+                    self.columns.append(node.id)
+                return node.id
+            self.error(f"未定義の名前です: {node.id}")
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            operand = self.emit(node.operand)
+            return self.temp(node, f"-({operand})", self.lag(operand))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            operand = self.emit(node.operand)
+            return self.temp(node, f"~({operand})", self.lag(operand))
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINOPS:
+            left, right = self.emit(node.left), self.emit(node.right)
+            return self.temp(node, f"({left}) {_BINOPS[type(node.op)]} ({right})", self.lag(left, right))
+        if isinstance(node, ast.BoolOp):
+            op     = ' & ' if isinstance(node.op, ast.And) else ' | '
+            values = [self.emit(v) for v in node.values]
+            return self.temp(node, op.join(f"({v})" for v in values), self.lag(*values))
+        if isinstance(node, ast.Compare):
+            if any(type(op) not in _CMPOPS for op in node.ops):
+                self.error("未対応の比較演算子です")
+            terms = [self.emit(node.left)] + [self.emit(c) for c in node.comparators]
+            parts = [f"({terms[k]} {_CMPOPS[type(op)]} {terms[k + 1]})" for k, op in enumerate(node.ops)]
+            return self.temp(node, ' & '.join(parts), self.lag(*terms))
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCS:
+            if len(node.args) != _FUNCS[node.func.id] or node.keywords:
+                self.error(f"{node.func.id}() の引数が不正です")
+            args = [self.emit(a) for a in node.args]
+            lag  = self.lag(*args)
+            if node.func.id in ('cross_up', 'cross_down'):
+                lag += 1
+            elif node.func.id == 'shift':
+                # 定数でない・負（先のバーを参照）のずらし幅は範囲を決められないので無限大扱い
+                try:
+                    periods = int(float(args[1]))
+                except ValueError:
+                    periods = -1
+                lag = lag + periods if periods >= 0 else math.inf
+            return self.temp(node, f"{node.func.id}({', '.join(args)})", lag)
+        self.error(f"未対応の式です: {ast.unparse(node)}")
+
+
+def compile_rules(name, rules, params):
+    """rules（base/strong/medium の条件式）を params 埋め込みで 1 つの関数にコンパイルする。
+    戻り値は (関数, ソース文字列, lookback)。関数は data（列名でアクセスできるもの）-> int8 コード配列。
+    lookback は各バーのコードが参照する過去のバー数（shift / cross の分）。i 本目のコードは
+    data[i - lookback : i + 1] だけで決まる（範囲を決められない式があれば math.inf）。
+    """
+    comp  = _Compiler(name, params)
+    conds = {}
+    lags  = []
+    for key in RULE_KEYS:
+        expr = rules.get(key)
+        if expr:
+            try:
+                tree = ast.parse(expr, mode='eval')
+            except SyntaxError as e:
+                comp.error(f"{key} の構文エラー: {e.msg}")
+            conds[key] = comp.emit(tree)
+            lags.append(comp.lag(conds[key]))
+
+    body = list(comp.lines)
+    for key in ('strong', 'medium'):
+        if key not in conds:
+            conds[key] = 'False'
+        elif 'base' in conds:
+            body.append(f"_{key} = ({conds[key]}) & ({conds['base']})")
+            conds[key] = f"_{key}"
+
+    loads = [f"{col} = np.asarray(data['{col}'], dtype=np.float64)" for col in comp.columns]
+    src = "\n".join(
+        ["def _evaluate(data):"]
+        + [f"    {line}" for line in loads + body]
+        + [
+            "    codes = np.zeros(len(data['Close']), dtype=np.int8)",
+            f"    codes[np.broadcast_to({conds['medium']}, codes.shape)] = {STRENGTH_CODES['medium']}",
+            f"    codes[np.broadcast_to({conds['strong']}, codes.shape)] = {STRENGTH_CODES['strong']}",
+            "    return codes",
+        ]
+    )
+    namespace = dict(_RUNTIME)
+    exec(compile(src, f"<strategy {name}>", 'exec'), namespace)
+    return namespace['_evaluate'], src, max(lags, default=0)
+
+
+class Strategy:
+    """銘柄に割り当てた戦略。data -> int8 強度コード。
+    キーワード引数でパラメータを上書きでき（パラメータスイープ用）、組み合わせごとにコンパイル結果をキャッシュする。
+    """
+    CACHE_SIZE = 4096
+
+    def __init__(self, name, rules, params=None, min_strength='any', description=''):
+        self.name         = name
+        self.rules        = {k: rules[k] for k in RULE_KEYS if rules.get(k)}
+        self.params       = dict(params or {})
+        self.min_strength = min_strength
+        self.description  = description
+        self._compiled    = {}
+        self.compile()  # 定義エラーは読み込み時に検出する
+
+    def compile(self, **overrides):
+        unknown = set(overrides) - set(self.params)
+        if unknown:
+            raise ValueError(f"戦略 {self.name}: 未定義のパラメータです: {', '.join(sorted(unknown))}")
+        params = {**self.params, **overrides}
+        key = tuple(sorted(params.items()))
+        if key not in self._compiled:
+            if len(self._compiled) >= self.CACHE_SIZE:
+                self._compiled.clear()
+            self._compiled[key] = compile_rules(self.name, self.rules, params)
+        return self._compiled[key]
+
+    def source(self, **overrides):
+        return self.compile(**overrides)[1]
+
+    def lookback(self, **overrides):
+        """各バーのコードが参照する過去のバー数（compile_rules 参照）。"""
+        return self.compile(**overrides)[2]
+
+    def __call__(self, data, **overrides):
+        return self.compile(**overrides)[0](data)
+
+    def __repr__(self):
+        return f"Strategy({self.name!r}, min_strength={self.min_strength!r})"
+
+
+def _load_config(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _from_template(templates, strategy, name, params=None, min_strength=None):
+    if strategy not in templates:
+        raise ValueError(f"{name}: 未定義の戦略です: {strategy}")
+    template = templates[strategy]
+    return Strategy(
+        name=name,
+        rules=template,
+        params={**template.get('params', {}), **(params or {})},
+        min_strength=min_strength or template.get('min_strength', 'any'),
+        description=template.get('description', ''),
+    )
+
+
+def load_registry(path=STRATEGY_FILE):
+    """銘柄 -> Strategy の dict を返す。"""
+    config    = _load_config(path)
+    templates = config.get('strategies', {})
+    return {
+        symbol: _from_template(templates, entry['strategy'], f"{symbol}:{entry['strategy']}",
+                               entry.get('params'), entry.get('min_strength'))
+        for symbol, entry in config.get('symbols', {}).items()
+    }
+
+
+def load_strategy(strategy, path=STRATEGY_FILE, params=None, min_strength=None):
+    """戦略名（strategies のキー）から、銘柄に割り当てずに Strategy を作る（スクリーナー用）。"""
+    return _from_template(_load_config(path).get('strategies', {}), strategy, strategy, params, min_strength)
+
+
+def strategy_names(path=STRATEGY_FILE):
+    return list(_load_config(path).get('strategies', {}))
+
+
+def signal_config(path=STRATEGY_FILE):
+    """main.py / backtest.py の SIGNAL_CONFIG 形式（銘柄 -> {'func', 'min_strength'}）で返す。"""
+    return {
+        symbol: {'func': strategy, 'min_strength': strategy.min_strength}
+        for symbol, strategy in load_registry(path).items()
+    }
+
+
+if __name__ == "__main__":
+    registry = load_registry()
+    for symbol in sys.argv[1:] or list(registry):
+        strategy = registry[symbol]
+        print(f"# {strategy.name} ({strategy.description}) min_strength={strategy.min_strength} lookback={strategy.lookback()}")
+        print(strategy.source())
+        print()
@@ -0,0 +1,164 @@
+"""取引所カレンダー（営業日判定・営業日の前後・営業日数の計算）
+
+同梱の休場日テーブル（calendars/{名前}.csv）から営業日の配列を一度だけ作り、
+日付 -> 営業日番号の表を引くことで判定・前後の営業日・区間の営業日数を O(1) で返す。
+実行時はネットワークも holidays パッケージも使わない。
+
+  XNYS : ニューヨーク証券取引所（土日 + NYSE 休場日。臨時休場を含む）
+  JP   : 日本の祝日（土日 + 国民の祝日。通知文の「日本の休日」判定用）
+
+  python trading_calendar.py build [開始年 終了年]  : holidays パッケージから休場日テーブルを作り直す
+  python trading_calendar.py check                 : テーブルの範囲と直近の休場日を表示
+"""
+import os
+import sys
+import csv
+import datetime
+from functools import lru_cache
+
+import numpy as np
+
+CALENDAR_DIR   = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calendars')
+DEFAULT_MARKET = 'XNYS'
+TABLE_YEARS    = (1990, 2040)
+
+_DAY = np.timedelta64(1, 'D')
+
+
+def _to_day(value):
+    """date / datetime / Timestamp / 文字列 / datetime64 -> datetime64[D]（配列も可）。"""
+    if isinstance(value, np.ndarray):
+        return value.astype('datetime64[D]')
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if hasattr(value, 'to_datetime64'):
+        return value.to_datetime64().astype('datetime64[D]')
+    return np.datetime64(value, 'D')
+
+
+class TradingCalendar:
+    """営業日カレンダー。first〜last の範囲外の日付は ValueError。"""
+
+    def __init__(self, name, holidays, first, last, weekmask='1111100'):
+        self.name     = name
+        self.first    = _to_day(first)
+        self.last     = _to_day(last)
+        self.holidays = np.unique(_to_day(np.asarray(holidays, dtype='datetime64[D]')))
+        days = np.arange(self.first, self.last + _DAY, dtype='datetime64[D]')
+        # 日付（first からの日数）-> 営業日か / その日までの営業日数
+        self._is_session = np.is_busday(days, weekmask=weekmask, holidays=self.holidays)
+        self._count      = np.cumsum(self._is_session)
+        self.sessions    = days[self._is_session]
+
+    def _offset(self, date):
+        d = (_to_day(date) - self.first).astype(np.int64)
+        if np.any(d < 0) or np.any(d >= len(self._is_session)):
+            raise ValueError(f"{self.name}: カレンダーの範囲外です（{self.first} 〜 {self.last}）: {date}")
+        return d
+
+    # --- 判定・前後 ---
+
+    def is_session(self, date):
+        """営業日か（配列なら要素ごと）。"""
+        return self._is_session[self._offset(date)]
+
+    def is_holiday(self, date):
+        """平日の休場日か（土日は False）。"""
+        d = _to_day(date)
+        return np.is_busday(d) & ~self.is_session(d)
+
+    def in_table(self, date):
+        """休場日テーブルに載っている日か（曜日を問わない。土曜の祝日も True）。"""
+        d = _to_day(date)
+        return np.isin(d, self.holidays) if isinstance(d, np.ndarray) else bool(np.isin(d, self.holidays))
+
+    def session_index(self, date, side='left'):
+        """sessions 上の番号。営業日でない日は side='left' なら直前、'right' なら直後の営業日の番号。"""
+        d   = self._offset(date)
+        idx = self._count[d] - 1
+        if side == 'right':
+            idx = idx + ~self._is_session[d]
+        return idx
+
+    def next_session(self, date, inclusive=False):
+        idx = self.session_index(date, 'right') + (0 if inclusive else self.is_session(date))
+        return self.sessions[idx]
+
+    def previous_session(self, date, inclusive=False):
+        idx = self.session_index(date, 'left') - (0 if inclusive else self.is_session(date))
+        return self.sessions[idx]
+
+    def sessions_between(self, start, end):
+        """start〜end（両端を含む）の営業日数。"""
+        return self._count[self._offset(end)] - self._count[self._offset(start)] + self._is_session[self._offset(start)]
+
+    # --- 営業日オフセット（ベクトル化） ---
+
+    def offset(self, dates, n):
+        """dates（営業日）から n 営業日後の日付。dates / n は配列可。
+        dates が営業日でない場合は直後の営業日を 0 営業日目とする。
+        """
+        return self.sessions[self.session_index(dates, 'right') + np.asarray(n)]
+
+    def __repr__(self):
+        return f"TradingCalendar({self.name!r}, {self.first} 〜 {self.last}, 休場日 {len(self.holidays)}件)"
+
+
+def _table_path(name):
+    return os.path.join(CALENDAR_DIR, f"{name}.csv")
+
+
+@lru_cache(maxsize=None)
+def load_calendar(name=DEFAULT_MARKET):
+    """同梱の休場日テーブルからカレンダーを作る（プロセス内でキャッシュ）。"""
+    path = _table_path(name)
+    if not os.path.exists(path):
+        raise ValueError(f"休場日テーブルがありません: {path}")
+    with open(path, newline='', encoding='utf-8') as f:
+        # 1 行目はテーブルの対象年（「# 1990-2040」）
+        first, last = (int(y) for y in f.readline().lstrip('#').strip().split('-'))
+        dates = [row['Date'] for row in csv.DictReader(f)]
+    return TradingCalendar(name, dates, f"{first}-01-01", f"{last}-12-31")
+
+
+# =============================
+# 休場日テーブルの生成（開発時のみ holidays パッケージを使う）
+# =============================
+
+def _source_holidays(name, years):
+    import holidays
+    if name == 'XNYS':
+        return holidays.NYSE(years=years)
+    if name == 'JP':
+        return holidays.Japan(years=years)
+    raise ValueError(f"未対応のカレンダーです: {name}")
+
+
+def build_table(name, first=TABLE_YEARS[0], last=TABLE_YEARS[1]):
+    os.makedirs(CALENDAR_DIR, exist_ok=True)
+    table = _source_holidays(name, range(first, last + 1))
+    path  = _table_path(name)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        f.write(f"# {first}-{last}\n")
+        writer = csv.writer(f)
+        writer.writerow(['Date', 'Name'])
+        for day, label in sorted(table.items()):
+            writer.writerow([day.isoformat(), label])
+    return path, len(table)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ('build', 'check'):
+        print("使い方: python trading_calendar.py build [開始年 終了年] | check")
+        sys.exit(1)
+    if sys.argv[1] == 'build':
+        years = [int(y) for y in sys.argv[2:4]] or list(TABLE_YEARS)
+        for market in ('XNYS', 'JP'):
+            path, n = build_table(market, *years)
+            print(f"【出力】{path}: {n}件")
+    else:
+        today = datetime.date.today()
+        for market in ('XNYS', 'JP'):
+            cal = load_calendar(market)
+            upcoming = cal.holidays[cal.holidays >= np.datetime64(today)][:3]
+            print(f"{cal} 次の営業日: {cal.next_session(today)} / 今後の休場日: {', '.join(map(str, upcoming))}")